@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for chromalog.
+
+Run them with ``python -m benchmarks run`` from the root of the repository.
+"""
@@ -0,0 +1,107 @@
+"""
+Command-line interface of the benchmark suite.
+
+Usage::
+
+    python -m benchmarks run [-k SUBSTRING] [-o results.json]
+    python -m benchmarks compare old.json new.json
+"""
+
+import argparse
+import importlib
+import sys
+
+from .common import (
+    BENCHMARKS,
+    Options,
+    compare,
+    load,
+    report,
+    run,
+    save,
+)
+
+MODULES = [
+    'hotpath',
+    'offload',
+    'recolor',
+    'startup',
+    'threads',
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks.")
+    run_parser.add_argument(
+        '-k',
+        dest='patterns',
+        action='append',
+        default=[],
+        help="Only run the benchmarks whose name contains this substring.",
+    )
+    run_parser.add_argument(
+        '-o',
+        '--output',
+        help="Save the results to this JSON file.",
+    )
+    run_parser.add_argument(
+        '-n',
+        '--number',
+        type=int,
+        default=20000,
+        help="The number of operations per measurement.",
+    )
+    run_parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=5,
+        help="The number of measurements to take the best of.",
+    )
+    run_parser.add_argument(
+        '-l',
+        '--list',
+        action='store_true',
+        help="List the benchmarks and exit.",
+    )
+
+    compare_parser = subparsers.add_parser(
+        'compare',
+        help="Compare two JSON result files.",
+    )
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        compare(load(args.old), load(args.new))
+        return 0
+
+    for module in MODULES:
+        importlib.import_module('.' + module, __package__)
+
+    names = [
+        name for name in BENCHMARKS
+        if not args.patterns or any(p in name for p in args.patterns)
+    ]
+
+    if args.list:
+        sys.stdout.write(''.join(name + '\n' for name in names))
+        return 0
+
+    results = run(names, Options(number=args.number, repeat=args.repeat))
+    report(results)
+
+    if args.output:
+        save(results, args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
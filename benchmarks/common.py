@@ -0,0 +1,274 @@
+"""
+Benchmark registry, measurement and reporting functions.
+"""
+
+import io
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+from collections import (
+    OrderedDict,
+    namedtuple,
+)
+
+BENCHMARKS = OrderedDict()
+
+Options = namedtuple('Options', ['number', 'repeat'])
+
+
+def benchmark(name):
+    """
+    Register a benchmark.
+
+    :param name: The name of the benchmark.
+    :returns: A decorator that registers a function as a benchmark.
+
+    The decorated function takes an :class:`Options` instance and returns a
+    dictionary of metrics.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def measure(func, options):
+    """
+    Measure the throughput of a function.
+
+    :param func: A callable that takes no arguments.
+    :param options: The :class:`Options` to use.
+    :returns: The best number of calls per second over `options.repeat` runs.
+    """
+    timer = timeit.Timer(func)
+    best = min(timer.repeat(repeat=options.repeat, number=options.number))
+
+    return options.number / best
+
+
+def overhead(func, baseline, options):
+    """
+    Measure the throughput of a function relative to a baseline.
+
+    :param func: A callable that takes no arguments.
+    :param baseline: A callable that takes no arguments and does the
+        equivalent work with the standard library.
+    :param options: The :class:`Options` to use.
+    :returns: A dictionary of metrics. The ``overhead_factor`` metric is the
+        number of times `func` is slower than `baseline`.
+    """
+    ops_per_sec = measure(func, options)
+    baseline_ops_per_sec = measure(baseline, options)
+
+    return OrderedDict([
+        ('ops_per_sec', ops_per_sec),
+        ('baseline_ops_per_sec', baseline_ops_per_sec),
+        ('overhead_factor', baseline_ops_per_sec / ops_per_sec),
+    ])
+
+
+class TTYStream(io.StringIO):
+    """
+    An in-memory stream that pretends to be a terminal.
+    """
+
+    def isatty(self):
+        return True
+
+
+class NullStream(object):
+    """
+    A stream that discards everything written to it.
+    """
+    closed = False
+
+    def __init__(self, isatty=False):
+        self._isatty = isatty
+
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return self._isatty
+
+
+class SlowStream(NullStream):
+    """
+    A stream that takes some time to write to, like a slow terminal.
+    """
+
+    def __init__(self, delay=0.0001, isatty=True):
+        super(SlowStream, self).__init__(isatty=isatty)
+        self.delay = delay
+
+    def write(self, data):
+        time.sleep(self.delay)
+
+
+def latency(func, count):
+    """
+    Measure the latency of a function.
+
+    :param func: A callable that takes no arguments.
+    :param count: The number of calls to measure.
+    :returns: A dictionary with the mean, median and 99th percentile
+        latencies, in microseconds.
+    """
+    timer = timeit.default_timer
+    samples = []
+
+    for _ in range(count):
+        start = timer()
+        func()
+        samples.append(timer() - start)
+
+    samples.sort()
+
+    return OrderedDict([
+        ('mean_us', sum(samples) * 1e6 / count),
+        ('median_us', samples[count // 2] * 1e6),
+        ('p99_us', samples[min(count - 1, count * 99 // 100)] * 1e6),
+    ])
+
+
+def make_record(msg='%s + %s gives %s', args=None, level=logging.INFO):
+    """
+    Make a log record for benchmarking purposes.
+    """
+    from chromalog.mark.helpers.simple import important
+
+    if args is None:
+        args = (4, 5, important(4 + 5))
+
+    return logging.LogRecord(
+        name='benchmark',
+        level=level,
+        pathname=__file__,
+        lineno=42,
+        msg=msg,
+        args=args,
+        exc_info=None,
+    )
+
+
+def get_revision():
+    """
+    Get the current git revision, if any.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.STDOUT,
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names, options, output=sys.stdout):
+    """
+    Run benchmarks.
+
+    :param names: The names of the benchmarks to run.
+    :param options: The :class:`Options` to use.
+    :param output: The stream to print the progress to.
+    :returns: A dictionary of results that can be serialized to JSON.
+    """
+    results = OrderedDict()
+
+    for name in names:
+        output.write('{0}... '.format(name))
+        output.flush()
+        results[name] = BENCHMARKS[name](options)
+        output.write('done\n')
+
+    return OrderedDict([
+        ('metadata', OrderedDict([
+            ('python', platform.python_version()),
+            ('implementation', platform.python_implementation()),
+            ('revision', get_revision()),
+            ('timestamp', time.time()),
+            ('number', options.number),
+            ('repeat', options.repeat),
+        ])),
+        ('results', results),
+    ])
+
+
+def save(results, path):
+    """
+    Save benchmark results to a JSON file.
+    """
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2)
+        output.write('\n')
+
+
+def load(path):
+    """
+    Load benchmark results from a JSON file.
+    """
+    with open(path) as source:
+        return json.load(source, object_pairs_hook=OrderedDict)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return '{0:.6g}'.format(value)
+
+    return str(value)
+
+
+def report(results, output=sys.stdout):
+    """
+    Print benchmark results.
+    """
+    for name, metrics in results['results'].items():
+        output.write('{0}\n'.format(name))
+
+        for metric, value in metrics.items():
+            output.write('  {0:<32} {1:>16}\n'.format(
+                metric,
+                _format_value(value),
+            ))
+
+
+def compare(old, new, output=sys.stdout):
+    """
+    Print the comparison of two sets of benchmark results.
+    """
+    output.write('{0:<34} {1:>14} {2:>14} {3:>9}\n'.format(
+        '',
+        old['metadata'].get('revision') or 'old',
+        new['metadata'].get('revision') or 'new',
+        'change',
+    ))
+
+    for name, metrics in new['results'].items():
+        old_metrics = old['results'].get(name, {})
+        output.write('{0}\n'.format(name))
+
+        for metric, value in metrics.items():
+            old_value = old_metrics.get(metric)
+
+            if isinstance(value, (int, float)) and old_value:
+                change = '{0:+.1f}%'.format(
+                    (value - old_value) * 100.0 / old_value,
+                )
+            else:
+                change = ''
+
+            output.write('  {0:<32} {1:>14} {2:>14} {3:>9}\n'.format(
+                metric,
+                '-' if old_value is None else _format_value(old_value),
+                _format_value(value),
+                change,
+            ))
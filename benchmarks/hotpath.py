@@ -0,0 +1,473 @@
+"""
+Benchmarks of the logging hot path.
+"""
+
+import json
+import logging
+import os
+
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from chromalog import hooks
+from chromalog.colorizer import (
+    Colorizer,
+    GenericColorizer,
+)
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+from chromalog.mark.helpers import (
+    conditional,
+    simple,
+)
+from chromalog.patterns import PatternHighlighter
+from chromalog.spans import FanOutHandler
+from chromalog.structured import StructuredFormatter
+
+from .common import (
+    NullStream,
+    TTYStream,
+    benchmark,
+    make_record,
+    measure,
+    overhead,
+)
+
+FORMAT = '%(asctime)s %(levelname)s:%(name)s:%(message)s'
+BATCH_SIZE = 100000
+MESSAGE_LENGTHS = (64, 256, 1024, 4096)
+MESSAGE_WORDS = (
+    'request', 'from', '10.0.0.1:8080', 'took', '150ms', 'and',
+    'returned', '404', 'for', '"/index.html"', 'id',
+    '6f1c3e2a-8d4b-4c2e-9f0a-1b2c3d4e5f60', 'failed', 'retry', '3',
+)
+
+
+@benchmark('handler.format')
+def handler_format(options):
+    record = make_record()
+    handler = ColorizingStreamHandler(stream=TTYStream())
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    baseline = logging.StreamHandler(stream=NullStream())
+    baseline.setFormatter(logging.Formatter(fmt=FORMAT))
+
+    return overhead(
+        lambda: handler.format(record),
+        lambda: baseline.format(record),
+        options,
+    )
+
+
+@benchmark('formatter.format')
+def formatter_format(options):
+    record = make_record()
+    colorizer = Colorizer()
+    formatter = ColorizingFormatter(fmt=FORMAT)
+    baseline = logging.Formatter(fmt=FORMAT)
+
+    return overhead(
+        lambda: formatter.format_colorized(record, colorizer=colorizer),
+        lambda: baseline.format(record),
+        options,
+    )
+
+
+@benchmark('colorizer.colorize')
+def colorizer_colorize(options):
+    colorizer = Colorizer()
+    value = simple.important(42)
+
+    return {
+        'ops_per_sec': measure(
+            lambda: colorizer.colorize(value, context_color_tag='info'),
+            options,
+        ),
+    }
+
+
+@benchmark('colorizer.colorize_message')
+def colorizer_colorize_message(options):
+    colorizer = Colorizer()
+    args = (4, 5, simple.important(4 + 5))
+
+    return overhead(
+        lambda: colorizer.colorize_message('{0} + {1} gives {2}', *args),
+        lambda: '{0} + {1} gives {2}'.format(*args),
+        options,
+    )
+
+
+@benchmark('mark.helpers.simple')
+def mark_helpers_simple(options):
+    helper = simple.important
+
+    return {'ops_per_sec': measure(lambda: helper(42), options)}
+
+
+@benchmark('mark.helpers.conditional')
+def mark_helpers_conditional(options):
+    helper = conditional.success_or_error
+
+    return {'ops_per_sec': measure(lambda: helper(42), options)}
+
+
+class _DevNullStream(object):
+    """
+    A terminal-like stream that makes a system call on every flush.
+    """
+    closed = False
+
+    def __init__(self):
+        self.file = open(os.devnull, 'w')
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def isatty(self):
+        return True
+
+
+@benchmark('handler.handle.buffered')
+def handler_handle_buffered(options):
+    record = make_record()
+    handler = ColorizingStreamHandler(stream=_DevNullStream())
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    buffered_stream = _DevNullStream()
+    buffered_handler = ColorizingStreamHandler(
+        stream=buffered_stream,
+        buffer_size=64 * 1024,
+    )
+    buffered_handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+
+    result = overhead(
+        lambda: buffered_handler.handle(record),
+        lambda: handler.handle(record),
+        options,
+    )
+    buffered_handler.flush()
+    result['records_per_write'] = (
+        buffered_handler.buffered_records / float(buffered_stream.writes)
+    )
+    result['writes_saved'] = buffered_handler.writes_saved
+
+    return result
+
+
+@benchmark('handler.format.bytes_per_line')
+def handler_format_bytes_per_line(options):
+    records = [
+        make_record(level=level)
+        for level in (
+            logging.DEBUG,
+            logging.INFO,
+            logging.WARNING,
+            logging.ERROR,
+            logging.CRITICAL,
+        )
+    ]
+    result = {}
+
+    for name, optimize in (('optimized', True), ('baseline', False)):
+        colorizer = Colorizer()
+        colorizer.optimize_color_pairs = optimize
+        handler = ColorizingStreamHandler(
+            stream=TTYStream(),
+            colorizer=colorizer,
+        )
+        handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+        result[name + '_bytes_per_line'] = sum(
+            len(handler.format(record).encode('utf-8'))
+            for record in records
+        ) / float(len(records))
+
+    result['bytes_saved_ratio'] = 1 - (
+        result['optimized_bytes_per_line'] /
+        result['baseline_bytes_per_line']
+    )
+
+    return result
+
+
+@benchmark('handler.handle.no_color')
+def handler_handle_no_color(options):
+    record = make_record()
+    handler = ColorizingStreamHandler(stream=NullStream())
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    baseline = logging.StreamHandler(stream=NullStream())
+    baseline.setFormatter(logging.Formatter(fmt=FORMAT))
+
+    return overhead(
+        lambda: handler.handle(record),
+        lambda: baseline.handle(record),
+        options,
+    )
+
+
+def _json_dumps_baseline(record, formatter):
+    return json.dumps({
+        'time': formatter.formatTime(record),
+        'level': record.levelname,
+        'logger': record.name,
+        'msg': record.getMessage(),
+        'user': str(record.user),
+    })
+
+
+@benchmark('structured_formatter.json')
+def structured_formatter_json(options):
+    record = make_record()
+    record.user = 'bob'
+    formatter = StructuredFormatter()
+
+    return overhead(
+        lambda: formatter.format_colorized(record, colorizer=None),
+        lambda: _json_dumps_baseline(record, formatter),
+        options,
+    )
+
+
+@benchmark('structured_formatter.logfmt')
+def structured_formatter_logfmt(options):
+    record = make_record()
+    record.user = simple.important('bob')
+    handler = ColorizingStreamHandler(stream=TTYStream())
+    formatter = StructuredFormatter()
+    handler.setFormatter(formatter)
+
+    return overhead(
+        lambda: handler.format(record),
+        lambda: _json_dumps_baseline(record, formatter),
+        options,
+    )
+
+
+@benchmark('handler.format_batch')
+def handler_format_batch(options):
+    records = [
+        make_record(level=level)
+        for level in (logging.DEBUG, logging.INFO, logging.WARNING) *
+        (BATCH_SIZE // 3)
+    ]
+    handler = ColorizingStreamHandler(stream=TTYStream())
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    batch_options = options._replace(number=1)
+
+    def format_each():
+        return ''.join([
+            handler.format(record) + handler.terminator
+            for record in records
+        ])
+
+    batch = measure(lambda: handler.format_batch(records), batch_options)
+    each = measure(format_each, batch_options)
+
+    return OrderedDict([
+        ('records_per_sec', batch * len(records)),
+        ('format_records_per_sec', each * len(records)),
+        ('speedup', batch / each),
+    ])
+
+
+@benchmark('colorizer.colorize_many')
+def colorizer_colorize_many(options):
+    objs = [
+        helper(index)
+        for index in range(BATCH_SIZE // 2)
+        for helper in (simple.important, simple.success)
+    ]
+    colorizer = Colorizer()
+    batch_options = options._replace(number=1)
+    batch = measure(
+        lambda: colorizer.colorize_many(objs, separator=' '),
+        batch_options,
+    )
+    each = measure(
+        lambda: ' '.join([str(colorizer.colorize(obj)) for obj in objs]),
+        batch_options,
+    )
+
+    return OrderedDict([
+        ('objs_per_sec', batch * len(objs)),
+        ('colorize_objs_per_sec', each * len(objs)),
+        ('speedup', batch / each),
+    ])
+
+
+def _long_message(length):
+    words = []
+
+    while len(' '.join(words)) < length:
+        words.append(MESSAGE_WORDS[len(words) % len(MESSAGE_WORDS)])
+
+    return ' '.join(words)[:length]
+
+
+@benchmark('handler.format.patterns')
+def handler_format_patterns(options):
+    result = OrderedDict()
+    keywords = ['failed', 'retry']
+    many_keywords = keywords + [
+        'keyword{0}'.format(index) for index in range(10000)
+    ]
+
+    for length in MESSAGE_LENGTHS:
+        msg = '%s ' + _long_message(length - 3)
+        record = make_record(msg=msg, args=('user',))
+
+        for name, patterns in (
+            ('baseline', None),
+            ('patterns', PatternHighlighter(keywords=keywords)),
+            ('keywords', PatternHighlighter(keywords=many_keywords)),
+        ):
+            handler = ColorizingStreamHandler(
+                stream=TTYStream(),
+                patterns=patterns,
+            )
+            handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+            ops_per_sec = measure(lambda: handler.format(record), options)
+            result['{0}_{1}_ops_per_sec'.format(name, length)] = ops_per_sec
+
+            if patterns:
+                result['{0}_{1}_ns_per_char'.format(name, length)] = (
+                    1e9 / ops_per_sec / len(msg)
+                )
+
+    return result
+
+
+@benchmark('fan_out.handle')
+def fan_out_handle(options):
+    record = make_record()
+    handler = FanOutHandler([(TTYStream(), None), (NullStream(), None)])
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    handlers = [
+        ColorizingStreamHandler(stream=TTYStream()),
+        ColorizingStreamHandler(stream=NullStream()),
+    ]
+
+    for each in handlers:
+        each.setFormatter(ColorizingFormatter(fmt=FORMAT))
+
+    def handle_each():
+        for each in handlers:
+            each.handle(record)
+
+    ops_per_sec = measure(lambda: handler.handle(record), options)
+    each_ops_per_sec = measure(handle_each, options)
+
+    return OrderedDict([
+        ('ops_per_sec', ops_per_sec),
+        ('two_handlers_ops_per_sec', each_ops_per_sec),
+        ('speedup', ops_per_sec / each_ops_per_sec),
+    ])
+
+
+@benchmark('handler.handle.repeats')
+def handler_handle_repeats(options):
+    # A retry loop that logs the same record over and over.
+    record = make_record()
+    handler = ColorizingStreamHandler(stream=_DevNullStream())
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    collapsing_stream = _DevNullStream()
+    collapsing_handler = ColorizingStreamHandler(
+        stream=collapsing_stream,
+        collapse_repeats=True,
+    )
+    collapsing_handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+
+    result = overhead(
+        lambda: collapsing_handler.handle(record),
+        lambda: handler.handle(record),
+        options,
+    )
+    collapsing_handler.close()
+    result['writes'] = collapsing_stream.writes
+
+    # Records that differ pay for the comparison.
+    records = [make_record(args=(4, 5, index)) for index in range(2)]
+    collapsing_handler = ColorizingStreamHandler(
+        stream=_DevNullStream(),
+        collapse_repeats=True,
+    )
+    collapsing_handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    distinct = overhead(
+        lambda: [collapsing_handler.handle(each) for each in records],
+        lambda: [handler.handle(each) for each in records],
+        options,
+    )
+    result['distinct_overhead_factor'] = distinct['overhead_factor']
+
+    return result
+
+
+@benchmark('handler.handle.stats')
+def handler_handle_stats(options):
+    record = make_record()
+    handler = ColorizingStreamHandler(stream=NullStream(isatty=True))
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    stats_handler = ColorizingStreamHandler(
+        stream=NullStream(isatty=True),
+        collect_stats=True,
+    )
+    stats_handler.setFormatter(
+        ColorizingFormatter(fmt=FORMAT, collect_stats=True),
+    )
+
+    # The baseline is the handler without statistics.
+    result = overhead(
+        lambda: stats_handler.handle(record),
+        lambda: handler.handle(record),
+        options,
+    )
+    phases = stats_handler.stats()['phases']
+
+    for phase in ('colorize', 'format', 'write'):
+        result['{0}_mean_ns'.format(phase)] = phases[phase]['mean_ns']
+
+    return result
+
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _null_hook(*args, **kwargs):
+    return _NULL_CONTEXT
+
+
+@benchmark('hooks.handle')
+def hooks_handle(options):
+    record = make_record()
+    handler = ColorizingStreamHandler(stream=NullStream(isatty=True))
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    original = GenericColorizer.__dict__['get_color_pair']
+    ops_per_sec = measure(lambda: handler.handle(record), options)
+
+    for point in hooks.HOOK_POINTS:
+        hooks.register(point, _null_hook)
+
+    enabled_ops_per_sec = measure(lambda: handler.handle(record), options)
+
+    for point in hooks.HOOK_POINTS:
+        hooks.unregister(point, _null_hook)
+
+    # Once unregistered, the hooked methods are the original ones again.
+    disabled_ops_per_sec = measure(lambda: handler.handle(record), options)
+
+    return OrderedDict([
+        ('ops_per_sec', ops_per_sec),
+        ('disabled_ops_per_sec', disabled_ops_per_sec),
+        ('enabled_ops_per_sec', enabled_ops_per_sec),
+        ('disabled_overhead_factor', ops_per_sec / disabled_ops_per_sec),
+        ('enabled_overhead_factor', ops_per_sec / enabled_ops_per_sec),
+        (
+            'originals_restored',
+            GenericColorizer.__dict__['get_color_pair'] is original,
+        ),
+    ])
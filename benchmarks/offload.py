@@ -0,0 +1,238 @@
+"""
+Benchmarks of the handlers that move work off the calling thread.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import timeit
+
+from collections import OrderedDict
+
+from chromalog.aio import AsyncColorizingStreamHandler
+from chromalog.buffer import (
+    BLOCK,
+    DROP_NEWEST,
+)
+from chromalog.handlers import ColorizingQueueHandler
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+from chromalog.mark.helpers.simple import important
+from chromalog.multiprocess import (
+    ColorizingProcessHandler,
+    ColorizingProcessListener,
+)
+
+from .common import (
+    NullStream,
+    SlowStream,
+    benchmark,
+    latency,
+)
+
+FORMAT = '%(asctime)s %(levelname)s:%(name)s:%(message)s'
+WORKERS = 4
+TICK = 0.001
+
+
+def _caller_latency(handler, count):
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    logger = logging.Logger('benchmark')
+    logger.addHandler(handler)
+
+    try:
+        return latency(
+            lambda: logger.info('%s + %s gives %s', 4, 5, important(9)),
+            count,
+        )
+    finally:
+        handler.close()
+
+
+@benchmark('queue_handler.caller_latency')
+def queue_handler_caller_latency(options):
+    count = min(options.number, 2000)
+    direct = _caller_latency(
+        ColorizingStreamHandler(stream=SlowStream()),
+        count,
+    )
+    queued = _caller_latency(
+        ColorizingQueueHandler(stream=SlowStream()),
+        count,
+    )
+    result = OrderedDict()
+
+    for metric, value in queued.items():
+        result[metric] = value
+
+    for metric, value in direct.items():
+        result['baseline_' + metric] = value
+
+    return result
+
+
+@benchmark('queue_handler.bounded.caller_latency')
+def queue_handler_bounded_caller_latency(options):
+    # The stream can't keep up: a full queue either blocks or drops.
+    count = min(options.number, 2000)
+    result = OrderedDict()
+
+    for policy in (DROP_NEWEST, BLOCK):
+        handler = ColorizingQueueHandler(
+            stream=SlowStream(),
+            max_size=100,
+            policy=policy,
+        )
+        counter = handler.drop_counter
+
+        for metric, value in _caller_latency(handler, count).items():
+            result['{0}_{1}'.format(policy.replace('-', '_'), metric)] = value
+
+        result['{0}_dropped'.format(policy.replace('-', '_'))] = (
+            counter.dropped
+        )
+
+    return result
+
+
+def _log_from_worker(address, count):
+    if address is None:
+        handler = ColorizingStreamHandler(stream=NullStream(isatty=True))
+        handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    else:
+        handler = ColorizingProcessHandler(address)
+
+    logger = logging.Logger('benchmark')
+    logger.addHandler(handler)
+
+    for _ in range(count):
+        logger.info('%s + %s gives %s', 4, 5, important(9))
+
+    handler.close()
+
+
+def _workers_throughput(address, count, finish=None):
+    workers = [
+        multiprocessing.Process(target=_log_from_worker, args=(address, count))
+        for _ in range(WORKERS)
+    ]
+    start = timeit.default_timer()
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    if finish:
+        finish()
+
+    return WORKERS * count / (timeit.default_timer() - start)
+
+
+def _listener_throughput(count):
+    listener = ColorizingProcessListener(stream=NullStream(isatty=True))
+    listener.handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    listener.start()
+
+    return _workers_throughput(listener.address, count, listener.stop)
+
+
+@benchmark('process_handler.throughput')
+def process_handler_throughput(options):
+    count = options.number // WORKERS
+
+    return OrderedDict([
+        ('workers', WORKERS),
+        (
+            'records_per_sec',
+            max(_listener_throughput(count) for _ in range(options.repeat)),
+        ),
+        (
+            'baseline_records_per_sec',
+            max(
+                _workers_throughput(None, count)
+                for _ in range(options.repeat)
+            ),
+        ),
+    ])
+
+
+def _slow_reader(fd, chunk_size=1024, delay=0.001):
+    # A reader that can't keep up with the loop, like a slow terminal.
+    while os.read(fd, chunk_size):
+        time.sleep(delay)
+
+
+def _loop_lag(handler_class, count):
+    """
+    Measure how late the timers of an event loop fire while it logs to a
+    pipe that is read slowly.
+    """
+    read_fd, write_fd = os.pipe()
+    reader = threading.Thread(target=_slow_reader, args=(read_fd,))
+    reader.start()
+    stream = os.fdopen(write_fd, 'w')
+    handler = handler_class(stream=stream)
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    logger = logging.Logger('benchmark')
+    logger.addHandler(handler)
+    lags = []
+
+    async def tick(done):
+        while not done.is_set():
+            start = timeit.default_timer()
+            await asyncio.sleep(TICK)
+            lags.append(timeit.default_timer() - start - TICK)
+
+    async def log():
+        done = asyncio.Event()
+        ticker = asyncio.ensure_future(tick(done))
+
+        for index in range(count):
+            logger.info('%s + %s gives %s', 4, index, important(9))
+            await asyncio.sleep(0)
+
+        if isinstance(handler, AsyncColorizingStreamHandler):
+            await handler.drain()
+
+        done.set()
+        await ticker
+
+    try:
+        asyncio.run(log())
+    finally:
+        handler.close()
+        stream.close()
+        reader.join()
+        os.close(read_fd)
+
+    lags.sort()
+
+    return OrderedDict([
+        ('ticks', len(lags)),
+        ('p99_lag_us', lags[min(len(lags) - 1, len(lags) * 99 // 100)] * 1e6),
+        ('max_lag_us', lags[-1] * 1e6),
+    ])
+
+
+@benchmark('aio_handler.loop_lag')
+def aio_handler_loop_lag(options):
+    count = min(options.number, 5000)
+    result = OrderedDict()
+
+    for metric, value in _loop_lag(
+        AsyncColorizingStreamHandler,
+        count,
+    ).items():
+        result[metric] = value
+
+    for metric, value in _loop_lag(ColorizingStreamHandler, count).items():
+        result['baseline_' + metric] = value
+
+    return result
@@ -0,0 +1,90 @@
+"""
+Benchmarks of the log recolorizer.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import timeit
+
+from collections import OrderedDict
+
+from chromalog.recolor import (
+    Recolorizer,
+    recolor_file,
+)
+
+from .common import benchmark
+
+FILE_SIZE = 64 * 1024 * 1024
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+class _DevNull(object):
+    def write(self, data):
+        pass
+
+
+def _write_log_file(path):
+    with open(path, 'w') as log_file:
+        index = 0
+
+        while log_file.tell() < FILE_SIZE:
+            log_file.write(''.join(
+                '{0}:app.{1}:Processed request {2} in {3}ms\n'.format(
+                    LEVELS[(index + offset) % len(LEVELS)],
+                    (index + offset) % 7,
+                    index + offset,
+                    (index + offset) % 1000,
+                )
+                for offset in range(1000)
+            ))
+            index += 1000
+
+
+def _best_mb_per_sec(func, options):
+    best = min(timeit.repeat(func, repeat=options.repeat, number=1))
+
+    return FILE_SIZE / best / 1e6
+
+
+@benchmark('recolor.file')
+def recolor_file_throughput(options):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'benchmark.log')
+
+    try:
+        _write_log_file(path)
+        recolorizer = Recolorizer()
+        jobs = multiprocessing.cpu_count()
+
+        def copy():
+            with open(path, 'rb') as source:
+                shutil.copyfileobj(source, _DevNull())
+
+        return OrderedDict([
+            ('jobs', jobs),
+            (
+                'mb_per_sec',
+                _best_mb_per_sec(
+                    lambda: recolor_file(recolorizer, path, _DevNull()),
+                    options,
+                ),
+            ),
+            (
+                'single_job_mb_per_sec',
+                _best_mb_per_sec(
+                    lambda: recolor_file(
+                        recolorizer,
+                        path,
+                        _DevNull(),
+                        jobs=1,
+                    ),
+                    options,
+                ),
+            ),
+            ('read_mb_per_sec', _best_mb_per_sec(copy, options)),
+        ])
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,58 @@
+"""
+Benchmarks of the import time of chromalog.
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+from collections import OrderedDict
+
+from .common import benchmark
+
+IMPORTTIME_RE = re.compile(
+    r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|'
+    r'(?P<indent>\s+)(?P<module>\S+)$',
+    re.MULTILINE,
+)
+
+
+def _import_times(module):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            '-X',
+            'importtime',
+            '-c',
+            'import sys, {0}; print("colorama" in sys.modules)'.format(module),
+        ],
+        stderr=subprocess.STDOUT,
+        env=env,
+    ).decode('utf-8')
+    times = dict(
+        (match.group('module'), int(match.group('cumulative')))
+        for match in IMPORTTIME_RE.finditer(output)
+    )
+
+    return times, output.rstrip().endswith('True')
+
+
+@benchmark('import.chromalog')
+def import_chromalog(options):
+    # Make sure the bytecode is cached before measuring.
+    _import_times('chromalog')
+    samples = [_import_times('chromalog') for _ in range(options.repeat * 2)]
+    cumulative = min(times['chromalog'] for times, _ in samples)
+    own = min(
+        times['chromalog'] - times.get('logging', 0)
+        for times, _ in samples
+    )
+
+    return OrderedDict([
+        ('cumulative_us', cumulative),
+        ('excluding_logging_us', own),
+        ('imports_colorama', samples[0][1]),
+    ])
@@ -0,0 +1,96 @@
+"""
+Benchmarks of logging from several threads.
+"""
+
+import logging
+import threading
+import timeit
+
+from collections import OrderedDict
+
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+
+from .common import (
+    NullStream,
+    SlowStream,
+    benchmark,
+    make_record,
+)
+
+FORMAT = '%(asctime)s %(levelname)s:%(name)s:%(message)s'
+THREADS = (1, 4, 16, 64)
+
+
+def _records_per_sec(handle, threads, count):
+    """
+    Measure the number of records per second that several threads handle.
+
+    :param handle: The function that handles a record.
+    :param threads: The number of threads.
+    :param count: The total number of records to handle.
+    """
+    record = make_record()
+    per_thread = count // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def work():
+        barrier.wait()
+
+        for _ in range(per_thread):
+            handle(record)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+
+    for worker in workers:
+        worker.start()
+
+    barrier.wait()
+    start = timeit.default_timer()
+
+    for worker in workers:
+        worker.join()
+
+    return per_thread * threads / (timeit.default_timer() - start)
+
+
+def _thread_scaling(handler, count, options):
+    handler.setFormatter(ColorizingFormatter(fmt=FORMAT))
+    result = OrderedDict()
+
+    def handle_locked(record):
+        # What `logging.Handler.handle` does: format under the lock.
+        logging.Handler.handle(handler, record)
+
+    for threads in THREADS:
+        result['{0}_threads_records_per_sec'.format(threads)] = max(
+            _records_per_sec(handler.handle, threads, count)
+            for _ in range(options.repeat)
+        )
+        result['{0}_threads_locked_records_per_sec'.format(threads)] = max(
+            _records_per_sec(handle_locked, threads, count)
+            for _ in range(options.repeat)
+        )
+
+    return result
+
+
+@benchmark('handler.handle.threads')
+def handler_handle_threads(options):
+    return _thread_scaling(
+        ColorizingStreamHandler(stream=NullStream(isatty=True)),
+        max(options.number, max(THREADS) * 100),
+        options,
+    )
+
+
+@benchmark('handler.handle.threads.slow_stream')
+def handler_handle_threads_slow_stream(options):
+    # Threads format while another one waits for the stream.
+    return _thread_scaling(
+        ColorizingStreamHandler(stream=SlowStream()),
+        max(THREADS) * 50,
+        options,
+    )
@@ -0,0 +1,123 @@
+"""
+Command-line interface of chromalog.
+
+Usage::
+
+    python -m chromalog recolor [-p TAG=PATTERN] [-j JOBS] [FILE]
+"""
+
+import argparse
+import sys
+
+
+def _pattern(value):
+    color_tag, separator, pattern = value.partition('=')
+
+    if not separator or not color_tag:
+        raise argparse.ArgumentTypeError(
+            "Expected TAG=PATTERN, got {0!r}".format(value),
+        )
+
+    return color_tag, pattern
+
+
+def _positive_int(value):
+    try:
+        result = int(value)
+    except ValueError:
+        result = 0
+
+    if result < 1:
+        raise argparse.ArgumentTypeError(
+            "Expected a positive integer, got {0!r}".format(value),
+        )
+
+    return result
+
+
+def recolor(args):
+    from .recolor import (
+        DEFAULT_NAME_PATTERN,
+        Recolorizer,
+        recolor_file,
+        recolor_stream,
+    )
+
+    recolorizer = Recolorizer(
+        patterns=args.patterns,
+        name_pattern=None if args.no_names else DEFAULT_NAME_PATTERN,
+    )
+    output = getattr(sys.stdout, 'buffer', sys.stdout)
+    kwargs = dict(jobs=args.jobs, chunk_size=args.chunk_size)
+
+    try:
+        if args.file in (None, '-'):
+            recolor_stream(
+                recolorizer,
+                getattr(sys.stdin, 'buffer', sys.stdin),
+                output,
+                **kwargs
+            )
+        else:
+            recolor_file(recolorizer, args.file, output, **kwargs)
+
+        output.flush()
+    except BrokenPipeError:
+        # The reader, like `head` or `less`, went away.
+        sys.stderr.close()
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m chromalog')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    recolor_parser = subparsers.add_parser(
+        'recolor',
+        help="Colorize plain-text logs.",
+    )
+    recolor_parser.add_argument(
+        'file',
+        nargs='?',
+        help="The file to colorize. Defaults to the standard input.",
+    )
+    recolor_parser.add_argument(
+        '-p',
+        '--pattern',
+        dest='patterns',
+        action='append',
+        type=_pattern,
+        default=[],
+        metavar='TAG=PATTERN',
+        help="Colorize the text that matches a regular expression.",
+    )
+    recolor_parser.add_argument(
+        '--no-names',
+        action='store_true',
+        help="Don't colorize logger names.",
+    )
+    recolor_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=_positive_int,
+        default=None,
+        help="The number of processes to use. Defaults to the number of "
+        "CPUs.",
+    )
+    recolor_parser.add_argument(
+        '--chunk-size',
+        type=_positive_int,
+        default=4 * 1024 * 1024,
+        help="The number of bytes each process colorizes at once.",
+    )
+    recolor_parser.set_defaults(func=recolor)
+
+    args = parser.parse_args(argv)
+
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,524 @@
+"""
+A colorizing handler that doesn't block asyncio event loops.
+"""
+import asyncio
+import io
+import itertools
+import logging
+import os
+import select
+
+from threading import (
+    Lock,
+    Thread,
+)
+
+from .buffer import (
+    BLOCK,
+    BoundedQueue,
+    DropCounter,
+    RecordBuffer,
+    make_drop_summary,
+)
+from .log import ColorizingStreamHandler
+
+# Writing at most that many bytes to a pipe that is ready never blocks.
+_CHUNK_SIZE = getattr(select, 'PIPE_BUF', 512)
+
+
+class _LoopWriter(object):
+    """
+    Writes the encoded records of several buffers to a file descriptor, in
+    the order they were written, whenever an event loop reports it as ready.
+
+    An event loop only watches a file descriptor for a single callback, so
+    all the handlers that write to the same file descriptor from the same
+    loop share a writer, see :func:`_attach_loop_writer`.
+
+    Its methods must be called from the thread of the loop.
+    """
+
+    def __init__(self, loop, fd):
+        self.loop = loop
+        self.fd = fd
+        # The error callbacks of the buffers.
+        self.buffers = {}
+        self.pending = bytearray()
+        # The number of bytes ever moved to `pending`, and written.
+        self.filled = 0
+        self.written = 0
+        self.waiters = []
+        self.writing = False
+
+    def start(self):
+        """
+        Watch the file descriptor.
+
+        :raises OSError: If the file descriptor can't be watched, like
+            regular files.
+        :raises NotImplementedError: If the loop can't watch anything but
+            sockets.
+        """
+        self.loop.add_writer(self.fd, self._on_writable)
+        self.writing = True
+
+    def write(self, buffer, data, levelno=None):
+        """
+        Write an encoded record.
+
+        :param buffer: The buffer of the handler of the record.
+        :returns: :const:`False` if the record must wait for some room.
+        """
+        item = (next(_sequence), data)
+
+        if levelno is None:
+            buffer.append(item)
+        elif not buffer.offer(levelno, item):
+            return False
+
+        if not self.writing:
+            self.start()
+
+        return True
+
+    def _next_buffer(self):
+        oldest = None
+
+        for buffer in self.buffers:
+            if buffer and (
+                oldest is None or
+                buffer.peek()[0] < oldest.peek()[0]
+            ):
+                oldest = buffer
+
+        return oldest
+
+    def _fill(self):
+        # Records that are being written can't be dropped anymore.
+        while len(self.pending) < _CHUNK_SIZE:
+            buffer = self._next_buffer()
+
+            if buffer is None:
+                break
+
+            data = buffer.popleft()[1]
+            self.pending += data
+            self.filled += len(data)
+
+    def _fail(self):
+        # Nothing can be written anymore, like when the reader went away.
+        data = bytes(self.pending)
+        self.written += len(self.pending)
+        del self.pending[:]
+
+        for buffer in self.buffers:
+            while buffer:
+                data += buffer.popleft()[1]
+
+        for on_error in set(self.buffers.values()):
+            on_error(data)
+
+    def _wake_up(self):
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+        del self.waiters[:]
+
+    def _on_writable(self):
+        self._fill()
+
+        if self.pending:
+            try:
+                written = os.write(self.fd, self.pending[:_CHUNK_SIZE])
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self._fail()
+            else:
+                del self.pending[:written]
+                self.written += written
+
+        if not self.pending and not any(self.buffers):
+            self.loop.remove_writer(self.fd)
+            self.writing = False
+
+        self._wake_up()
+
+    async def _progress(self):
+        waiter = self.loop.create_future()
+        self.waiters.append(waiter)
+        await waiter
+
+    async def drain(self, buffer):
+        """
+        Wait until the records of `buffer` are written.
+
+        The records of the other buffers that are written before them are
+        waited for too, but not the ones that are written after them.
+        """
+        while buffer and self.writing:
+            await self._progress()
+
+        filled = self.filled
+
+        while self.written < filled and self.writing:
+            await self._progress()
+
+    def write_all(self):
+        """
+        Write all the pending records, blocking if necessary.
+        """
+        try:
+            while True:
+                self._fill()
+
+                if not self.pending:
+                    break
+
+                written = os.write(self.fd, self.pending)
+                del self.pending[:written]
+                self.written += written
+        except OSError:
+            self._fail()
+
+    def close(self):
+        if self.writing and not self.loop.is_closed():
+            self.loop.remove_writer(self.fd)
+
+        self.writing = False
+        self.write_all()
+        self._wake_up()
+
+
+# The loop writers, by loop and file descriptor.
+_loop_writers = {}
+_loop_writers_lock = Lock()
+
+# Orders the records of the buffers of a loop writer.
+_sequence = itertools.count()
+
+
+def _attach_loop_writer(loop, fd, buffer, on_error):
+    """
+    Attach a buffer to the writer of a file descriptor in a loop, creating
+    the writer if needed.
+
+    :param on_error: Called with the encoded records that can't be written,
+        while the error is being handled.
+    :returns: The writer, or :const:`None` if the file descriptor can't be
+        watched by the loop.
+    """
+    with _loop_writers_lock:
+        writer = _loop_writers.get((loop, fd))
+
+        if writer is None:
+            writer = _LoopWriter(loop, fd)
+
+            try:
+                writer.start()
+            except (OSError, NotImplementedError):
+                return None
+
+            _loop_writers[(loop, fd)] = writer
+
+        writer.buffers[buffer] = on_error
+
+        return writer
+
+
+def _detach_loop_writer(writer, buffer):
+    """
+    Write all the pending records of a loop writer, blocking if necessary,
+    and detach a buffer from it.
+
+    The writer is closed once its last buffer is detached.
+    """
+    with _loop_writers_lock:
+        writer.write_all()
+        del writer.buffers[buffer]
+
+        if not writer.buffers:
+            del _loop_writers[(writer.loop, writer.fd)]
+            writer.close()
+
+
+class _ThreadWriter(object):
+    """
+    Writes strings to a stream from a background thread.
+    """
+
+    def __init__(self, stream, queue, on_error):
+        """
+        :param on_error: Called with the strings that can't be written, while
+            the error is being handled.
+        """
+        self.stream = stream
+        self.queue = queue
+        self.on_error = on_error
+        self.thread = Thread(target=self._run, name='chromalog-writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+
+            try:
+                if data is None:
+                    break
+
+                self.stream.write(data)
+
+                if self.queue.empty() and hasattr(self.stream, 'flush'):
+                    self.stream.flush()
+            except Exception:
+                self.on_error(data)
+            finally:
+                self.queue.task_done()
+
+    def write(self, data, levelno=None):
+        self.queue.put(data, levelno=levelno)
+
+    def join(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class AsyncColorizingStreamHandler(ColorizingStreamHandler):
+    """
+    A colorizing stream handler that never blocks the running event loop on
+    a slow stream.
+
+    Records are colorized and formatted in the calling task, like with
+    :class:`chromalog.log.ColorizingStreamHandler`. When an asyncio event
+    loop is running in the calling thread, the encoded record is handed to a
+    writer that writes to the file descriptor of the stream whenever the
+    loop reports it as ready. Otherwise, or if the stream or the loop don't
+    support it, the record is written by a background thread.
+
+    Use :meth:`drain` to wait for the records to be written.
+
+    Records wait to be written in unbounded buffers, unless `max_size` is
+    specified.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        max_size=None,
+        policy=BLOCK,
+        drop_level=logging.WARNING,
+        **kwargs
+    ):
+        """
+        Initializes an asyncio colorizing stream handler.
+
+        :param max_size: If specified, the maximum number of records that
+            wait to be written, per writer. Records are then not coalesced
+            by the handler, but by the writers.
+        :param policy: The policy that applies when a writer is full. See
+            :class:`chromalog.buffer.RecordBuffer`. With the
+            :const:`chromalog.buffer.BLOCK` policy, the records of a full
+            loop writer are written at once, blocking the loop.
+        :param drop_level: The level below which records are dropped first,
+            with the :const:`chromalog.buffer.DROP_BELOW_LEVEL` policy.
+
+        The other arguments are the ones of
+        :class:`chromalog.log.ColorizingStreamHandler`.
+        """
+        super(AsyncColorizingStreamHandler, self).__init__(
+            stream=stream,
+            **kwargs
+        )
+        self.max_size = max_size
+        self.policy = policy
+        self.drop_level = drop_level
+        self.drop_counter = DropCounter()
+        self._loop_writers = {}
+        self._thread_writer = None
+        self._thread_writer_lock = Lock()
+
+    def _get_fd(self):
+        try:
+            return self.stream.fileno()
+        except (AttributeError, ValueError, io.UnsupportedOperation):
+            return None
+
+    def _get_loop_writer(self, loop):
+        try:
+            return self._loop_writers[loop]
+        except KeyError:
+            pass
+
+        self._close_loop_writers(closed_loops_only=True)
+        fd = self._get_fd()
+        entry = None
+
+        if fd is not None:
+            buffer = self._make_buffer(
+                lambda counts: (
+                    next(_sequence),
+                    self._encode(self._summarize(counts)),
+                ),
+            )
+            # Regular files can't be watched, and some loops can't watch
+            # anything but sockets.
+            writer = _attach_loop_writer(
+                loop,
+                fd,
+                buffer,
+                self._handle_write_error,
+            )
+
+            if writer:
+                # Write what was written to the stream so far first.
+                self.stream.flush()
+                entry = (writer, buffer)
+
+        self._loop_writers[loop] = entry
+
+        return entry
+
+    def _close_loop_writers(self, closed_loops_only=False):
+        for loop in list(self._loop_writers):
+            if closed_loops_only and not loop.is_closed():
+                continue
+
+            entry = self._loop_writers.pop(loop)
+
+            if entry:
+                _detach_loop_writer(*entry)
+
+    def _get_thread_writer(self):
+        with self._thread_writer_lock:
+            if self._thread_writer is None:
+                self._thread_writer = _ThreadWriter(
+                    self.stream,
+                    BoundedQueue(
+                        self.max_size,
+                        self.policy,
+                        self.drop_level,
+                        summarize=self._summarize,
+                        counter=self.drop_counter,
+                    ),
+                    self._handle_write_error,
+                )
+
+            return self._thread_writer
+
+    def _handle_write_error(self, data):
+        # The records are long gone: report what couldn't be written instead.
+        self.handleError(logging.makeLogRecord({'msg': data}))
+
+    def _make_buffer(self, summarize):
+        return RecordBuffer(
+            self.max_size,
+            self.policy,
+            self.drop_level,
+            summarize=summarize,
+            counter=self.drop_counter,
+        )
+
+    def _summarize(self, counts):
+        return self.format(make_drop_summary(counts)) + self.terminator
+
+    def _encode(self, data):
+        return data.encode(
+            getattr(self.stream, 'encoding', None) or 'utf-8',
+            getattr(self.stream, 'errors', None) or 'strict',
+        )
+
+    def write(self, msg, record):
+        """
+        Write a formatted record.
+
+        If `max_size` was specified, the record goes straight to a writer,
+        that may drop it.
+        """
+        if self.max_size is None:
+            super(AsyncColorizingStreamHandler, self).write(msg, record)
+            return
+
+        try:
+            self._write_stream(msg, record.levelno)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _write_stream(self, data, levelno=None):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        entry = self._get_loop_writer(loop) if loop else None
+
+        if entry:
+            writer, buffer = entry
+            data = self._encode(data)
+
+            if not writer.write(buffer, data, levelno):
+                writer.write_all()
+                writer.write(buffer, data, levelno)
+        else:
+            # Write what the loops that were closed left first.
+            if self._loop_writers and not loop:
+                self._close_loop_writers(closed_loops_only=True)
+
+            self._get_thread_writer().write(data, levelno)
+
+    def _write_summary(self):
+        if self.drop_counter.pending:
+            self._write_stream(
+                self._summarize(self.drop_counter.take_pending()),
+            )
+
+    async def drain(self):
+        """
+        Wait until all the records handled so far are written.
+
+        Must be awaited from a running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        self.acquire()
+
+        try:
+            self.flush()
+            self._write_summary()
+        finally:
+            self.release()
+
+        entry = self._loop_writers.get(loop)
+
+        if entry:
+            writer, buffer = entry
+            await writer.drain(buffer)
+
+        if self._thread_writer:
+            await loop.run_in_executor(None, self._thread_writer.join)
+
+    def close(self):
+        """
+        Write all the pending records, blocking if necessary, and close the
+        handler.
+        """
+        self.acquire()
+
+        try:
+            self._write_repeats()
+            self.flush()
+            self._write_summary()
+            self._close_loop_writers()
+
+            if self._thread_writer:
+                self._thread_writer.close()
+                self._thread_writer = None
+
+            super(AsyncColorizingStreamHandler, self).close()
+        finally:
+            self.release()
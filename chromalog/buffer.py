@@ -0,0 +1,353 @@
+"""
+Bounded buffers of records, that drop records rather than grow without
+limits when their output can't keep up.
+"""
+import logging
+import time
+
+from collections import deque
+from queue import (
+    Full,
+    Queue,
+)
+
+from .mark.objects import Mark
+
+BLOCK = 'block'
+DROP_NEWEST = 'drop-newest'
+DROP_OLDEST = 'drop-oldest'
+DROP_BELOW_LEVEL = 'drop-below-level'
+POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, DROP_BELOW_LEVEL)
+
+
+def make_drop_summary(counts):
+    """
+    Make the record that summarizes dropped records.
+
+    :param counts: A dictionary of levels/numbers of dropped records.
+    :returns: A `WARNING` record, whose counts are marked as important.
+
+    >>> from logging import DEBUG, INFO
+    >>> make_drop_summary({DEBUG: 1200, INFO: 34}).getMessage()
+    '1234 records dropped (1200 debug, 34 info)'
+    """
+    levels = sorted(counts)
+    args = [Mark(sum(counts.values()), 'important')]
+
+    for levelno in levels:
+        args.append(Mark(counts[levelno], 'important'))
+        args.append(logging.getLevelName(levelno).lower())
+
+    return logging.makeLogRecord({
+        'name': 'chromalog',
+        'levelno': logging.WARNING,
+        'levelname': logging.getLevelName(logging.WARNING),
+        'msg': '%s records dropped ({0})'.format(
+            ', '.join(['%s %s'] * len(levels)),
+        ),
+        'args': tuple(args),
+    })
+
+
+class DropCounter(object):
+    """
+    Counts the records that were dropped.
+
+    :ivar dropped: The total number of dropped records.
+    :ivar dropped_by_level: A dictionary of levels/numbers of dropped
+        records.
+    """
+
+    def __init__(self):
+        """
+        Initialize a drop counter.
+        """
+        self.dropped = 0
+        self.dropped_by_level = {}
+        self._pending = {}
+
+    def add(self, levelno):
+        """
+        Count a dropped record.
+
+        :param levelno: The level of the dropped record.
+        """
+        self.dropped += 1
+        self.dropped_by_level[levelno] = (
+            self.dropped_by_level.get(levelno, 0) + 1
+        )
+        self._pending[levelno] = self._pending.get(levelno, 0) + 1
+
+    @property
+    def pending(self):
+        """
+        Whether records were dropped since the last summary.
+        """
+        return bool(self._pending)
+
+    def take_pending(self):
+        """
+        Get the records dropped since the last call, by level.
+
+        :returns: A dictionary of levels/numbers of dropped records.
+        """
+        pending, self._pending = self._pending, {}
+
+        return pending
+
+
+class RecordBuffer(object):
+    """
+    A bounded buffer of items, each with the level of the record it comes
+    from.
+
+    When the buffer is full, a new item is handled according to `policy`:
+
+    - :const:`BLOCK`: the item must wait for some room.
+    - :const:`DROP_NEWEST`: the item is dropped.
+    - :const:`DROP_OLDEST`: the oldest item is dropped to make room.
+    - :const:`DROP_BELOW_LEVEL`: the item is dropped if its level is below
+      `level`. Otherwise, the oldest item below `level` is dropped to make
+      room, and if there is none, the item must wait.
+
+    Once the buffer is back to half its size, a summary of the dropped items
+    is added before the next one.
+
+    This class is not thread-safe.
+
+    >>> buffer = RecordBuffer(2, policy=DROP_NEWEST, summarize=len)
+    >>> [buffer.offer(logging.INFO, item) for item in 'abc']
+    [True, True, True]
+    >>> buffer.popleft(), buffer.popleft()
+    ('a', 'b')
+    >>> buffer.offer(logging.INFO, 'd')
+    True
+    >>> list(buffer)
+    [1, 'd']
+    """
+
+    def __init__(
+        self,
+        max_size=None,
+        policy=BLOCK,
+        level=logging.WARNING,
+        summarize=make_drop_summary,
+        counter=None,
+    ):
+        """
+        Initialize a record buffer.
+
+        :param max_size: The maximum number of items, not counting the
+            summaries. If :const:`None`, the buffer is not bounded.
+        :param policy: The policy that applies when the buffer is full.
+        :param level: The level below which items are dropped first, with
+            the :const:`DROP_BELOW_LEVEL` policy.
+        :param summarize: A callable that takes a dictionary of
+            levels/numbers of dropped items and returns the item that
+            summarizes them.
+        :param counter: The :class:`DropCounter` to count dropped items with.
+            Buffers that share a counter share their summaries.
+        """
+        if policy not in POLICIES:
+            raise ValueError(
+                "Unknown policy: {0!r}. Expected one of: {1}".format(
+                    policy,
+                    ', '.join(POLICIES),
+                ),
+            )
+
+        if max_size is not None and max_size < 1:
+            raise ValueError(
+                "The maximum size must be positive: {0!r}".format(max_size),
+            )
+
+        self.max_size = max_size
+        self.policy = policy
+        self.level = level
+        self.summarize = summarize
+        self.counter = counter or DropCounter()
+        self._items = deque()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return (item for _, item in self._items)
+
+    def append(self, item, levelno=None):
+        """
+        Add an item, even if the buffer is full.
+
+        :param item: The item to add.
+        :param levelno: The level of the item. Items without a level are
+            never dropped, and not counted in the size of the buffer.
+        """
+        self._items.append((levelno, item))
+
+        if levelno is not None:
+            self._size += 1
+
+    def popleft(self):
+        """
+        Remove and return the oldest item.
+        """
+        levelno, item = self._items.popleft()
+
+        if levelno is not None:
+            self._size -= 1
+
+        return item
+
+    def peek(self):
+        """
+        Return the oldest item, without removing it.
+        """
+        return self._items[0][1]
+
+    def add_summary(self):
+        """
+        Add a summary of the items dropped since the last summary, if any.
+        """
+        if self.counter.pending:
+            self.append(self.summarize(self.counter.take_pending()))
+
+    def _drop_oldest(self, below=None):
+        for index, (levelno, _) in enumerate(self._items):
+            if levelno is not None and (below is None or levelno < below):
+                del self._items[index]
+                self._size -= 1
+                self.counter.add(levelno)
+
+                return True
+
+        return False
+
+    def offer(self, levelno, item):
+        """
+        Add an item, or drop it, according to the policy.
+
+        :param levelno: The level of the item.
+        :param item: The item to add.
+        :returns: :const:`False` if the item must wait for some room,
+            :const:`True` otherwise.
+        """
+        if self.max_size is None:
+            self.append(item, levelno)
+
+            return True
+
+        if self.counter.pending and self._size <= self.max_size // 2:
+            self.add_summary()
+
+        if self._size >= self.max_size:
+            if self.policy == BLOCK:
+                return False
+
+            if self.policy == DROP_NEWEST or (
+                self.policy == DROP_BELOW_LEVEL and levelno < self.level
+            ):
+                self.counter.add(levelno)
+
+                return True
+
+            if not self._drop_oldest(
+                self.level if self.policy == DROP_BELOW_LEVEL else None,
+            ):
+                return False
+
+        self.append(item, levelno)
+
+        return True
+
+
+class BoundedQueue(Queue):
+    """
+    A queue of records that applies the policy of a :class:`RecordBuffer`
+    when it is full.
+
+    Items without a `levelno` attribute, like the sentinel of a
+    :class:`logging.handlers.QueueListener`, are never dropped nor blocked,
+    and are preceded by a summary of the dropped records, if any.
+    """
+
+    def __init__(
+        self,
+        max_size,
+        policy=BLOCK,
+        level=logging.WARNING,
+        **kwargs
+    ):
+        """
+        Initialize a bounded queue.
+
+        The arguments are the ones of :class:`RecordBuffer`.
+        """
+        self.buffer = RecordBuffer(max_size, policy, level, **kwargs)
+        super(BoundedQueue, self).__init__()
+
+    @property
+    def counter(self):
+        """
+        The :class:`DropCounter` of the queue.
+        """
+        return self.buffer.counter
+
+    def _init(self, maxsize):
+        pass
+
+    def _qsize(self):
+        return len(self.buffer)
+
+    def _get(self):
+        return self.buffer.popleft()
+
+    def put(self, item, block=True, timeout=None, levelno=None):
+        """
+        Put an item in the queue.
+
+        :param item: The item to put.
+        :param block: Whether to wait for some room, if the item must.
+        :param timeout: The maximum number of seconds to wait for, if
+            `block` is :const:`True`.
+        :param levelno: The level of the item. Defaults to its `levelno`
+            attribute.
+        :raises queue.Full: If the item must wait but can't.
+        """
+        if levelno is None:
+            levelno = getattr(item, 'levelno', None)
+
+        with self.not_full:
+            size = len(self.buffer)
+
+            if levelno is None:
+                self.buffer.add_summary()
+                self.buffer.append(item)
+            else:
+                deadline = None
+
+                while not self.buffer.offer(levelno, item):
+                    if not block:
+                        raise Full
+
+                    if timeout is None:
+                        self.not_full.wait()
+                    else:
+                        if deadline is None:
+                            deadline = time.monotonic() + timeout
+
+                        remaining = deadline - time.monotonic()
+
+                        if remaining <= 0:
+                            raise Full
+
+                        self.not_full.wait(remaining)
+
+                    # Items were taken out while waiting.
+                    size = len(self.buffer)
+
+            added = len(self.buffer) - size
+
+            if added > 0:
+                self.unfinished_tasks += added
+                self.not_empty.notify(added)
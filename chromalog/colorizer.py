@@ -1,26 +1,34 @@
 """
 Colorizing functions and structures.
 """
-from builtins import object
-from six import (
-    string_types,
-    PY3,
+from collections import OrderedDict
+from itertools import permutations
+from threading import Lock
+
+from .sgr import (
+    BACK_RED,
+    BRIGHT,
+    DIM,
+    FORE_CYAN,
+    FORE_GREEN,
+    FORE_MAGENTA,
+    FORE_RED,
+    FORE_YELLOW,
+    RESET_ALL,
+    optimize_color_pair,
 )
 
-from colorama import (
-    Fore,
-    Back,
-    Style,
-)
-
-# Hack to define unicode in Python 3 and reach 100% coverage.
-unicode = str if PY3 else unicode
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
 
 
 class ColorizableMixin(object):
     """
     Make an object colorizable by a colorizer.
     """
+    __slots__ = ('color_tag',)
 
     def __init__(self, color_tag=None):
         """
@@ -37,7 +45,12 @@ class ColorizableMixin(object):
 class ColorizedObject(object):
     """
     Wraps any object to colorize it.
+
+    The string and the representation of a colorized object are computed
+    once, the first time they are requested. Colorized objects should
+    therefore not be modified after their creation.
     """
+    __slots__ = ('obj', 'color_pair', '_str', '_repr')
 
     def __init__(self, obj, color_pair=None):
         """
@@ -49,45 +62,44 @@ class ColorizedObject(object):
         """
         self.obj = obj
         self.color_pair = color_pair
+        self._str = None
+        self._repr = None
 
     def __repr__(self):
         """
         Gives a representation of the colorized object.
         """
-        if not self.color_pair:
-            return repr(self.obj)
-        else:
-            return "{color_start}{obj!r}{color_stop}".format(
-                color_start=self.color_pair[0],
-                obj=self.obj,
-                color_stop=self.color_pair[1],
-            )
+        result = self._repr
+
+        if result is None:
+            if not self.color_pair:
+                result = repr(self.obj)
+            else:
+                result = (
+                    self.color_pair[0] + repr(self.obj) + self.color_pair[1]
+                )
+
+            self._repr = result
+
+        return result
 
     def __str__(self):
         """
         Gives a string representation of the colorized object.
         """
-        if not self.color_pair:
-            return str(self.obj)
-        else:
-            return "{color_start}{obj}{color_stop}".format(
-                color_start=self.color_pair[0],
-                obj=self.obj,
-                color_stop=self.color_pair[1],
-            )
+        result = self._str
 
-    def __unicode__(self):
-        """
-        Gives a string representation of the colorized object.
-        """
-        if not self.color_pair:
-            return unicode(self.obj)
-        else:
-            return u"{color_start}{obj}{color_stop}".format(
-                color_start=self.color_pair[0],
-                obj=self.obj,
-                color_stop=self.color_pair[1],
-            )
+        if result is None:
+            if not self.color_pair:
+                result = str(self.obj)
+            else:
+                result = (
+                    self.color_pair[0] + str(self.obj) + self.color_pair[1]
+                )
+
+            self._str = result
+
+        return result
 
     def __int__(self):
         """
@@ -140,24 +152,271 @@ class ColorizedObject(object):
             )
 
 
+class ColorMap(Mapping):
+    """
+    An immutable, compiled color map.
+
+    Color tags are resolved to integer identifiers at construction time and
+    the color pairs of every single color tag, every alias and every ordered
+    couple of color tags are precomputed, so that resolving them is a single
+    lookup.
+
+    A :class:`ColorMap` can be used wherever a color map :class:`dict` is
+    expected.
+    """
+
+    def __init__(self, color_map=None, aliases=None, combinations=()):
+        """
+        Compile a color map.
+
+        :param color_map: A dictionary where the keys are color tags and the
+            values are couples of color sequences (start, stop).
+        :param aliases: A dictionary where the keys are alias names and the
+            values are lists of color tags (or other aliases) the alias
+            expands to.
+        :param combinations: An iterable of color tag lists whose color pairs
+            should be precomputed as well.
+
+        >>> color_map = ColorMap(
+        ...     {'a': ('[', ']'), 'b': ('<', '>')},
+        ...     aliases={'c': ['a', 'b']},
+        ... )
+
+        >>> color_map['c']
+        ('[<', '>]')
+
+        >>> color_map.resolve(('c', 'a'))
+        ('[<[', ']>]')
+
+        >>> color_map.resolve(('d',))
+        """
+        color_map = color_map or {}
+        aliases = aliases or {}
+
+        self._tags = tuple(tag for tag, pair in color_map.items() if pair)
+        self._pairs = tuple(color_map[tag] for tag in self._tags)
+        self._ids = dict((tag, id_) for id_, tag in enumerate(self._tags))
+        self._expansions = dict((tag, (self._ids[tag],)) for tag in self._tags)
+
+        for alias in aliases:
+            self._expand_alias(alias, aliases, ())
+
+        self._aliases = dict(
+            (alias, tuple(tags)) for alias, tags in aliases.items()
+        )
+        self._table = {}
+
+        for name in self._expansions:
+            self._table[(name,)] = self._compile((name,))
+
+        for combination in permutations(self._expansions, 2):
+            self._table[combination] = self._compile(combination)
+
+        for combination in combinations:
+            combination = tuple(combination)
+            self._table[combination] = self._compile(combination)
+
+    def _expand_alias(self, alias, aliases, stack):
+        expansion = self._expansions.get(alias)
+
+        if expansion is None:
+            if alias in stack:
+                raise ValueError(
+                    "Circular color tag alias: {0!r}".format(alias),
+                )
+
+            expansion = ()
+
+            for tag in aliases[alias]:
+                if tag in aliases:
+                    expansion += self._expand_alias(
+                        tag,
+                        aliases,
+                        stack + (alias,),
+                    )
+                else:
+                    expansion += self._expansions.get(tag, ())
+
+            self._expansions[alias] = expansion
+
+        return expansion
+
+    def _compile(self, color_tag):
+        ids = []
+
+        for tag in color_tag:
+            ids.extend(self._expansions.get(tag, ()))
+
+        if not ids:
+            return None
+
+        return (
+            ''.join(self._pairs[id_][0] for id_ in ids),
+            ''.join(self._pairs[id_][1] for id_ in reversed(ids)),
+        )
+
+    @property
+    def aliases(self):
+        """
+        A copy of the aliases of this color map.
+        """
+        return dict(self._aliases)
+
+    def resolve(self, color_tag):
+        """
+        Resolve a list of color tags into a color pair.
+
+        :param color_tag: A tuple of color tags.
+        :returns: The combined color pair of all the known color tags in
+            ``color_tag``, or :const:`None` if none of them is known.
+        """
+        try:
+            return self._table[color_tag]
+        except KeyError:
+            return self._compile(color_tag)
+
+    def __getitem__(self, tag):
+        pair = self._table.get((tag,))
+
+        if pair is None:
+            raise KeyError(tag)
+
+        return pair
+
+    def __iter__(self):
+        return iter(self._expansions)
+
+    def __len__(self):
+        return len(self._expansions)
+
+    def __repr__(self):
+        return '{klass}({color_map!r}, aliases={aliases!r})'.format(
+            klass=self.__class__.__name__,
+            color_map=dict(zip(self._tags, self._pairs)),
+            aliases=self._aliases,
+        )
+
+
+def _color_tag_key(color_tag):
+    """
+    Get a hashable key for a color tag.
+
+    :param color_tag: A color tag, a list of color tags or :const:`None`.
+    :returns: A tuple of color tags.
+
+    >>> _color_tag_key('a')
+    ('a',)
+
+    >>> _color_tag_key(['a', 'b'])
+    ('a', 'b')
+
+    >>> _color_tag_key(None)
+    ()
+    """
+    if not color_tag:
+        return ()
+    elif isinstance(color_tag, tuple):
+        return color_tag
+    elif isinstance(color_tag, str):
+        return (color_tag,)
+    else:
+        return tuple(color_tag)
+
+
 class GenericColorizer(object):
     """
     A class reponsible for colorizing log entries and
     :class:`chromalog.important.Important` objects.
     """
+    cache_size = 1024
+    optimize_color_pairs = True
+
     def __init__(self, color_map=None, default_color_tag=None):
         """
         Initialize a new colorizer with a specified `color_map`.
 
         :param color_map: A dictionary where the keys are color tags and the
-            value are couples of color sequences (start, stop).
+            value are couples of color sequences (start, stop), or a
+            :class:`ColorMap` instance.
         :param default_color_tag: The color tag to default to in case an
             unknown color tag is encountered. If set to a falsy value no
             default is used.
+
+        A color map that is not a :class:`ColorMap` is compiled into one the
+        first time a color pair is resolved.
+
+        Resolved color pairs are cached (see :attr:`cache_size`). The cache,
+        and the compiled color map, are invalidated whenever
+        :attr:`color_map` or :attr:`default_color_tag` are assigned. If you
+        modify :attr:`color_map` in place, call :meth:`clear_cache`
+        explicitly.
+        Objects that derive data from the color pairs, like
+        :class:`chromalog.patterns.PatternHighlighter`, compare
+        :attr:`cache_generation`, which is incremented every time the cache
+        is cleared, to know when to derive it again.
+
+        Unless :attr:`optimize_color_pairs` is :const:`False`, the SGR escape
+        sequences of the color pairs are optimized (see
+        :func:`chromalog.sgr.optimize_color_pair`) once, before being cached.
         """
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        self.cache_generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.color_map = color_map or self.default_color_map
         self.default_color_tag = default_color_tag
 
+    @property
+    def color_map(self):
+        """
+        The color map of this colorizer.
+        """
+        return self._color_map
+
+    @color_map.setter
+    def color_map(self, value):
+        self._color_map = value
+        self.clear_cache()
+
+    @property
+    def default_color_tag(self):
+        """
+        The color tag to default to in case an unknown color tag is
+        encountered.
+        """
+        return self._default_color_tag
+
+    @default_color_tag.setter
+    def default_color_tag(self, value):
+        self._default_color_tag = value
+        self.clear_cache()
+
+    def clear_cache(self):
+        """
+        Clear the color pairs cache.
+
+        The color map is compiled again, the cache hits and misses counters
+        are left untouched, and :attr:`cache_generation` is incremented.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+            self._compiled_color_map = None
+            self.cache_generation += 1
+
+    def _get_compiled_color_map(self):
+        color_map = self._compiled_color_map
+
+        if color_map is None:
+            color_map = self._color_map
+
+            if not isinstance(color_map, ColorMap):
+                color_map = ColorMap(color_map)
+
+            self._compiled_color_map = color_map
+
+        return color_map
+
     def get_color_pair(
         self,
         color_tag,
@@ -175,33 +434,63 @@ class GenericColorizer(object):
             map.
         :returns: A pair of color sequences.
         """
-        if isinstance(color_tag, string_types):
-            color_tag = [color_tag]
-
-        pairs = list(
-            filter(None, (self.color_map.get(tag) for tag in color_tag))
+        key = (
+            _color_tag_key(color_tag),
+            _color_tag_key(context_color_tag),
+            use_default,
         )
 
+        with self._cache_lock:
+            pair = self._cache.get(key)
+
+            if pair is not None:
+                self.cache_hits += 1
+
+                # Mark the entry as the most recently used.
+                del self._cache[key]
+                self._cache[key] = pair
+
+                return pair
+
+            self.cache_misses += 1
+
+        pair = self._resolve_color_pair(*key)
+
+        with self._cache_lock:
+            self._cache[key] = pair
+
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return pair
+
+    def _resolve_color_pair(self, color_tag, context_color_tag, use_default):
+        color_map = self._get_compiled_color_map()
+        pair = color_map.resolve(color_tag)
+        pairs = [pair] if pair else []
+
         if not pairs and use_default:
-            pair = self.color_map.get(self.default_color_tag)
+            pair = color_map.get(self.default_color_tag)
 
             if pair:
                 pairs = [pair]
 
         if context_color_tag:
-            ctx_pair = self.get_color_pair(
-                color_tag=context_color_tag,
-                use_default=False,
-            )
+            ctx_pair = color_map.resolve(context_color_tag)
 
             if ctx_pair:
                 pairs = [ctx_pair[::-1], ctx_pair] + pairs
 
-        return (
+        pair = (
             ''.join(x[0] for x in pairs),
             ''.join(x[1] for x in reversed(pairs)),
         )
 
+        if self.optimize_color_pairs:
+            pair = optimize_color_pair(pair)
+
+        return pair
+
     def colorize(self, obj, color_tag=None, context_color_tag=None):
         """
         Colorize an object.
@@ -228,6 +517,55 @@ class GenericColorizer(object):
 
         return ColorizedObject(obj=obj, color_pair=color_pair)
 
+    def colorize_many(
+        self,
+        objs,
+        color_tag=None,
+        context_color_tag=None,
+        separator=None,
+    ):
+        """
+        Colorize several objects at once.
+
+        :param objs: An iterable of objects to colorize.
+        :param color_tag: The color tag to use as a default for the objects
+            that are not marked.
+        :param context_color_tag: The color tag to use as context.
+        :param separator: If specified, the colorized objects are joined
+            with this separator.
+        :returns: A list of colorized objects, as :meth:`colorize` would
+            return them, or a string if `separator` is specified.
+
+        The color pair of each distinct color tag is resolved only once for
+        the whole batch (see :meth:`batch`).
+
+        >>> colorizer = GenericColorizer(color_map={'a': ('[', ']')})
+        >>> colorizer.colorize_many([1, 2, 3], color_tag='a', separator=' ')
+        '[1] [2] [3]'
+        """
+        colorize = self.batch().colorize
+        result = [
+            colorize(
+                obj,
+                color_tag=color_tag,
+                context_color_tag=context_color_tag,
+            )
+            for obj in objs
+        ]
+
+        if separator is None:
+            return result
+
+        return separator.join(map(str, result))
+
+    def batch(self):
+        """
+        Get a colorizer to colorize a batch of objects with.
+
+        :returns: A :class:`BatchColorizer` for this colorizer.
+        """
+        return BatchColorizer(self)
+
     def colorize_message(self, message, *args, **kwargs):
         """
         Colorize a message.
@@ -261,18 +599,111 @@ class GenericColorizer(object):
             return message.format(*args, **kwargs)
 
 
+class BatchColorizer(object):
+    """
+    A colorizer that resolves the color pairs of another colorizer at most
+    once.
+
+    Unlike the cache of :class:`GenericColorizer`, the color pairs of a batch
+    colorizer are neither bounded, locked nor invalidated: use a new one for
+    every batch of objects, from a single thread.
+
+    Batch colorizers compare equal to, and hash like, the colorizer they
+    wrap.
+    """
+
+    def __init__(self, colorizer):
+        """
+        Initialize a batch colorizer.
+
+        :param colorizer: The :class:`GenericColorizer` to resolve color pairs
+            with.
+        """
+        self.colorizer = colorizer
+        self._pairs = {}
+
+    def __eq__(self, other):
+        if isinstance(other, BatchColorizer):
+            other = other.colorizer
+
+        return self.colorizer == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.colorizer)
+
+    def get_color_pair(
+        self,
+        color_tag,
+        context_color_tag=None,
+        use_default=True,
+    ):
+        """
+        Get the color pairs for the specified `color_tag` and
+        `context_color_tag`.
+
+        See :meth:`GenericColorizer.get_color_pair`.
+        """
+        key = (color_tag, context_color_tag, use_default)
+
+        try:
+            return self._pairs[key]
+        except KeyError:
+            pair = self._pairs[key] = self.colorizer.get_color_pair(
+                color_tag=color_tag,
+                context_color_tag=context_color_tag,
+                use_default=use_default,
+            )
+        except TypeError:
+            # Color tags given as lists can't be memoized.
+            pair = self.colorizer.get_color_pair(
+                color_tag=color_tag,
+                context_color_tag=context_color_tag,
+                use_default=use_default,
+            )
+
+        return pair
+
+    @property
+    def cache_generation(self):
+        """
+        The cache generation of the colorizer this batch colorizer wraps.
+        """
+        return self.colorizer.cache_generation
+
+    def batch(self):
+        """
+        Get a colorizer to colorize a batch of objects with.
+
+        :returns: This batch colorizer.
+        """
+        return self
+
+    colorize = GenericColorizer.colorize
+    colorize_many = GenericColorizer.colorize_many
+    colorize_message = GenericColorizer.colorize_message
+
+
 class Colorizer(GenericColorizer):
     """
     Colorize log entries.
     """
     default_color_map = {
-        'debug': (Style.DIM + Fore.CYAN, Style.RESET_ALL),
-        'info': (Style.RESET_ALL, Style.RESET_ALL),
-        'important': (Style.BRIGHT, Style.RESET_ALL),
-        'success': (Fore.GREEN, Style.RESET_ALL),
-        'warning': (Fore.YELLOW, Style.RESET_ALL),
-        'error': (Fore.RED, Style.RESET_ALL),
-        'critical': (Back.RED, Style.RESET_ALL),
+        'debug': (DIM + FORE_CYAN, RESET_ALL),
+        'info': (RESET_ALL, RESET_ALL),
+        'important': (BRIGHT, RESET_ALL),
+        'success': (FORE_GREEN, RESET_ALL),
+        'warning': (FORE_YELLOW, RESET_ALL),
+        'error': (FORE_RED, RESET_ALL),
+        'critical': (BACK_RED, RESET_ALL),
+        'string': (FORE_GREEN, RESET_ALL),
+        'uuid': (FORE_MAGENTA, RESET_ALL),
+        'ip': (FORE_MAGENTA, RESET_ALL),
+        'duration': (FORE_CYAN, RESET_ALL),
+        'number': (FORE_CYAN, RESET_ALL),
+        'keyword': (BRIGHT, RESET_ALL),
     }
 
 
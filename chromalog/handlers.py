@@ -0,0 +1,188 @@
+"""
+Handlers that colorize and format records away from the calling thread.
+"""
+import logging
+
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+)
+from queue import Queue
+
+from .buffer import (
+    BLOCK,
+    BoundedQueue,
+)
+from .log import ColorizingStreamHandler
+
+
+class ColorizingQueueListener(QueueListener):
+    """
+    A queue listener that colorizes, formats and writes records on a
+    background thread.
+    """
+
+    def __init__(self, queue, *handlers, **kwargs):
+        """
+        Initializes a colorizing queue listener.
+
+        :param queue: The queue to read records from.
+        :param handlers: The handlers to pass the records to. If no handler is
+            specified, a :class:`chromalog.log.ColorizingStreamHandler` is
+            created from the `stream`, `colorizer`, `highlighter` and
+            `attributes_map` keyword arguments.
+        :param respect_handler_level: If :const:`True`, the level of each
+            handler is checked before passing it a record.
+
+        The other keyword arguments are passed to
+        :class:`chromalog.log.ColorizingStreamHandler`.
+        """
+        respect_handler_level = kwargs.pop('respect_handler_level', False)
+
+        if handlers:
+            if kwargs:
+                raise TypeError(
+                    "Unexpected keyword arguments: {0}".format(
+                        ', '.join(sorted(kwargs)),
+                    ),
+                )
+
+            self.handler = None
+        else:
+            self.handler = ColorizingStreamHandler(**kwargs)
+            handlers = (self.handler,)
+
+        super(ColorizingQueueListener, self).__init__(
+            queue,
+            *handlers,
+            respect_handler_level=respect_handler_level
+        )
+
+    def stop(self):
+        """
+        Stop the listener.
+
+        All the records that were enqueued before the call are handled before
+        this method returns. Stopping a stopped listener does nothing.
+        """
+        if self._thread is None:
+            return
+
+        super(ColorizingQueueListener, self).stop()
+
+        for handler in self.handlers:
+            handler.flush()
+
+
+class ColorizingQueueHandler(QueueHandler):
+    """
+    A handler that enqueues records to be colorized, formatted and written by
+    a :class:`ColorizingQueueListener`.
+
+    The calling thread only puts the record in the queue. The record is not
+    formatted or modified, so that :class:`chromalog.mark.Mark` arguments
+    reach the listener intact.
+
+    .. warning::
+        As the message of a record is computed on the listener thread, the
+        arguments of a record must not be modified after it was logged.
+    """
+
+    def __init__(
+        self,
+        queue=None,
+        max_size=None,
+        policy=BLOCK,
+        drop_level=logging.WARNING,
+        **kwargs
+    ):
+        """
+        Initializes a colorizing queue handler.
+
+        :param queue: The queue to put records in. If not specified, a queue
+            is created along with a started :class:`ColorizingQueueListener`,
+            which is stopped (and drained) when the handler is closed. In that
+            case, the other keyword arguments are passed to the listener.
+        :param max_size: If specified, and `queue` is not, the created queue
+            is a :class:`chromalog.buffer.BoundedQueue` of at most that many
+            records, with the `policy` and `drop_level` arguments.
+        :param policy: The policy that applies when the created queue is
+            full. See :class:`chromalog.buffer.RecordBuffer`.
+        :param drop_level: The level below which records are dropped first,
+            with the :const:`chromalog.buffer.DROP_BELOW_LEVEL` policy.
+        """
+        if queue is None:
+            if max_size is None:
+                queue = Queue()
+            else:
+                queue = BoundedQueue(max_size, policy, drop_level)
+
+            listener = ColorizingQueueListener(queue, **kwargs)
+            listener.start()
+        else:
+            if max_size is not None:
+                kwargs['max_size'] = max_size
+
+            if kwargs:
+                raise TypeError(
+                    "Unexpected keyword arguments: {0}".format(
+                        ', '.join(sorted(kwargs)),
+                    ),
+                )
+
+            listener = None
+
+        super(ColorizingQueueHandler, self).__init__(queue)
+        # Since Python 3.12, the base class sets its own `listener`.
+        self.listener = listener
+
+    @property
+    def drop_counter(self):
+        """
+        The :class:`chromalog.buffer.DropCounter` of the queue, if it is a
+        :class:`chromalog.buffer.BoundedQueue`, or :const:`None`.
+        """
+        return getattr(self.queue, 'counter', None)
+
+    def enqueue(self, record):
+        """
+        Put a record in the queue.
+
+        A :class:`chromalog.buffer.BoundedQueue` decides by itself whether to
+        wait for some room, according to its policy. Other queues are never
+        waited for.
+        """
+        self.queue.put(record, block=isinstance(self.queue, BoundedQueue))
+
+    def prepare(self, record):
+        """
+        Prepare a record for enqueuing.
+
+        :param record: The record to prepare.
+        :returns: `record`, unmodified.
+        """
+        return record
+
+    def setFormatter(self, fmt):
+        """
+        Set the formatter of the handler.
+
+        If the handler owns its listener, the formatter of the listener's
+        colorizing stream handler is set as well.
+        """
+        super(ColorizingQueueHandler, self).setFormatter(fmt)
+
+        if self.listener and self.listener.handler:
+            self.listener.handler.setFormatter(fmt)
+
+    def close(self):
+        """
+        Close the handler.
+
+        If the handler owns its listener, the listener is stopped after all
+        the enqueued records were written.
+        """
+        if self.listener:
+            self.listener.stop()
+
+        super(ColorizingQueueHandler, self).close()
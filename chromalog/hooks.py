@@ -0,0 +1,217 @@
+"""
+Hooks around the internals of chromalog, for tracing and profiling.
+
+A hook is a callable that takes the arguments of the hooked method, including
+the instance it is called on, and returns a context manager that is entered
+around the call:
+
+>>> from contextlib import contextmanager
+>>> from chromalog.colorizer import GenericColorizer
+>>> @contextmanager
+... def trace(colorizer, color_tag, *args, **kwargs):
+...     print('Resolving {0}'.format(color_tag))
+...     yield
+>>> with registered(COLOR_PAIR, trace):
+...     GenericColorizer({'a': ('<', '>')}).get_color_pair('a')
+Resolving a
+('<', '>')
+
+While no hook is registered at a hook point, the hooked methods are the
+original ones: hooks cost nothing until they are used.
+"""
+import importlib
+
+from contextlib import (
+    ExitStack,
+    contextmanager,
+)
+from functools import wraps
+from threading import Lock
+
+from .log import _plain_classes
+
+HANDLER_FORMAT = 'handler.format'
+FORMATTER_OVERLAY = 'formatter.overlay'
+COLOR_PAIR = 'colorizer.get_color_pair'
+STREAM_WRITE = 'stream.write'
+
+# The methods of each hook point. Subclasses that override them without
+# calling them are hooked explicitly.
+_TARGETS = {
+    HANDLER_FORMAT: (
+        'chromalog.log:ColorizingStreamHandler.format',
+        'chromalog.spans:FanOutHandler.format_spans',
+    ),
+    FORMATTER_OVERLAY: (
+        'chromalog.log:ColorizingFormatter._record_overlay',
+    ),
+    COLOR_PAIR: (
+        'chromalog.colorizer:GenericColorizer.get_color_pair',
+        'chromalog.spans:SpanColorizer.get_color_pair',
+    ),
+    STREAM_WRITE: (
+        'chromalog.log:ColorizingStreamHandler._write_stream',
+        'chromalog.aio:AsyncColorizingStreamHandler._write_stream',
+        'chromalog.spans:FanOutHandler._write_stream',
+    ),
+}
+HOOK_POINTS = tuple(sorted(_TARGETS))
+
+_hooks = {}
+_originals = {}
+_lock = Lock()
+
+
+def _resolve(target):
+    module_name, path = target.split(':')
+    class_name, attribute = path.split('.')
+    cls = getattr(importlib.import_module(module_name), class_name)
+
+    return cls, attribute
+
+
+def _instrument(function, hooks):
+    if len(hooks) == 1:
+        hook, = hooks
+
+        def instrumented(*args, **kwargs):
+            with hook(*args, **kwargs):
+                return function(*args, **kwargs)
+    else:
+        def instrumented(*args, **kwargs):
+            with ExitStack() as stack:
+                for hook in hooks:
+                    stack.enter_context(hook(*args, **kwargs))
+
+                return function(*args, **kwargs)
+
+    return wraps(function)(instrumented)
+
+
+def _install(point):
+    hooks = _hooks.get(point, ())
+
+    for target in _TARGETS[point]:
+        cls, attribute = _resolve(target)
+
+        if target not in _originals:
+            _originals[target] = cls.__dict__[attribute]
+
+        if hooks:
+            setattr(cls, attribute, _instrument(_originals[target], hooks))
+        else:
+            setattr(cls, attribute, _originals.pop(target))
+
+    # Hooked handlers can't write records like logging.StreamHandler does.
+    _plain_classes.clear()
+
+
+def _check_point(point):
+    if point not in _TARGETS:
+        raise ValueError(
+            "Unknown hook point: {0!r}. Expected one of: {1}".format(
+                point,
+                ', '.join(HOOK_POINTS),
+            ),
+        )
+
+
+def register(point, hook):
+    """
+    Register a hook.
+
+    :param point: The hook point: :const:`HANDLER_FORMAT`,
+        :const:`FORMATTER_OVERLAY`, :const:`COLOR_PAIR` or
+        :const:`STREAM_WRITE`.
+    :param hook: A callable that takes the arguments of the hooked method
+        and returns a context manager. Hooks registered at the same point
+        are entered in the order they were registered.
+
+    The hooked methods are:
+
+    - :const:`HANDLER_FORMAT`:
+      :meth:`chromalog.log.ColorizingStreamHandler.format` and
+      :meth:`chromalog.spans.FanOutHandler.format_spans`, called with the
+      handler and the record.
+    - :const:`FORMATTER_OVERLAY`: the method of
+      :class:`chromalog.log.ColorizingFormatter` that colorizes the
+      attributes of a record before it is formatted, called with the
+      formatter, the record, the colorizer, the message color tag and the
+      overriden attributes.
+    - :const:`COLOR_PAIR`:
+      :meth:`chromalog.colorizer.GenericColorizer.get_color_pair` and its
+      span counterpart, called with the colorizer, the color tag and,
+      optionally, the context color tag and `use_default`. A
+      :class:`chromalog.colorizer.BatchColorizer` looks each color pair up
+      once, with the colorizer it wraps.
+    - :const:`STREAM_WRITE`: the method of
+      :class:`chromalog.log.ColorizingStreamHandler` that writes to the
+      stream, called with the handler and the data to write, and with the
+      level of the record for
+      :class:`chromalog.aio.AsyncColorizingStreamHandler`, or the stream
+      for :class:`chromalog.spans.FanOutHandler`.
+    """
+    _check_point(point)
+
+    with _lock:
+        _hooks[point] = _hooks.get(point, ()) + (hook,)
+        _install(point)
+
+
+def unregister(point, hook):
+    """
+    Unregister a hook.
+
+    :param point: The hook point `hook` was registered at.
+    :param hook: The hook to unregister.
+    :raises ValueError: If `hook` is not registered at `point`.
+
+    Once the last hook of a point is unregistered, the original methods are
+    restored.
+    """
+    _check_point(point)
+
+    with _lock:
+        hooks = list(_hooks.get(point, ()))
+
+        if hook not in hooks:
+            raise ValueError(
+                "Hook not registered at {0}: {1!r}".format(point, hook),
+            )
+
+        hooks.remove(hook)
+
+        if hooks:
+            _hooks[point] = tuple(hooks)
+        else:
+            del _hooks[point]
+
+        _install(point)
+
+
+def registered_hooks(point):
+    """
+    Get the hooks registered at a hook point.
+
+    :param point: The hook point.
+    :returns: A tuple of hooks.
+    """
+    _check_point(point)
+
+    return _hooks.get(point, ())
+
+
+@contextmanager
+def registered(point, hook):
+    """
+    Register a hook for the duration of a `with` block.
+
+    :param point: The hook point.
+    :param hook: The hook to register.
+    """
+    register(point, hook)
+
+    try:
+        yield hook
+    finally:
+        unregister(point, hook)
@@ -1,18 +1,230 @@
 """
 Log-related functions and structures.
 """
-from builtins import map
-
+import re
 import sys
 import logging
 
-from colorama import AnsiToWin32
+from collections import (
+    ChainMap,
+    OrderedDict,
+)
 from functools import partial
-from contextlib import contextmanager
+from threading import Timer
+from time import perf_counter_ns
+from string import (
+    Formatter,
+    Template,
+)
 
 from .colorizer import Colorizer
-from .mark.objects import Mark
-from .stream import stream_has_color_support
+from .mark.objects import (
+    Mark,
+    make_color_tag,
+)
+from .stats import (
+    FormatterStats,
+    HandlerStats,
+    StatsDumper,
+    cache_stats,
+)
+from .stream import (
+    stream_has_color_support,
+    stream_needs_ansi_conversion,
+)
+
+_MISSING = object()
+
+_PERCENT_FIELD_RE = re.compile(
+    r'%\((?P<field>[^)]*)\)[#0+ -]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?'
+    r'(?P<conversion>[a-zA-Z%])',
+)
+
+
+def format_fields(fmt, style='%'):
+    """
+    Get the record attributes that a format string renders as strings.
+
+    :param fmt: The format string.
+    :param style: The style of the format string, as in
+        :class:`logging.Formatter`.
+    :returns: A tuple of record attribute names, in order of appearance.
+        Attributes that are rendered with a numeric conversion or with a
+        format specification are not included.
+
+    >>> format_fields('%(levelname)-8s:%(name)s:%(lineno)d:%(message)s')
+    ('levelname', 'name', 'message')
+
+    >>> format_fields('{levelname}:{name!r}:{lineno:d}', style='{')
+    ('levelname', 'name')
+
+    >>> format_fields('$levelname:${name}', style='$')
+    ('levelname', 'name')
+    """
+    fields = []
+
+    if style == '{':
+        for _, field, format_spec, _ in Formatter().parse(fmt):
+            if field and not format_spec:
+                fields.append(re.split(r'[.[]', field, maxsplit=1)[0])
+    elif style == '$':
+        for match in Template.pattern.finditer(fmt):
+            field = match.group('named') or match.group('braced')
+
+            if field:
+                fields.append(field)
+    else:
+        for match in _PERCENT_FIELD_RE.finditer(fmt):
+            if match.group('conversion') in 'sra':
+                fields.append(match.group('field'))
+
+    return tuple(sorted(set(fields), key=fields.index))
+
+
+class LevelColorTag(object):
+    """
+    A color tag function that only depends on the level of a record.
+
+    The color tag is computed once per level number and then memoized.
+
+    >>> color_tag = LevelColorTag(lambda record: record.levelname.lower())
+    >>> color_tag(logging.makeLogRecord({'levelno': 10, 'levelname': 'DEBUG'}))
+    'debug'
+    """
+
+    def __init__(self, func):
+        """
+        Initialize a level color tag.
+
+        :param func: A function that takes a `LogRecord` and returns a color
+            tag. It must only depend on the level of the record.
+        """
+        self.func = func
+        self._color_tags = {}
+
+    def __call__(self, record):
+        try:
+            return self._color_tags[record.levelno]
+        except KeyError:
+            color_tag = self.func(record)
+            self._color_tags[record.levelno] = color_tag
+
+            return color_tag
+
+
+def compile_color_tag(color_tag):
+    """
+    Compile a color tag from an attributes map.
+
+    :param color_tag: A constant color tag, a color tag template (as in
+        :meth:`str.format`) that refers to record attributes, or a function
+        that takes a `LogRecord` and returns a color tag.
+    :returns: A function that takes a `LogRecord` and returns a color tag, or
+        a constant color tag.
+
+    Templates only fetch the attributes they refer to. Templates that only
+    refer to ``levelname`` or ``levelno`` are memoized per level, as
+    :class:`LevelColorTag` instances.
+
+    >>> compile_color_tag('important')
+    'important'
+
+    >>> compile_color_tag('{{important}}')
+    '{important}'
+
+    >>> compile_color_tag('{name}')(logging.makeLogRecord({'name': 'a'}))
+    'a'
+    """
+    if hasattr(color_tag, '__call__'):
+        return color_tag
+
+    fields = tuple(set(
+        re.split(r'[.[]', field, maxsplit=1)[0]
+        for _, field, _, _ in Formatter().parse(color_tag)
+        if field is not None
+    ))
+
+    if not fields:
+        return color_tag.format()
+
+    def get_color_tag(record):
+        return color_tag.format(**dict(
+            (field, getattr(record, field)) for field in fields
+        ))
+
+    if set(fields) <= set(['levelname', 'levelno']):
+        return LevelColorTag(get_color_tag)
+
+    return get_color_tag
+
+
+class RecordView(object):
+    """
+    A view over a `LogRecord` that overrides some of its attributes.
+
+    Attribute lookups are resolved in the overlay first and then in the
+    record. Attribute assignments only ever modify the overlay, so that the
+    viewed record is left untouched.
+    """
+    __slots__ = ('_record', '_overlay')
+
+    def __init__(self, record, overlay=None):
+        """
+        Initialize a record view.
+
+        :param record: The `LogRecord` instance to view.
+        :param overlay: A dictionary of attributes that take precedence over
+            the attributes of `record`.
+
+        >>> record = logging.makeLogRecord({'name': 'a'})
+        >>> view = RecordView(record, {'name': 'b'})
+        >>> view.name
+        'b'
+        >>> view.levelname = 'c'
+        >>> view.levelname, record.levelname
+        ('c', 'Level None')
+        """
+        if overlay is None:
+            overlay = {}
+
+        if isinstance(record, RecordView):
+            # A view of a view is a view of the record with both overlays.
+            overlay = dict(record._overlay, **overlay)
+            record = record._record
+
+        object.__setattr__(self, '_record', record)
+        object.__setattr__(self, '_overlay', overlay)
+
+    @property
+    def __dict__(self):
+        """
+        The attributes of the view, as a mapping.
+        """
+        return ChainMap(self._overlay, self._record.__dict__)
+
+    def __getattr__(self, name):
+        try:
+            return self._overlay[name]
+        except KeyError:
+            return getattr(self._record, name)
+
+    def __setattr__(self, name, value):
+        self._overlay[name] = value
+
+    def __delattr__(self, name):
+        del self._overlay[name]
+
+    def getMessage(self):
+        """
+        Get the message of the viewed record, computed with the arguments of
+        the view.
+        """
+        message = self._overlay.get('message', _MISSING)
+
+        if message is _MISSING:
+            return self._record.__class__.getMessage(self)
+
+        return message
 
 
 class ColorizingFormatter(logging.Formatter, object):
@@ -20,47 +232,129 @@ class ColorizingFormatter(logging.Formatter, object):
     A formatter that colorize its output.
     """
 
-    @contextmanager
-    def _patch_record(self, record, colorizer, message_color_tag):
-        save_dict = record.__dict__.copy()
+    def __init__(self, fmt=None, datefmt=None, style='%', *args, **kwargs):
+        """
+        Initializes a colorizing formatter.
+
+        :param fmt: The format string.
+        :param datefmt: The date format string.
+        :param style: The style of the format string.
+        :param collect_stats: If :const:`True`, the time spent colorizing and
+            formatting records is measured. See :meth:`stats`.
+        :param stats_callback: A callable that is passed a :meth:`stats`
+            snapshot every `stats_interval` seconds, and when the formatter
+            is closed, from a background thread. Implies `collect_stats`.
+        :param stats_interval: The number of seconds between two calls to
+            `stats_callback`.
+
+        Other arguments are passed to :class:`logging.Formatter`.
+
+        The format string is parsed once and only the record attributes it
+        renders as strings (including `extra` attributes) are colorized.
+        """
+        collect_stats = kwargs.pop('collect_stats', False)
+        stats_callback = kwargs.pop('stats_callback', None)
+        stats_interval = kwargs.pop('stats_interval', 60.0)
+        super(ColorizingFormatter, self).__init__(
+            fmt,
+            datefmt,
+            style,
+            *args,
+            **kwargs
+        )
+        self.colorized_attributes = tuple(
+            attribute for attribute in format_fields(self._fmt, style)
+            if attribute not in ('message', 'asctime')
+        )
+        self._stats = (
+            FormatterStats() if collect_stats or stats_callback else None
+        )
+        self._stats_dumper = None
+
+        if stats_callback:
+            self._stats_dumper = StatsDumper(
+                stats_interval,
+                lambda: stats_callback(self.stats()),
+            )
+            self._stats_dumper.start()
+
+    def close(self):
+        """
+        Stop passing statistics to the `stats_callback` of the formatter,
+        after passing them one last time.
+
+        Handlers don't close their formatters, as they may be shared.
+        """
+        if self._stats_dumper:
+            self._stats_dumper.stop()
+            self._stats_dumper = None
+
+    def stats(self):
+        """
+        Get the time spent colorizing and formatting records.
+
+        :returns: A dictionary of phases (``colorize`` and ``format``)/
+            :meth:`chromalog.stats.Histogram.snapshot` dictionaries, or
+            :const:`None` if the formatter doesn't collect statistics.
+
+        Colorizing covers the colorization of the arguments, attributes and
+        message of a record. Formatting covers the rest.
+        """
+        if self._stats is None:
+            return None
+
+        return self._stats.snapshot()
+
+    def _record_overlay(
+        self,
+        record,
+        colorizer,
+        message_color_tag,
+        attributes,
+    ):
+        overlay = {}
+
+        if attributes:
+            overlay.update(attributes)
 
         if colorizer:
-            if isinstance(record.args, dict):
-                record.args = dict(
+            args = overlay.get('args', record.args)
+
+            if isinstance(args, dict):
+                overlay['args'] = dict(
                     (
                         k, colorizer.colorize(
                             v, context_color_tag=message_color_tag
                         )
-                    ) for k, v in record.args.items()
+                    ) for k, v in args.items()
                 )
             else:
-                record.args = tuple(map(
+                overlay['args'] = tuple(map(
                     partial(
                         colorizer.colorize,
                         context_color_tag=message_color_tag,
                     ),
-                    record.args,
+                    args,
                 ))
-            record.filename = colorizer.colorize(record.filename)
-            record.funcName = colorizer.colorize(record.funcName)
-            record.levelname = colorizer.colorize(record.levelname)
-            record.module = colorizer.colorize(record.module)
-            record.name = colorizer.colorize(record.name)
-            record.pathname = colorizer.colorize(record.pathname)
-            record.processName = colorizer.colorize(record.processName)
-            record.threadName = colorizer.colorize(record.threadName)
+
+            for attribute in self.colorized_attributes:
+                value = overlay.get(attribute, _MISSING)
+
+                if value is _MISSING:
+                    value = getattr(record, attribute, _MISSING)
+
+                    if value is _MISSING:
+                        continue
+
+                overlay[attribute] = colorizer.colorize(value)
 
             if message_color_tag:
-                message = colorizer.colorize(Mark(
-                    record.getMessage(),
+                overlay['message'] = colorizer.colorize(Mark(
+                    RecordView(record, overlay).getMessage(),
                     color_tag=message_color_tag,
                 ))
-                record.getMessage = lambda: message
 
-        try:
-            yield
-        finally:
-            record.__dict__ = save_dict
+        return overlay
 
     def format(self, record):
         """
@@ -73,31 +367,213 @@ class ColorizingFormatter(logging.Formatter, object):
             use for colorizing the formatted string. If no such attribute is
             found, the default non-colorized behaviour is used instead.
         """
-        colorizer = getattr(record, 'colorizer', None)
-        message_color_tag = getattr(record, 'message_color_tag', None)
+        return self.format_colorized(
+            record,
+            colorizer=getattr(record, 'colorizer', None),
+            message_color_tag=getattr(record, 'message_color_tag', None),
+        )
+
+    def format_colorized(
+        self,
+        record,
+        colorizer,
+        message_color_tag=None,
+        attributes=None,
+    ):
+        """
+        Colorize and format a record without modifying it.
+
+        :param record: A `LogRecord` instance.
+        :param colorizer: The colorizer to use. If :const:`None`, the default
+            non-colorized behaviour is used.
+        :param message_color_tag: The color tag to colorize the message with.
+        :param attributes: A dictionary of attributes that override the ones
+            of `record` during formatting.
+        :returns: The colorized formatted string.
+
+        The formatting happens on a :class:`RecordView` of `record`, which is
+        never modified.
+        """
+        stats = self._stats
+
+        if stats is not None:
+            return self._format_colorized_with_stats(
+                stats,
+                record,
+                colorizer,
+                message_color_tag,
+                attributes,
+            )
 
-        with self._patch_record(record, colorizer, message_color_tag):
+        if not colorizer and not attributes:
             return super(ColorizingFormatter, self).format(record)
 
+        return super(ColorizingFormatter, self).format(RecordView(
+            record,
+            self._record_overlay(
+                record,
+                colorizer,
+                message_color_tag,
+                attributes,
+            ),
+        ))
+
+    def _format_colorized_with_stats(
+        self,
+        stats,
+        record,
+        colorizer,
+        message_color_tag,
+        attributes,
+    ):
+        start = perf_counter_ns()
+
+        if not colorizer and not attributes:
+            result = super(ColorizingFormatter, self).format(record)
+            stats.add(perf_counter_ns() - start)
+
+            return result
+
+        overlay = self._record_overlay(
+            record,
+            colorizer,
+            message_color_tag,
+            attributes,
+        )
+        colorized = perf_counter_ns()
+        result = super(ColorizingFormatter, self).format(
+            RecordView(record, overlay),
+        )
+        stats.add(perf_counter_ns() - colorized, colorized - start)
+
+        return result
 
-class ColorizingStreamHandler(logging.StreamHandler, object):
+
+class ColorizingHandlerMixin(object):
     """
-    A stream handler that colorize its output.
+    Colorizes the attributes of the records of a handler, according to a map
+    of LogRecord attributes/color tags.
     """
 
-    _RECORD_ATTRIBUTE_NAME = 'colorizer'
+    patterns = None
     default_attributes_map = {
         'name': 'important',
-        'levelname': lambda record: str(record.levelname).lower(),
-        'message': lambda record: str(record.levelname).lower(),
+        'levelname': LevelColorTag(
+            lambda record: str(record.levelname).lower(),
+        ),
+        'message': LevelColorTag(
+            lambda record: str(record.levelname).lower(),
+        ),
     }
 
+    @property
+    def attributes_map(self):
+        """
+        The map of LogRecord attributes/color tags.
+
+        The map is compiled when assigned (see
+        :func:`compile_color_tag`): assign a new map rather than modifying it
+        in place.
+        """
+        return self._attributes_map
+
+    @attributes_map.setter
+    def attributes_map(self, value):
+        self._attributes_map = value
+        self._message_color_tag = None
+        self._attribute_color_tags = []
+
+        for attribute, color_tag in value.items():
+            color_tag = compile_color_tag(color_tag)
+
+            if not hasattr(color_tag, '__call__'):
+                color_tag = make_color_tag(color_tag)
+
+            if attribute == 'message':
+                self._message_color_tag = color_tag
+            else:
+                self._attribute_color_tags.append((attribute, color_tag))
+
+    def _format_colorized(
+        self,
+        record,
+        formatter,
+        colorizer,
+        attribute_color_tags,
+    ):
+        overriden = type(formatter).format is not ColorizingFormatter.format
+
+        if not colorizer:
+            if overriden:
+                return formatter.format(record)
+
+            return formatter.format_colorized(record, colorizer=None)
+
+        message_color_tag = self._message_color_tag
+
+        if hasattr(message_color_tag, '__call__'):
+            message_color_tag = message_color_tag(record)
+
+        attributes = {}
+
+        for attribute, color_tag in attribute_color_tags:
+            if attribute in formatter.colorized_attributes:
+                if hasattr(color_tag, '__call__'):
+                    color_tag = color_tag(record)
+
+                attributes[attribute] = Mark(
+                    getattr(record, attribute),
+                    color_tag=color_tag,
+                )
+
+        if self.patterns:
+            attributes['msg'], attributes['args'] = (
+                self.patterns.highlight_record(
+                    record,
+                    colorizer,
+                    context_color_tag=message_color_tag,
+                )
+            )
+
+        if overriden:
+            # Subclasses that override format() must still be called: they
+            # get the colorizer on a view of the record, like it was bound to
+            # the record itself.
+            attributes['colorizer'] = colorizer
+            attributes['message_color_tag'] = message_color_tag
+
+            return formatter.format(RecordView(record, attributes))
+
+        return formatter.format_colorized(
+            record,
+            colorizer=colorizer,
+            message_color_tag=message_color_tag,
+            attributes=attributes,
+        )
+
+
+class ColorizingStreamHandler(ColorizingHandlerMixin, logging.StreamHandler):
+    """
+    A stream handler that colorize its output.
+    """
+
+    _RECORD_ATTRIBUTE_NAME = 'colorizer'
+
     def __init__(
         self,
         stream=None,
         colorizer=None,
         highlighter=None,
         attributes_map=None,
+        buffer_size=0,
+        flush_interval=None,
+        flush_level=logging.ERROR,
+        patterns=None,
+        collapse_repeats=False,
+        collapse_window=None,
+        collect_stats=False,
+        stats_callback=None,
+        stats_interval=60.0,
     ):
         """
         Initializes a colorizing stream handler.
@@ -109,6 +585,35 @@ class ColorizingStreamHandler(logging.StreamHandler, object):
         :param highlighter: The colorizer to use for highlighting the output
             when color is not supported.
         :param attributes_map: A map of LogRecord attributes/color tags.
+        :param buffer_size: If positive, formatted records are buffered and
+            written to the stream in a single write once the buffer holds at
+            least that many characters. If zero, every record is written
+            immediately.
+        :param flush_interval: When buffering, the maximum number of seconds
+            a record may stay in the buffer before it is written.
+        :param flush_level: When buffering, records at or above this level
+            cause the buffer to be written immediately.
+        :param patterns: A :class:`chromalog.patterns.PatternHighlighter`
+            that highlights patterns, like IP addresses or numbers, in the
+            messages of the records, when they are colorized.
+        :param collapse_repeats: If :const:`True`, records that repeat the
+            previous one, with the same logger, level, message template and
+            arguments, are neither formatted nor written. Instead, a "last
+            message repeated N times" record is written when a different
+            record comes, or when the handler is closed.
+        :param collapse_window: When collapsing repeats, the maximum number
+            of seconds a run of repeats may last before it is reported.
+        :param collect_stats: If :const:`True`, the records the handler
+            handles and the time it spends on them are measured. See
+            :meth:`stats`.
+        :param stats_callback: A callable that is passed a :meth:`stats`
+            snapshot every `stats_interval` seconds, and when the handler is
+            closed, from a background thread. Implies `collect_stats`.
+        :param stats_interval: The number of seconds between two calls to
+            `stats_callback`.
+
+        The buffer is also written when the handler is flushed or closed,
+        which :func:`logging.shutdown` does at interpreter exit.
         """
         if not stream:
             stream = sys.stderr
@@ -117,7 +622,9 @@ class ColorizingStreamHandler(logging.StreamHandler, object):
         self.color_disabled = False
         self.attributes_map = attributes_map or self.default_attributes_map
 
-        if self.has_color_support:
+        if self.has_color_support and stream_needs_ansi_conversion(stream):
+            from colorama import AnsiToWin32
+
             stream = AnsiToWin32(stream).stream
 
         super(ColorizingStreamHandler, self).__init__(
@@ -125,56 +632,511 @@ class ColorizingStreamHandler(logging.StreamHandler, object):
         )
         self.colorizer = colorizer or Colorizer()
         self.highlighter = highlighter
-        self.setFormatter(ColorizingFormatter())
+        self.patterns = patterns
+        self._stats = (
+            HandlerStats() if collect_stats or stats_callback else None
+        )
+        self.setFormatter(ColorizingFormatter(
+            collect_stats=self._stats is not None,
+        ))
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self.buffered_records = 0
+        self.buffer_writes = 0
+        self._buffer = []
+        self._buffer_length = 0
+        self._flush_timer = None
+        self.collapse_repeats = collapse_repeats
+        self.collapse_window = collapse_window
+        self.repeated_records = 0
+        self._last_key = None
+        self._last_record = None
+        self._repeats = 0
+        self._repeat_timer = None
+        self._stats_dumper = None
+
+        if stats_callback:
+            self._stats_dumper = StatsDumper(
+                stats_interval,
+                lambda: stats_callback(self.stats()),
+            )
+            self._stats_dumper.start()
 
     @property
-    def active_colorizer(self):
+    def writes_saved(self):
         """
-        The active colorizer or highlighter depending on whether color is
-        supported.
+        The number of stream writes that buffering saved.
         """
+        return self.buffered_records - self.buffer_writes
+
+    def handle(self, record):
+        """
+        Filter a record and, if it passes, format and write it.
+
+        :param record: A `LogRecord` instance.
+        :returns: Whether the record passed the filters.
+
+        Unlike :meth:`logging.Handler.handle`, the record is colorized and
+        formatted in the calling thread without holding the lock of the
+        handler: only writing it is serialized, so that threads that log
+        concurrently don't wait for each other to format.
+
+        Subclasses that override :meth:`emit` are handled like by
+        :meth:`logging.Handler.handle`, which calls it with the lock held.
+
+        Without an active colorizer, buffering, statistics nor collapsing,
+        records are formatted and written like :class:`logging.StreamHandler`
+        does, unless the methods involved are overriden or hooked.
+        """
+        cls = type(self)
+
+        if cls.emit is not ColorizingStreamHandler.emit:
+            return super(ColorizingStreamHandler, self).handle(record)
+
+        plain = _plain_classes.get(cls)
+
+        if plain is None:
+            plain = _plain_classes[cls] = all(
+                getattr(cls, name) is method
+                for name, method in _PLAIN_METHODS
+            )
+
+        # Without anything to colorize, buffer, measure or collapse, write
+        # records like logging.StreamHandler does.
         if (
+            plain and
+            not self.highlighter and
+            not (
                 self.has_color_support and
                 not self.color_disabled and
                 self.colorizer
+            ) and
+            self.buffer_size <= 0 and
+            self._stats is None and
+            not self.collapse_repeats and
+            self.__dict__.keys().isdisjoint(_PLAIN_METHOD_NAMES)
         ):
-            return self.colorizer
+            return self._handle_plain(record)
 
-        return self.highlighter
+        result = self.filter(record)
+
+        if isinstance(result, logging.LogRecord):
+            record = result
+
+        if result:
+            stats = self._stats
+
+            if stats is not None:
+                stats.add_record(record)
+
+            if self.collapse_repeats:
+                self.acquire()
+
+                try:
+                    collapsed = self._collapse(record)
+                finally:
+                    self.release()
+
+                if collapsed:
+                    return result
+
+            try:
+                msg = self.format(record) + self.terminator
+            except Exception:
+                self.handleError(record)
+            else:
+                self.acquire()
+
+                try:
+                    if stats is None:
+                        self.write(msg, record)
+                    else:
+                        self._write_with_stats(stats, msg, record)
+                finally:
+                    self.release()
+
+        return result
+
+    def _handle_plain(self, record):
+        # Like logging.StreamHandler, but formatting without the lock held.
+        result = self.filter(record)
+
+        if isinstance(result, logging.LogRecord):
+            record = result
+
+        if result:
+            formatter = self.formatter
+
+            try:
+                if (
+                    type(formatter) is ColorizingFormatter and
+                    formatter._stats is None
+                ):
+                    # Without a colorizer, it formats like its base class.
+                    msg = logging.Formatter.format(formatter, record)
+                else:
+                    msg = logging.Handler.format(self, record)
 
-    @contextmanager
-    def __bind_to_record(self, record):
-        setattr(record, self._RECORD_ATTRIBUTE_NAME, self.active_colorizer)
+                msg += self.terminator
+                self.acquire()
+
+                try:
+                    stream = self.stream
+                    stream.write(msg)
+
+                    if hasattr(stream, 'flush'):
+                        stream.flush()
+                finally:
+                    self.release()
+            except RecursionError:
+                raise
+            except Exception:
+                self.handleError(record)
+
+        return result
+
+    def _collapse(self, record):
+        """
+        Count a record if it repeats the previous one.
+
+        :param record: A `LogRecord` instance.
+        :returns: Whether `record` is a repeat, that must not be written.
+
+        Records are compared without being formatted. Records with exception
+        or stack information are never repeats. The caller must hold the
+        lock of the handler.
+        """
+        if record.exc_info or record.stack_info:
+            key = None
+        else:
+            key = (record.name, record.levelno, record.msg, record.args)
 
         try:
-            yield
+            repeated = key is not None and key == self._last_key
+        except Exception:
+            # Arguments that can't be compared, like arrays.
+            repeated = False
+
+        if repeated:
+            self._repeats += 1
+            self.repeated_records += 1
+
+            if self.collapse_window is not None and not self._repeat_timer:
+                self._repeat_timer = Timer(
+                    self.collapse_window,
+                    self._on_collapse_window,
+                )
+                self._repeat_timer.daemon = True
+                self._repeat_timer.start()
+
+            return True
+
+        self._write_repeats()
+        self._last_key = key
+        self._last_record = record
+
+        return False
+
+    def _on_collapse_window(self):
+        self.acquire()
+
+        try:
+            self._write_repeats()
         finally:
-            delattr(record, self._RECORD_ATTRIBUTE_NAME)
+            self.release()
 
-    def _color_tag_from_record(self, color_tag, record):
-        if hasattr(color_tag, '__call__'):
-            return color_tag(record)
+    def _write_repeats(self):
+        """
+        Write the number of times the previous record was repeated, if it
+        was.
+
+        The caller must hold the lock of the handler.
+        """
+        if self._repeat_timer:
+            self._repeat_timer.cancel()
+            self._repeat_timer = None
+
+        if not self._repeats:
+            return
+
+        last = self._last_record
+        record = logging.makeLogRecord({
+            'name': last.name,
+            'levelno': last.levelno,
+            'levelname': last.levelname,
+            'pathname': last.pathname,
+            'filename': last.filename,
+            'module': last.module,
+            'lineno': last.lineno,
+            'funcName': last.funcName,
+            'msg': 'last message repeated %s times',
+            'args': (Mark(self._repeats, 'important'),),
+        })
+        self._repeats = 0
+
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+        else:
+            self.write(msg, record)
+
+    def emit(self, record):
+        """
+        Format and write a record.
+
+        The caller must hold the lock of the handler.
+        """
+        stats = self._stats
+
+        if stats is not None:
+            stats.add_record(record)
+
+        if self.collapse_repeats and self._collapse(record):
+            return
+
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
         else:
-            return color_tag.format(**record.__dict__)
+            if stats is None:
+                self.write(msg, record)
+            else:
+                self._write_with_stats(stats, msg, record)
+
+    def _write_with_stats(self, stats, msg, record):
+        start = perf_counter_ns()
+        self.write(msg, record)
+        stats.add_write(msg, perf_counter_ns() - start)
+
+    def stats(self):
+        """
+        Get a snapshot of the statistics of the handler.
+
+        :returns: A dictionary, or :const:`None` if the handler doesn't
+            collect statistics. It contains:
+
+            - ``records``: the number of handled records, by level name.
+            - ``bytes_written``: the number of bytes written, as encoded in
+              UTF-8.
+            - ``phases``: the ``colorize``, ``format`` and ``write``
+              :meth:`chromalog.stats.Histogram.snapshot` dictionaries. The
+              first two are only present if the formatter of the handler is
+              a :class:`ColorizingFormatter` that collects statistics, like
+              the default one.
+            - ``color_pair_cache``: the
+              :func:`chromalog.stats.cache_stats` dictionaries of the
+              ``colorizer`` and ``highlighter`` of the handler.
+        """
+        if self._stats is None:
+            return None
+
+        snapshot = self._stats.snapshot()
+        formatter = self.formatter
+
+        if isinstance(formatter, ColorizingFormatter):
+            phases = formatter.stats()
+
+            if phases:
+                phases.update(snapshot['phases'])
+                snapshot['phases'] = phases
+
+        snapshot['color_pair_cache'] = OrderedDict()
+
+        for name, colorizer in (
+            ('colorizer', self.colorizer),
+            ('highlighter', self.highlighter),
+        ):
+            colorizer_stats = cache_stats(colorizer)
+
+            if colorizer_stats:
+                snapshot['color_pair_cache'][name] = colorizer_stats
+
+        return snapshot
+
+    def write(self, msg, record):
+        """
+        Write a formatted record.
+
+        :param msg: The formatted record, followed by the terminator.
+        :param record: The `LogRecord` instance `msg` was formatted from.
+
+        When buffering is enabled, `msg` is appended to the buffer, which is
+        written depending on its size, on the level of `record` and on the
+        flush interval. The caller must hold the lock of the handler.
+        """
+        try:
+            if self.buffer_size <= 0:
+                self._write_stream(msg)
+                self.flush()
+                return
+
+            self._buffer.append(msg)
+            self._buffer_length += len(msg)
+            self.buffered_records += 1
+
+            if (
+                record.levelno >= self.flush_level or
+                self._buffer_length >= self.buffer_size
+            ):
+                self.flush()
+            elif self.flush_interval is not None and not self._flush_timer:
+                self._flush_timer = Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _write_stream(self, data):
+        self.stream.write(data)
+
+    def flush(self):
+        """
+        Write the buffered records, if any, and flush the stream.
+        """
+        self.acquire()
+
+        try:
+            if self._flush_timer:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            if self._buffer:
+                data = ''.join(self._buffer)
+                del self._buffer[:]
+                self._buffer_length = 0
+                self._write_stream(data)
+                self.buffer_writes += 1
+
+            super(ColorizingStreamHandler, self).flush()
+        finally:
+            self.release()
+
+    def close(self):
+        """
+        Write the repeats and the buffered records, if any, and close the
+        handler.
+        """
+        self.acquire()
+
+        try:
+            self._write_repeats()
+        finally:
+            self.release()
+
+        self.flush()
+
+        if self._stats_dumper:
+            self._stats_dumper.stop()
+            self._stats_dumper = None
+
+        super(ColorizingStreamHandler, self).close()
+
+    @property
+    def active_colorizer(self):
+        """
+        The active colorizer or highlighter depending on whether color is
+        supported.
+        """
+        if (
+                self.has_color_support and
+                not self.color_disabled and
+                self.colorizer
+        ):
+            return self.colorizer
+
+        return self.highlighter
 
     def format(self, record):
         """
         Format a `LogRecord` and prints it to the associated stream.
+
+        The record itself is never modified, which makes it safe to share it
+        with other handlers.
+
+        If there is no active colorizer, the record is formatted as a plain
+        `logging.StreamHandler` would.
         """
-        with self.__bind_to_record(record):
-            for attribute, color_tag in self.attributes_map.items():
-                if attribute == 'message':
-                    record.message_color_tag = self._color_tag_from_record(
-                        color_tag,
-                        record,
-                    )
-                else:
-                    setattr(record, attribute, Mark(
-                        getattr(record, attribute),
-                        color_tag=self._color_tag_from_record(
-                            color_tag,
-                            record,
-                        ),
-                    ))
+        formatter = self.formatter
 
+        if not isinstance(formatter, ColorizingFormatter):
             return super(ColorizingStreamHandler, self).format(record)
+
+        return self._format_colorized(
+            record,
+            formatter,
+            self.active_colorizer,
+            self._attribute_color_tags,
+        )
+
+    def format_batch(self, records):
+        """
+        Format several records at once.
+
+        :param records: An iterable of `LogRecord` instances.
+        :returns: The formatted records, each followed by the terminator of
+            the handler, as a single string ready to be written.
+
+        The records are not filtered. The formatter, the colorizer and the
+        color pairs are resolved once for the whole batch, which makes this
+        method faster than calling :meth:`format` on each record.
+
+        A record that can't be formatted is passed to :meth:`handleError`
+        and left out, and the other records are still formatted.
+        """
+        formatter = self.formatter
+
+        if not isinstance(formatter, ColorizingFormatter):
+            format_record = super(ColorizingStreamHandler, self).format
+        else:
+            colorizer = self.active_colorizer
+
+            if colorizer:
+                colorizer = colorizer.batch()
+
+            format_record = partial(
+                self._format_colorized,
+                formatter=formatter,
+                colorizer=colorizer,
+                attribute_color_tags=[
+                    (attribute, color_tag)
+                    for attribute, color_tag in self._attribute_color_tags
+                    if attribute in formatter.colorized_attributes
+                ],
+            )
+
+        terminator = self.terminator
+        result = []
+
+        for record in records:
+            try:
+                result.append(format_record(record) + terminator)
+            except RecursionError:
+                raise
+            except Exception:
+                self.handleError(record)
+
+        return ''.join(result)
+
+
+# ColorizingStreamHandler.handle() writes records like logging.StreamHandler
+# does while these methods are neither overriden nor hooked.
+_PLAIN_METHOD_NAMES = (
+    'format',
+    'write',
+    '_write_stream',
+    'flush',
+    'active_colorizer',
+)
+_PLAIN_METHODS = tuple(
+    (name, ColorizingStreamHandler.__dict__[name])
+    for name in _PLAIN_METHOD_NAMES
+)
+
+# Whether the methods above are the original ones, by handler class. Cleared
+# by chromalog.hooks whenever it replaces methods.
+_plain_classes = {}
@@ -4,7 +4,10 @@ Automatically generate marking helpers functions.
 
 import sys
 
-from .objects import Mark
+from .objects import (
+    Mark,
+    make_color_tag,
+)
 
 
 class SimpleHelpers(object):
@@ -26,8 +29,10 @@ class SimpleHelpers(object):
         helper = self.__helpers.get(color_tag)
 
         if not helper:
+            interned_color_tag = make_color_tag(color_tag)
+
             def helper(obj):
-                return Mark(obj=obj, color_tag=color_tag)
+                return Mark(obj=obj, color_tag=interned_color_tag)
 
             helper.__name__ = color_tag
             helper.__doc__ = """
@@ -87,13 +92,19 @@ class ConditionalHelpers(object):
         )
 
         if not helper:
+            interned_color_tag_true = make_color_tag(color_tag_true)
+            interned_color_tag_false = make_color_tag(color_tag_false)
+
             def helper(obj, condition=None):
                 if condition is None:
                     condition = obj
 
                 return Mark(
                     obj=obj,
-                    color_tag=color_tag_true if condition else color_tag_false,
+                    color_tag=(
+                        interned_color_tag_true if condition else
+                        interned_color_tag_false
+                    ),
                 )
 
             helper.__name__ = '_or_'.join((color_tag_true, color_tag_false))
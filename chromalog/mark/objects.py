@@ -1,22 +1,111 @@
 """
 Mark log entries.
 """
-from builtins import str
-from six import (
-    string_types,
-    PY3,
-)
+import sys
 
 from ..colorizer import ColorizableMixin
 
-# Hack to define unicode in Python 3 and reach 100% coverage.
-unicode = str if PY3 else unicode
+
+_COLOR_TAGS_MAX_SIZE = 4096
+_COLOR_TAGS = {}
+
+
+class ColorTag(tuple):
+    """
+    An immutable list of color tags.
+
+    Color tags compare equal to lists and tuples with the same elements, and
+    can be concatenated with lists, so that they can be read like lists.
+
+    >>> ColorTag(['a', 'b'])
+    ['a', 'b']
+
+    >>> ColorTag(['a', 'b']) == ['a', 'b']
+    True
+
+    >>> ColorTag(['a', 'b']) == ('a', 'b')
+    True
+
+    >>> ColorTag(['a']) + ['b'], ['b'] + ColorTag(['a'])
+    (['a', 'b'], ['b', 'a'])
+    """
+    __slots__ = ()
+
+    def __add__(self, other):
+        if isinstance(other, list):
+            return list(self) + other
+
+        return tuple.__add__(self, other)
+
+    def __radd__(self, other):
+        if isinstance(other, list):
+            return other + list(self)
+
+        return NotImplemented
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            other = tuple(other)
+
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def make_color_tag(color_tag):
+    """
+    Get an interned :class:`ColorTag` instance.
+
+    :param color_tag: A color tag, or a list of color tags.
+    :returns: A :class:`ColorTag` instance. Equal color tags share the same
+        instance.
+
+    >>> make_color_tag('a')
+    ['a']
+
+    >>> make_color_tag(['a', 'b']) is make_color_tag(('a', 'b'))
+    True
+    """
+    if isinstance(color_tag, ColorTag):
+        return color_tag
+
+    if color_tag is None:
+        key = ()
+    elif isinstance(color_tag, str):
+        key = (color_tag,)
+    else:
+        key = tuple(color_tag)
+
+    result = _COLOR_TAGS.get(key)
+
+    if result is None:
+        result = ColorTag(_intern_tag(tag) for tag in key)
+
+        if len(_COLOR_TAGS) < _COLOR_TAGS_MAX_SIZE:
+            _COLOR_TAGS[key] = result
+
+    return result
+
+
+def _intern_tag(tag):
+    if type(tag) is str:
+        return sys.intern(tag)
+
+    return tag
 
 
 class Mark(ColorizableMixin):
     """
     Wraps any object and mark it for colored output.
     """
+    __slots__ = ('obj',)
+
     def __init__(self, obj, color_tag):
         """
         Mark ``obj`` for coloration.
@@ -26,8 +115,12 @@ class Mark(ColorizableMixin):
             list of a string. If ``color_tag`` is a string it will be converted
             into a single-element list automatically.
 
+        The ``color_tag`` attribute of the mark is an immutable
+        :class:`ColorTag` instance that reads like a list.
+
         .. note:: Nested :class:`chromalog.mark.Mark` objects are flattened
-            automatically and their ``color_tag`` are appended.
+            automatically and their ``color_tag`` are appended. Neither the
+            nested mark nor ``color_tag`` are modified.
 
         >>> from chromalog.mark.objects import Mark
 
@@ -43,14 +136,14 @@ class Mark(ColorizableMixin):
         >>> Mark(Mark(42, 'c'), ['a', 'b']) == Mark(42, ['a', 'b', 'c'])
         True
         """
-        if isinstance(color_tag, string_types):
-            color_tag = [color_tag]
+        if color_tag.__class__ is not ColorTag:
+            color_tag = make_color_tag(color_tag)
 
         if isinstance(obj, Mark):
-            color_tag.extend(obj.color_tag)
+            color_tag = make_color_tag(color_tag + obj.color_tag)
             obj = obj.obj
 
-        super(Mark, self).__init__(color_tag=color_tag)
+        self.color_tag = color_tag
         self.obj = obj
 
     def __repr__(self):
@@ -75,12 +168,6 @@ class Mark(ColorizableMixin):
         """
         return str(self.obj)
 
-    def __unicode__(self):
-        """
-        Gives a string representation of the marked object.
-        """
-        return unicode(self.obj)
-
     def __int__(self):
         """
         Gives an integer representation of the marked object.
@@ -0,0 +1,462 @@
+"""
+Aggregate the records of several processes and colorize them in one place.
+"""
+import logging
+import numbers
+import os
+import threading
+
+from multiprocessing import (
+    AuthenticationError,
+    current_process,
+)
+from multiprocessing.connection import (
+    Client,
+    Listener,
+    Pipe,
+    wait,
+)
+
+from .log import ColorizingStreamHandler
+from .mark.objects import Mark
+
+_MISSING = object()
+_SCALAR_TYPES = (str, bytes, numbers.Number, type(None))
+_NEW_CONNECTION = b'n'
+_STOP = b's'
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class RenderedArgument(object):
+    """
+    The rendered value of a log record argument that was sent by another
+    process.
+
+    >>> argument = RenderedArgument('value', "'value'")
+    >>> '%s %r' % (argument, argument)
+    "value 'value'"
+    """
+    __slots__ = ('str', 'repr')
+
+    def __init__(self, str, repr):
+        self.str = str
+        self.repr = repr
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return self.repr
+
+    def __format__(self, format_spec):
+        return format(self.str, format_spec)
+
+
+def encode_argument(arg):
+    """
+    Encode a log record argument so that it can be sent to another process.
+
+    :param arg: The argument to encode.
+    :returns: A ``(color_tag, value)`` pair, where `color_tag` is the tuple of
+        color tags of `arg` if it is a :class:`chromalog.mark.Mark` instance.
+        Values that are not strings or numbers are replaced by their string
+        representations, as a ``(color_tag, str, repr)`` tuple.
+
+    >>> encode_argument(42)
+    ((), 42)
+
+    >>> encode_argument(Mark('a', ['b', 'c']))
+    (('b', 'c'), 'a')
+
+    >>> encode_argument([1, 2])
+    ((), '[1, 2]', '[1, 2]')
+    """
+    if isinstance(arg, Mark):
+        color_tag = tuple(arg.color_tag)
+        arg = arg.obj
+    else:
+        color_tag = ()
+
+    if isinstance(arg, _SCALAR_TYPES):
+        return color_tag, arg
+
+    return color_tag, str(arg), repr(arg)
+
+
+def decode_argument(data):
+    """
+    Decode a log record argument encoded with :func:`encode_argument`.
+
+    :param data: The encoded argument.
+    :returns: The decoded argument.
+
+    >>> decode_argument(encode_argument(Mark('a', ['b', 'c'])))
+    Mark('a', ['b', 'c'])
+    """
+    if len(data) == 2:
+        color_tag, arg = data
+    else:
+        color_tag, arg = data[0], RenderedArgument(data[1], data[2])
+
+    if color_tag:
+        return Mark(arg, color_tag)
+
+    return arg
+
+
+def encode_record(record):
+    """
+    Encode a log record so that it can be sent to another process.
+
+    :param record: The log record to encode.
+    :returns: A dictionary of the attributes of `record`, with its arguments
+        encoded with :func:`encode_argument`.
+
+    The traceback of the record, if any, is rendered into its ``exc_text``
+    attribute. The other attributes that are not strings or numbers are
+    replaced by their string representations.
+    """
+    data = {}
+
+    for key, value in record.__dict__.items():
+        if key in ('args', 'exc_info'):
+            continue
+
+        if not isinstance(value, _SCALAR_TYPES):
+            value = str(value)
+
+        data[key] = value
+
+    if record.exc_info:
+        if not record.exc_text:
+            data['exc_text'] = _EXCEPTION_FORMATTER.formatException(
+                record.exc_info,
+            )
+
+    data['exc_info'] = None
+
+    if isinstance(record.args, dict):
+        data['args'] = dict(
+            (key, encode_argument(arg))
+            for key, arg in record.args.items()
+        )
+    elif record.args:
+        data['args'] = tuple(encode_argument(arg) for arg in record.args)
+    else:
+        data['args'] = ()
+
+    return data
+
+
+def decode_record(data):
+    """
+    Decode a log record encoded with :func:`encode_record`.
+
+    :param data: The encoded log record.
+    :returns: A :class:`logging.LogRecord` instance.
+    """
+    args = data['args']
+
+    if isinstance(args, dict):
+        data['args'] = dict(
+            (key, decode_argument(arg))
+            for key, arg in args.items()
+        )
+    else:
+        data['args'] = tuple(decode_argument(arg) for arg in args)
+
+    return logging.makeLogRecord(data)
+
+
+class ColorizingProcessListener(object):
+    """
+    A listener that receives the records of
+    :class:`ColorizingProcessHandler` instances from other processes, and
+    colorizes, formats and writes them in the current process.
+
+    Records are received over a
+    :class:`multiprocessing.connection.Listener`: a UNIX socket on POSIX
+    platforms and a named pipe on Windows.
+    """
+
+    def __init__(self, *handlers, **kwargs):
+        """
+        Initializes a colorizing process listener.
+
+        :param handlers: The handlers to pass the records to. If no handler is
+            specified, a :class:`chromalog.log.ColorizingStreamHandler` is
+            created from the `stream`, `colorizer`, `highlighter` and
+            `attributes_map` keyword arguments.
+        :param address: The address to listen on. If not specified, a free
+            address is chosen. See :attr:`address`.
+        :param family: The type of connection to listen for. If not
+            specified, the fastest available family is used.
+        :param authkey: The key the workers must authenticate with. Defaults
+            to the authentication key of the current process, which
+            :mod:`multiprocessing` workers inherit.
+        :param respect_handler_level: If :const:`True`, the level of each
+            handler is checked before passing it a record.
+
+        The other keyword arguments are passed to
+        :class:`chromalog.log.ColorizingStreamHandler`.
+        """
+        self._address = kwargs.pop('address', None)
+        self.family = kwargs.pop('family', None)
+        self.authkey = kwargs.pop('authkey', _MISSING)
+        self.respect_handler_level = kwargs.pop(
+            'respect_handler_level',
+            False,
+        )
+
+        if self.authkey is _MISSING:
+            self.authkey = bytes(current_process().authkey)
+
+        if handlers:
+            if kwargs:
+                raise TypeError(
+                    "Unexpected keyword arguments: {0}".format(
+                        ', '.join(sorted(kwargs)),
+                    ),
+                )
+
+            self.handler = None
+        else:
+            self.handler = ColorizingStreamHandler(**kwargs)
+            handlers = (self.handler,)
+
+        self.handlers = handlers
+        self._listener = None
+        self._lock = threading.Lock()
+        self._connections = []
+        self._wakeup_reader = None
+        self._wakeup_writer = None
+        self._accept_thread = None
+        self._receive_thread = None
+        self._stopping = False
+
+    @property
+    def address(self):
+        """
+        The address the listener listens on, to pass to
+        :class:`ColorizingProcessHandler`.
+
+        Only available once the listener is started.
+        """
+        if self._listener is None:
+            return self._address
+
+        return self._listener.address
+
+    def start(self):
+        """
+        Start the listener.
+        """
+        self._listener = Listener(
+            self._address,
+            self.family,
+            authkey=self.authkey,
+        )
+        self._wakeup_reader, self._wakeup_writer = Pipe(duplex=False)
+        self._stopping = False
+        self._accept_thread = threading.Thread(target=self._accept)
+        self._accept_thread.daemon = True
+        self._accept_thread.start()
+        self._receive_thread = threading.Thread(target=self._receive)
+        self._receive_thread.daemon = True
+        self._receive_thread.start()
+
+    def stop(self):
+        """
+        Stop the listener.
+
+        All the records that were sent before the call are handled before
+        this method returns. Stopping a stopped listener does nothing.
+        """
+        if self._listener is None:
+            return
+
+        # Wake up the accepting thread with a connection of our own. The
+        # thread may stop before accepting it, if another connection was
+        # being accepted: don't wait for it then.
+        self._stopping = True
+        waker = threading.Thread(target=self._wake_accept_thread)
+        waker.daemon = True
+        waker.start()
+        self._accept_thread.join()
+        self._accept_thread = None
+        self._listener.close()
+        waker.join()
+        self._wakeup(_STOP)
+        self._receive_thread.join()
+        self._receive_thread = None
+
+        for connection in self._connections:
+            connection.close()
+
+        del self._connections[:]
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        self._wakeup_reader = None
+        self._wakeup_writer = None
+        self._listener = None
+
+        for handler in self.handlers:
+            handler.flush()
+
+    def handle(self, record):
+        """
+        Handle a record by passing it to the handlers.
+
+        :param record: The record to handle.
+        """
+        for handler in self.handlers:
+            if (
+                not self.respect_handler_level or
+                record.levelno >= handler.level
+            ):
+                handler.handle(record)
+
+    def _wakeup(self, message):
+        with self._lock:
+            self._wakeup_writer.send_bytes(message)
+
+    def _wake_accept_thread(self):
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, EOFError, AuthenticationError):
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # The client failed to authenticate or went away.
+                if self._stopping:
+                    break
+
+                continue
+
+            with self._lock:
+                self._connections.append(connection)
+
+            self._wakeup(_NEW_CONNECTION)
+
+            if self._stopping:
+                break
+
+    def _receive(self):
+        while True:
+            with self._lock:
+                connections = list(self._connections)
+
+            for connection in wait(connections + [self._wakeup_reader]):
+                if connection is self._wakeup_reader:
+                    if self._wakeup_reader.recv_bytes() == _STOP:
+                        self._drain()
+                        return
+                elif not self._receive_record(connection):
+                    with self._lock:
+                        self._connections.remove(connection)
+
+                    connection.close()
+
+    def _receive_record(self, connection):
+        try:
+            data = connection.recv()
+        except (OSError, EOFError):
+            return False
+
+        self.handle(decode_record(data))
+
+        return True
+
+    def _drain(self):
+        with self._lock:
+            connections = list(self._connections)
+
+        for connection in connections:
+            while connection.poll():
+                if not self._receive_record(connection):
+                    break
+
+
+class ColorizingProcessHandler(logging.Handler):
+    """
+    A handler that sends records to a :class:`ColorizingProcessListener`
+    running in another process.
+
+    The record is neither colorized nor formatted: its
+    :class:`chromalog.mark.Mark` arguments are sent as their color tags and
+    values, so that the listener colorizes them.
+
+    Each process opens its own connection to the listener the first time it
+    emits a record, so that a handler created before forking can be used by
+    the children.
+    """
+
+    def __init__(self, address, family=None, authkey=_MISSING):
+        """
+        Initializes a colorizing process handler.
+
+        :param address: The address of the listener.
+        :param family: The type of connection to use. If not specified, it is
+            deduced from `address`.
+        :param authkey: The key to authenticate with. Defaults to the
+            authentication key of the current process.
+        """
+        super(ColorizingProcessHandler, self).__init__()
+
+        if authkey is _MISSING:
+            authkey = bytes(current_process().authkey)
+
+        self.address = address
+        self.family = family
+        self.authkey = authkey
+        self._connection = None
+        self._pid = None
+
+    def _get_connection(self):
+        pid = os.getpid()
+
+        if self._pid != pid:
+            # The connection, if any, belongs to the parent process.
+            if self._connection is not None:
+                self._connection.close()
+
+            self._connection = Client(
+                self.address,
+                self.family,
+                authkey=self.authkey,
+            )
+            self._pid = pid
+
+        return self._connection
+
+    def emit(self, record):
+        """
+        Send a record to the listener.
+
+        :param record: The record to send.
+        """
+        try:
+            self._get_connection().send(encode_record(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        """
+        Close the connection to the listener, if any, and the handler.
+        """
+        self.acquire()
+
+        try:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+
+            self._connection = None
+            self._pid = None
+        finally:
+            self.release()
+
+        super(ColorizingProcessHandler, self).close()
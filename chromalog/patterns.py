@@ -0,0 +1,366 @@
+"""
+Highlight common patterns in log messages.
+"""
+import operator
+import re
+
+_HEX = '[0-9a-fA-F]'
+_IPV6_GROUP = _HEX + '{1,4}'
+
+DEFAULT_PATTERNS = (
+    (
+        'string',
+        r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+        r"|(?<!\w)'[^'\\\n]*(?:\\.[^'\\\n]*)*'(?!\w)",
+        '"\'',
+    ),
+    (
+        'uuid',
+        r'(?<![\w-]){0}{{8}}-{0}{{4}}-{0}{{4}}-{0}{{4}}-{0}{{12}}(?![\w-])'
+        .format(_HEX),
+        '0-9a-fA-F',
+    ),
+    (
+        'ip',
+        r'(?<![\w.])(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?(?!\.?\w)' +
+        r'|(?={1}{{0,4}}:)(?<![\w:])(?:(?:{0}:){{7}}{0}'
+        r'|(?:{0}:)+:(?:{0}(?::{0})*)?|::{0}(?::{0})*)(?![\w:])'
+        .format(_IPV6_GROUP, _HEX),
+        '0-9a-fA-F:',
+    ),
+    (
+        'duration',
+        r'(?<![\w.])(?:\d+(?:\.\d+)?(?:ns|us|\u00b5s|ms|s|m|h|d))+(?!\.?\w)',
+        '0-9',
+    ),
+    (
+        'number',
+        r'(?<![\w.])-?(?:0x[0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+        r'(?!\.?\w)',
+        '\\-0-9',
+    ),
+)
+
+_PERCENT_SPEC = (
+    r'%(?:\([^)]*\))?[#0+ -]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?[a-zA-Z%]'
+)
+_CACHE_MAX_SIZE = 1024
+
+
+def keyword_pattern(keywords):
+    """
+    Build a regular expression that matches any of a list of keywords.
+
+    :param keywords: An iterable of keywords.
+    :returns: A regular expression, as a string. The keywords are arranged
+        in a prefix tree, so that matching a keyword at a given position only
+        takes as many steps as it has characters, however many keywords there
+        are.
+
+    >>> keyword_pattern(['foo', 'foobar', 'baz'])
+    '(?:baz|foo(?:bar)?)'
+    """
+    trie = {}
+
+    for keyword in keywords:
+        node = trie
+
+        for char in keyword:
+            node = node.setdefault(char, {})
+
+        node[''] = None
+
+    return _trie_pattern(trie)
+
+
+def _trie_pattern(node):
+    alternatives = [
+        re.escape(char) + _trie_pattern(node[char])
+        for char in sorted(node)
+        if char
+    ]
+
+    if not alternatives:
+        return ''
+
+    if len(alternatives) == 1 and '' not in node:
+        return alternatives[0]
+
+    pattern = '(?:' + '|'.join(alternatives) + ')'
+
+    if '' in node:
+        pattern += '?'
+
+    return pattern
+
+
+class _HighlightedArgument(object):
+    """
+    A message argument whose string representation is highlighted.
+
+    Any other conversion is done on the original argument.
+    """
+    __slots__ = ('obj', 'text')
+
+    def __init__(self, obj, text):
+        self.obj = obj
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return repr(self.obj)
+
+    def __format__(self, format_spec):
+        return format(self.obj, format_spec)
+
+    def __int__(self):
+        return int(self.obj)
+
+    def __float__(self):
+        return float(self.obj)
+
+    def __index__(self):
+        return operator.index(self.obj)
+
+
+class PatternHighlighter(object):
+    """
+    Highlights the text that matches some patterns, like IP addresses or
+    numbers, in log messages.
+
+    >>> from chromalog.colorizer import GenericColorizer
+    >>> highlighter = PatternHighlighter(keywords=['timeout'])
+    >>> colorizer = GenericColorizer(color_map={
+    ...     'ip': ('<', '>'),
+    ...     'duration': ('[', ']'),
+    ...     'keyword': ('*', '*'),
+    ... })
+    >>> highlighter.highlight('timeout after 5s from 10.0.0.1', colorizer)
+    '*timeout* after [5s] from <10.0.0.1>'
+    """
+
+    def __init__(
+        self,
+        patterns=DEFAULT_PATTERNS,
+        keywords=(),
+        keyword_color_tag='keyword',
+    ):
+        """
+        Initialize a pattern highlighter.
+
+        :param patterns: A list of ``(color_tag, pattern)`` pairs. Text
+            matching a regular expression `pattern` is colorized with
+            `color_tag`. When several patterns match at the same position,
+            the first one wins. Defaults to :const:`DEFAULT_PATTERNS`, which
+            highlights quoted strings, UUIDs, IP addresses, durations and
+            numbers.
+        :param keywords: A list of words to colorize with
+            `keyword_color_tag`.
+        :param keyword_color_tag: The color tag to colorize keywords with.
+
+        All the patterns are combined into a single regular expression, so
+        that messages are scanned once, whatever the number of patterns and
+        keywords.
+
+        A pattern may be given as a ``(color_tag, pattern, first_chars)``
+        triple instead, where `first_chars` is the contents of a regular
+        expression character class that matches the first character of any
+        match, like ``'0-9'``. When all the patterns have one, the positions
+        that can't start a match are skipped without trying any pattern,
+        which makes scanning several times faster.
+        """
+        self.color_tags = {}
+        alternatives = []
+        first_chars = []
+
+        for entry in patterns:
+            color_tag, pattern = entry[:2]
+            group = 'g{0}'.format(len(alternatives))
+            alternatives.append('(?P<{0}>{1})'.format(group, pattern))
+            self.color_tags[group] = color_tag
+
+            if first_chars is not None and len(entry) > 2:
+                first_chars.append(entry[2])
+            else:
+                first_chars = None
+
+        if keywords:
+            keywords = list(keywords)
+            group = 'g{0}'.format(len(alternatives))
+            alternatives.append('(?P<{0}>(?<!\\w){1}(?!\\w))'.format(
+                group,
+                keyword_pattern(keywords),
+            ))
+            self.color_tags[group] = keyword_color_tag
+
+            if first_chars is not None:
+                first_chars.extend(
+                    re.escape(char)
+                    for char in set(keyword[:1] for keyword in keywords)
+                )
+
+        pattern = '|'.join(alternatives) or '(?!)'
+
+        if not first_chars:
+            self.regex = re.compile(pattern)
+            self.format_regex = re.compile(
+                '(?P<spec>' + _PERCENT_SPEC + ')|' + pattern,
+            )
+        else:
+            first_chars = ''.join(first_chars)
+            self.regex = re.compile(
+                '(?=[{0}])(?:{1})'.format(first_chars, pattern),
+            )
+            self.format_regex = re.compile(
+                '(?=[%{0}])(?:(?P<spec>{1})|{2})'.format(
+                    first_chars,
+                    _PERCENT_SPEC,
+                    pattern,
+                ),
+            )
+
+        self._replacers = {}
+
+    def _make_replacer(self, colorizer, context_color_tag, escape):
+        color_pairs = {}
+
+        for group, color_tag in self.color_tags.items():
+            # Don't waste time on what won't be colorized.
+            if not any(colorizer.get_color_pair(
+                color_tag=color_tag,
+                use_default=False,
+            )):
+                continue
+
+            start, stop = colorizer.get_color_pair(
+                color_tag=color_tag,
+                context_color_tag=context_color_tag,
+                use_default=False,
+            )
+
+            if escape:
+                start = start.replace('%', '%%')
+                stop = stop.replace('%', '%%')
+
+            color_pairs[group] = (start, stop)
+
+        if not color_pairs:
+            return None
+
+        def replace(match):
+            color_pair = color_pairs.get(match.lastgroup)
+
+            if color_pair is None:
+                return match.group()
+
+            return color_pair[0] + match.group() + color_pair[1]
+
+        return replace
+
+    def _get_replacer(self, colorizer, context_color_tag, escape=False):
+        key = (colorizer, context_color_tag, escape)
+
+        # Replacers are derived from the color pairs of the colorizer, which
+        # change when its cache is cleared.
+        generation = getattr(colorizer, 'cache_generation', None)
+
+        try:
+            entry = self._replacers.get(key)
+        except TypeError:
+            # Color tags given as lists can't be cached.
+            return self._make_replacer(colorizer, context_color_tag, escape)
+
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        replacer = self._make_replacer(colorizer, context_color_tag, escape)
+
+        if entry is not None or len(self._replacers) < _CACHE_MAX_SIZE:
+            self._replacers[key] = (generation, replacer)
+
+        return replacer
+
+    def highlight(self, text, colorizer, context_color_tag=None):
+        """
+        Highlight a text.
+
+        :param text: The text to highlight.
+        :param colorizer: The colorizer to use.
+        :param context_color_tag: The color tag of the text the highlighted
+            parts are in.
+        :returns: The highlighted text.
+        """
+        replace = self._get_replacer(colorizer, context_color_tag)
+
+        if replace is None:
+            return text
+
+        return self.regex.sub(replace, text)
+
+    def _highlight_argument(self, arg, replace):
+        # Marked arguments are colorized with their own color tag.
+        if getattr(arg, 'color_tag', None):
+            return arg
+
+        if isinstance(arg, str):
+            text = arg
+        elif isinstance(arg, (int, float)) and not isinstance(arg, bool):
+            text = str(arg)
+        else:
+            return arg
+
+        highlighted = self.regex.sub(replace, text)
+
+        # Highlighting only ever adds characters.
+        if len(highlighted) == len(text):
+            return arg
+
+        return _HighlightedArgument(arg, highlighted)
+
+    def highlight_record(self, record, colorizer, context_color_tag=None):
+        """
+        Highlight the message of a record.
+
+        :param record: A `LogRecord` instance. It is not modified.
+        :param colorizer: The colorizer to use.
+        :param context_color_tag: The color tag of the message.
+        :returns: A ``(msg, args)`` pair to format the message with.
+
+        The format specifications of the message are left untouched. String
+        and numeric arguments are highlighted too, unless they are
+        :class:`chromalog.mark.Mark` instances.
+        """
+        msg = record.msg
+        args = record.args
+
+        if not isinstance(msg, str):
+            return msg, args
+
+        if not args:
+            return self.highlight(msg, colorizer, context_color_tag), args
+
+        replace_format = self._get_replacer(
+            colorizer,
+            context_color_tag,
+            escape=True,
+        )
+
+        if replace_format is None:
+            return msg, args
+
+        msg = self.format_regex.sub(replace_format, msg)
+        replace = self._get_replacer(colorizer, context_color_tag)
+
+        if isinstance(args, dict):
+            args = dict(
+                (key, self._highlight_argument(value, replace))
+                for key, value in args.items()
+            )
+        else:
+            args = tuple(
+                self._highlight_argument(arg, replace) for arg in args
+            )
+
+        return msg, args
@@ -0,0 +1,365 @@
+"""
+Colorize plain-text logs after the fact.
+"""
+import mmap
+import os
+import re
+
+from multiprocessing import Pool
+from threading import (
+    Event,
+    Semaphore,
+)
+
+from .colorizer import Colorizer
+from .patterns import keyword_pattern
+
+LEVEL_COLOR_TAGS = (
+    ('DEBUG', 'debug'),
+    ('INFO', 'info'),
+    ('WARNING', 'warning'),
+    ('WARN', 'warning'),
+    ('ERROR', 'error'),
+    ('CRITICAL', 'critical'),
+    ('FATAL', 'critical'),
+)
+DEFAULT_NAME_PATTERN = r'[\w.-]+'
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The number of chunks that may be read but not yet written, per process.
+_CHUNKS_PER_JOB = 2
+
+_RECOLORIZER = None
+_MAPS = {}
+
+
+def _encode_color_pair(colorizer, color_tag):
+    color_pair = colorizer.get_color_pair(
+        color_tag=color_tag,
+        use_default=False,
+    )
+
+    # Don't waste time matching what won't be colorized.
+    if not any(color_pair):
+        return None
+
+    return tuple(sequence.encode('utf-8') for sequence in color_pair)
+
+
+def _encode_pattern(pattern):
+    if isinstance(pattern, bytes):
+        return pattern
+
+    return pattern.encode('utf-8')
+
+
+class Recolorizer(object):
+    """
+    Colorizes level names, logger names and arbitrary patterns in lines of
+    text.
+
+    The text is processed as bytes, so that it never needs to be decoded.
+
+    >>> from chromalog.colorizer import GenericColorizer
+    >>> recolorizer = Recolorizer(
+    ...     GenericColorizer(color_map={
+    ...         'error': ('<', '>'),
+    ...         'important': ('[', ']'),
+    ...         'path': ('{', '}'),
+    ...     }),
+    ...     patterns=[('path', r'/\\S+')],
+    ... )
+    >>> recolorizer.recolor(b'ERROR:app:Cannot open /etc/app.conf\\n')
+    b'<ERROR>:[app]:Cannot open {/etc/app.conf}\\n'
+    """
+
+    def __init__(
+        self,
+        colorizer=None,
+        patterns=(),
+        name_pattern=DEFAULT_NAME_PATTERN,
+        name_color_tag='important',
+    ):
+        """
+        Initialize a recolorizer.
+
+        :param colorizer: The colorizer whose color map to use. If not
+            specified, a :class:`chromalog.colorizer.Colorizer` is
+            instantiated.
+        :param patterns: A list of ``(color_tag, pattern)`` pairs. Text
+            matching a regular expression `pattern` is colorized with
+            `color_tag`. Patterns take precedence over level names, in order.
+        :param name_pattern: The regular expression that matches the logger
+            names that directly follow a level name and a colon, as in the
+            default ``%(levelname)s:%(name)s:%(message)s`` format. If
+            :const:`None`, logger names are not colorized.
+        :param name_color_tag: The color tag to colorize logger names with.
+
+        Level names are only matched as whole words, and logger names right
+        after colorized level names, in a single pass.
+
+        Only the compiled expressions and color pairs are kept, so that
+        recolorizers can be sent to other processes.
+        """
+        colorizer = colorizer or Colorizer()
+        self.substitutions = []
+        self.color_pairs = {}
+        alternatives = []
+
+        for color_tag, pattern in patterns:
+            color_pair = _encode_color_pair(colorizer, color_tag)
+
+            if color_pair:
+                group = 'g{0}'.format(len(alternatives))
+                alternatives.append(
+                    b'(?P<' + group.encode('ascii') + b'>' +
+                    _encode_pattern(pattern) + b')',
+                )
+                self.color_pairs[group] = color_pair
+
+        # Patterns go first, so that they never match the inside of the
+        # escape sequences of level names.
+        if alternatives:
+            self.substitutions.append((
+                re.compile(b'|'.join(alternatives)),
+                '_replace',
+            ))
+
+        self.level_color_pairs = {}
+
+        for level_name, color_tag in LEVEL_COLOR_TAGS:
+            color_pair = _encode_color_pair(colorizer, color_tag)
+
+            if color_pair:
+                self.level_color_pairs[level_name.encode('ascii')] = color_pair
+
+        self.name_color_pair = None
+
+        if name_pattern and self.level_color_pairs:
+            self.name_color_pair = _encode_color_pair(
+                colorizer,
+                name_color_tag,
+            )
+
+        if self.level_color_pairs:
+            pattern = b'\\b(' + keyword_pattern(
+                level_name.decode('ascii')
+                for level_name in self.level_color_pairs
+            ).encode('ascii') + b')\\b'
+
+            if self.name_color_pair:
+                pattern += (
+                    b'(?::(' + _encode_pattern(name_pattern) + b')(?=:))?'
+                )
+
+            self.substitutions.append((re.compile(pattern), '_replace_level'))
+
+    def _replace(self, match):
+        start, stop = self.color_pairs[match.lastgroup]
+
+        return start + match.group() + stop
+
+    def _replace_level(self, match):
+        level_name = match.group(1)
+        start, stop = self.level_color_pairs[level_name]
+        result = start + level_name + stop
+
+        if self.name_color_pair and match.group(2) is not None:
+            start, stop = self.name_color_pair
+            result += b':' + start + match.group(2) + stop
+
+        return result
+
+    def recolor(self, data):
+        """
+        Colorize text.
+
+        :param data: The text to colorize, as bytes.
+        :returns: The colorized text, as bytes.
+        """
+        for regex, replacement in self.substitutions:
+            data = regex.sub(getattr(self, replacement), data)
+
+        return data
+
+
+def file_chunks(data, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split a buffer on line boundaries.
+
+    :param data: A buffer, like a :class:`mmap.mmap` instance.
+    :param chunk_size: The minimum size of a chunk. Chunks are extended to
+        the end of the line they stop in.
+    :returns: An iterator of ``(start, end)`` offsets.
+
+    >>> list(file_chunks(b'a\\nbb\\nccc\\n', chunk_size=3))
+    [(0, 5), (5, 9)]
+    """
+    start = 0
+    size = len(data)
+
+    while start < size:
+        end = data.find(b'\n', min(start + chunk_size, size) - 1)
+
+        if end < 0:
+            end = size
+        else:
+            end += 1
+
+        yield start, end
+        start = end
+
+
+def stream_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a binary stream in chunks that end on line boundaries.
+
+    :param stream: The stream to read from.
+    :param chunk_size: The minimum size of a chunk.
+    :returns: An iterator of chunks.
+    """
+    # Don't wait for a full chunk when reading from a pipe.
+    read = getattr(stream, 'read1', stream.read)
+
+    while True:
+        chunk = read(chunk_size)
+
+        if not chunk:
+            break
+
+        if not chunk.endswith(b'\n'):
+            chunk += stream.readline()
+
+        yield chunk
+
+
+def _init_worker(recolorizer):
+    global _RECOLORIZER
+
+    _RECOLORIZER = recolorizer
+
+
+def _recolor_chunk(chunk):
+    return _RECOLORIZER.recolor(chunk)
+
+
+def _map_file(path):
+    with open(path, 'rb') as source:
+        return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _recolor_file_chunk(args):
+    path, start, end = args
+    data = _MAPS.get(path)
+
+    if data is None:
+        data = _MAPS[path] = _map_file(path)
+
+    return _RECOLORIZER.recolor(data[start:end])
+
+
+def recolor_file(
+    recolorizer,
+    path,
+    output,
+    jobs=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Colorize a file.
+
+    :param recolorizer: The :class:`Recolorizer` to use.
+    :param path: The path of the file to colorize. The file is memory-mapped.
+    :param output: The binary stream to write the colorized text to.
+    :param jobs: The number of processes to use. Defaults to the number of
+        CPUs.
+    :param chunk_size: The size of the chunks the file is split into.
+
+    Chunks are colorized in parallel but written in order. At most two
+    chunks per process are read ahead of the output.
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    data = _map_file(path)
+
+    try:
+        chunks = file_chunks(data, chunk_size)
+
+        if len(data) <= chunk_size or jobs == 1:
+            for start, end in chunks:
+                output.write(recolorizer.recolor(data[start:end]))
+        else:
+            _recolor_in_pool(
+                recolorizer,
+                _recolor_file_chunk,
+                ((path, start, end) for start, end in chunks),
+                output,
+                jobs,
+            )
+    finally:
+        data.close()
+
+
+def recolor_stream(
+    recolorizer,
+    stream,
+    output,
+    jobs=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Colorize a stream.
+
+    :param recolorizer: The :class:`Recolorizer` to use.
+    :param stream: The binary stream to read from.
+    :param output: The binary stream to write the colorized text to.
+    :param jobs: The number of processes to use. Defaults to the number of
+        CPUs.
+    :param chunk_size: The size of the chunks the stream is read in.
+    """
+    chunks = stream_chunks(stream, chunk_size)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1:
+        for chunk in chunks:
+            output.write(recolorizer.recolor(chunk))
+            output.flush()
+    else:
+        _recolor_in_pool(recolorizer, _recolor_chunk, chunks, output, jobs)
+
+
+def _bounded(tasks, slots, stopped):
+    for task in tasks:
+        slots.acquire()
+
+        if stopped.is_set():
+            return
+
+        yield task
+
+
+def _recolor_in_pool(recolorizer, func, tasks, output, jobs):
+    # Colorized chunks wait to be written in order: bound their number, so
+    # that a slow output doesn't make them pile up in memory.
+    slots = Semaphore(jobs * _CHUNKS_PER_JOB)
+    stopped = Event()
+    pool = Pool(jobs, initializer=_init_worker, initargs=(recolorizer,))
+
+    try:
+        for result in pool.imap(func, _bounded(tasks, slots, stopped)):
+            output.write(result)
+            slots.release()
+
+        pool.close()
+    finally:
+        # Don't leave the pool waiting for a slot.
+        stopped.set()
+        slots.release()
+        pool.terminate()
+        pool.join()
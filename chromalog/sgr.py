@@ -0,0 +1,122 @@
+"""
+Select Graphic Rendition (SGR) escape sequences utilities.
+"""
+import re
+
+RESET_ALL = '\x1b[0m'
+BRIGHT = '\x1b[1m'
+DIM = '\x1b[2m'
+FORE_RED = '\x1b[31m'
+FORE_GREEN = '\x1b[32m'
+FORE_YELLOW = '\x1b[33m'
+FORE_MAGENTA = '\x1b[35m'
+FORE_CYAN = '\x1b[36m'
+BACK_RED = '\x1b[41m'
+
+SGR_RUN_RE = re.compile(r'(?:\x1b\[[0-9;]*m)+')
+SGR_PARAMETERS_RE = re.compile(r'\x1b\[([0-9;]*)m')
+
+_FOREGROUND = frozenset(
+    [str(code) for code in range(30, 38)] +
+    [str(code) for code in range(90, 98)] +
+    ['39']
+)
+_BACKGROUND = frozenset(
+    [str(code) for code in range(40, 48)] +
+    [str(code) for code in range(100, 108)] +
+    ['49']
+)
+
+
+def _parameters(run):
+    parameters = []
+
+    for sequence in SGR_PARAMETERS_RE.findall(run):
+        codes = [code.lstrip('0') or '0' for code in sequence.split(';')]
+        index = 0
+
+        while index < len(codes):
+            code = codes[index]
+
+            if code in ('38', '48') and index + 1 < len(codes):
+                length = {'5': 3, '2': 5}.get(codes[index + 1], 1)
+            else:
+                length = 1
+
+            parameters.append(tuple(codes[index:index + length]))
+            index += length
+
+    return parameters
+
+
+def _category(parameter):
+    code = parameter[0]
+
+    if code in _FOREGROUND or code == '38':
+        return 'foreground'
+    elif code in _BACKGROUND or code == '48':
+        return 'background'
+
+    return parameter
+
+
+def _optimize_run(match):
+    parameters = _parameters(match.group(0))
+
+    for index in range(len(parameters) - 1, -1, -1):
+        if parameters[index] == ('0',):
+            parameters = parameters[index:]
+            break
+
+    result = []
+    positions = {}
+
+    for parameter in parameters:
+        category = _category(parameter)
+
+        if category in positions:
+            result[positions[category]] = None
+
+        positions[category] = len(result)
+        result.append(parameter)
+
+    return '\x1b[{0}m'.format(
+        ';'.join(';'.join(parameter) for parameter in result if parameter),
+    )
+
+
+def optimize_sequences(text):
+    """
+    Optimize the SGR escape sequences in a string.
+
+    :param text: The string to optimize.
+    :returns: A string that renders like `text` on a terminal, where every
+        run of consecutive SGR sequences is merged into a single sequence,
+        without the attributes that are reset later in the run nor the
+        attributes that are set again later in the run.
+
+    >>> optimize_sequences('\\x1b[0m\\x1b[0m\\x1b[2m\\x1b[36m')
+    '\\x1b[0;2;36m'
+
+    >>> optimize_sequences('\\x1b[2m\\x1b[31mhello\\x1b[32m\\x1b[2m\\x1b[33m')
+    '\\x1b[2;31mhello\\x1b[2;33m'
+
+    >>> optimize_sequences('**')
+    '**'
+    """
+    return SGR_RUN_RE.sub(_optimize_run, text)
+
+
+def optimize_color_pair(color_pair):
+    """
+    Optimize the SGR escape sequences of a color pair.
+
+    :param color_pair: A (start, stop) pair of color sequences.
+    :returns: The optimized color pair.
+
+    See :func:`optimize_sequences`.
+    """
+    return (
+        optimize_sequences(color_pair[0]),
+        optimize_sequences(color_pair[1]),
+    )
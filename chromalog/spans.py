@@ -0,0 +1,302 @@
+"""
+Format records once, as spans of text, and render them to several outputs.
+"""
+import logging
+import re
+
+from itertools import chain
+from threading import Lock
+
+from .colorizer import (
+    Colorizer,
+    GenericColorizer,
+    _color_tag_key,
+)
+from .log import (
+    ColorizingFormatter,
+    ColorizingHandlerMixin,
+)
+from .mark.objects import make_color_tag
+from .stream import (
+    stream_has_color_support,
+    stream_needs_ansi_conversion,
+)
+
+# Private use characters, that log messages are not expected to contain.
+_OPEN = u'\ue000'
+_OPEN_END = u'\ue001'
+_CLOSE = u'\ue002'
+_SENTINEL_RE = re.compile(
+    u'{0}([0-9]+){1}|{2}'.format(_OPEN, _OPEN_END, _CLOSE),
+)
+
+
+class SpanColorizer(GenericColorizer):
+    """
+    A colorizer that records color tags instead of colorizing.
+
+    The color pairs it returns are sentinels that :meth:`split` turns back
+    into color tags.
+
+    >>> from chromalog.mark import Mark
+    >>> colorizer = SpanColorizer()
+    >>> text = '{0} is {1}'.format(
+    ...     colorizer.colorize(Mark('disk', 'important')),
+    ...     colorizer.colorize(Mark('full', 'error')),
+    ... )
+    >>> colorizer.split(text)
+    [('disk', ['important']), (' is ', None), ('full', ['error'])]
+    """
+    default_color_map = {}
+
+    def __init__(self):
+        """
+        Initialize a span colorizer.
+        """
+        super(SpanColorizer, self).__init__()
+        self.color_tags = []
+        self._color_pairs = {}
+        self._combined_color_tags = {}
+        self._lock = Lock()
+
+    def get_color_pair(
+        self,
+        color_tag,
+        context_color_tag=None,
+        use_default=True,
+    ):
+        """
+        Get the sentinel color pair of `color_tag`.
+
+        :param color_tag: A color tag or a list of color tags.
+        :param context_color_tag: Ignored: the context of a span is known
+            from the spans it is nested in.
+        :param use_default: Ignored: defaults are resolved when rendering.
+        :returns: A pair of sentinels.
+        """
+        key = _color_tag_key(color_tag)
+        pair = self._color_pairs.get(key)
+
+        if pair is None:
+            with self._lock:
+                pair = self._color_pairs.get(key)
+
+                if pair is None:
+                    pair = (
+                        u'{0}{1}{2}'.format(
+                            _OPEN,
+                            len(self.color_tags),
+                            _OPEN_END,
+                        ),
+                        _CLOSE,
+                    )
+                    self.color_tags.append(key)
+                    self._color_pairs[key] = pair
+
+        return pair
+
+    def _combine(self, stack):
+        key = tuple(stack)
+        color_tag = self._combined_color_tags.get(key)
+
+        if color_tag is None:
+            color_tag = make_color_tag(tuple(chain.from_iterable(stack)))
+            self._combined_color_tags[key] = color_tag
+
+        return color_tag
+
+    def split(self, text):
+        """
+        Split a text colorized by this colorizer into spans.
+
+        :param text: The colorized text.
+        :returns: A list of ``(text, color_tag)`` spans, where `color_tag` is
+            :const:`None` for text that is not colorized. Nested color tags
+            are combined.
+        """
+        spans = []
+        stack = []
+        color_tag = None
+        position = 0
+
+        for match in _SENTINEL_RE.finditer(text):
+            start = match.start()
+
+            if start > position:
+                spans.append((text[position:start], color_tag))
+
+            index = match.group(1)
+
+            if index is None:
+                if stack:
+                    stack.pop()
+            else:
+                stack.append(self.color_tags[int(index)])
+
+            color_tag = self._combine(stack) if stack else None
+            position = match.end()
+
+        if position < len(text):
+            spans.append((text[position:], color_tag))
+
+        return spans
+
+
+class SpanRenderer(object):
+    """
+    Renders spans of text.
+
+    >>> from chromalog.colorizer import GenericColorizer
+    >>> spans = [('disk', ['important']), (' is full', None)]
+    >>> SpanRenderer(GenericColorizer({'important': ('*', '*')})).render(spans)
+    '*disk* is full'
+    >>> SpanRenderer().render(spans)
+    'disk is full'
+    """
+
+    def __init__(self, colorizer=None):
+        """
+        Initialize a span renderer.
+
+        :param colorizer: The colorizer to colorize spans with: a
+            :class:`chromalog.colorizer.Colorizer` for ANSI colors, a
+            :class:`chromalog.colorizer.MonochromaticColorizer` to only
+            highlight important spans. If :const:`None`, color tags are
+            stripped.
+
+        The color pairs are resolved through the cache of the colorizer,
+        which stays up to date when its color map changes.
+        """
+        self.colorizer = colorizer
+
+    def render(self, spans):
+        """
+        Render spans.
+
+        :param spans: A list of ``(text, color_tag)`` spans.
+        :returns: The rendered text.
+        """
+        if not self.colorizer:
+            return ''.join([text for text, _ in spans])
+
+        get_color_pair = self.colorizer.get_color_pair
+        parts = []
+
+        for text, color_tag in spans:
+            if color_tag:
+                start, stop = get_color_pair(color_tag)
+                parts.extend((start, text, stop))
+            else:
+                parts.append(text)
+
+        return ''.join(parts)
+
+
+class FanOutHandler(ColorizingHandlerMixin, logging.Handler):
+    """
+    A handler that formats each record once, as spans, and writes it to
+    several streams, each with its own renderer.
+    """
+
+    terminator = '\n'
+
+    def __init__(self, outputs, attributes_map=None, patterns=None):
+        """
+        Initializes a fan-out handler.
+
+        :param outputs: A list of ``(stream, renderer)`` pairs. If `renderer`
+            is :const:`None`, a :class:`SpanRenderer` is created with a
+            :class:`chromalog.colorizer.Colorizer` if `stream` supports
+            colors, and without colorizer otherwise.
+        :param attributes_map: A map of LogRecord attributes/color tags.
+        :param patterns: A :class:`chromalog.patterns.PatternHighlighter`
+            that highlights patterns in the messages of the records.
+        """
+        super(FanOutHandler, self).__init__()
+        self.attributes_map = attributes_map or self.default_attributes_map
+        self.patterns = patterns
+        self.colorizer = SpanColorizer()
+        self.outputs = []
+
+        for stream, renderer in outputs:
+            if renderer is None:
+                if stream_has_color_support(stream):
+                    renderer = SpanRenderer(Colorizer())
+                else:
+                    renderer = SpanRenderer()
+
+            if renderer.colorizer and stream_needs_ansi_conversion(stream):
+                from colorama import AnsiToWin32
+
+                stream = AnsiToWin32(stream).stream
+
+            self.outputs.append((stream, renderer))
+
+        self.setFormatter(ColorizingFormatter())
+
+    def format_spans(self, record):
+        """
+        Format a record as spans.
+
+        :param record: A `LogRecord` instance. It is not modified.
+        :returns: A list of ``(text, color_tag)`` spans.
+        """
+        formatter = self.formatter
+
+        if not isinstance(formatter, ColorizingFormatter):
+            return [(super(FanOutHandler, self).format(record), None)]
+
+        return self.colorizer.split(self._format_colorized(
+            record,
+            formatter,
+            self.colorizer,
+            self._attribute_color_tags,
+        ))
+
+    def format(self, record):
+        """
+        Format a record, without colors.
+
+        :param record: A `LogRecord` instance.
+        :returns: The formatted record.
+        """
+        return ''.join([text for text, _ in self.format_spans(record)])
+
+    def emit(self, record):
+        """
+        Format a record once and write it to all the outputs.
+
+        Outputs that share a renderer share the rendered text as well.
+        """
+        try:
+            spans = self.format_spans(record)
+            rendered = {}
+
+            for stream, renderer in self.outputs:
+                text = rendered.get(id(renderer))
+
+                if text is None:
+                    text = rendered[id(renderer)] = (
+                        renderer.render(spans) + self.terminator
+                    )
+
+                self._write_stream(text, stream)
+                stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _write_stream(self, data, stream):
+        stream.write(data)
+
+    def flush(self):
+        """
+        Flush all the outputs.
+        """
+        self.acquire()
+
+        try:
+            for stream, _ in self.outputs:
+                if hasattr(stream, 'flush'):
+                    stream.flush()
+        finally:
+            self.release()
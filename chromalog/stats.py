@@ -0,0 +1,253 @@
+"""
+Opt-in statistics about what colorizing handlers and formatters cost.
+"""
+import logging
+import traceback
+
+from collections import OrderedDict
+from threading import (
+    Event,
+    Lock,
+    Thread,
+    current_thread,
+)
+
+_BUCKETS = 64
+
+
+class Histogram(object):
+    """
+    A histogram of durations, in nanoseconds, with power-of-two buckets.
+
+    It is not thread-safe.
+
+    >>> histogram = Histogram()
+    >>> for duration in (100, 200, 300, 5000):
+    ...     histogram.add(duration)
+    >>> histogram.count, histogram.total
+    (4, 5600)
+    >>> histogram.percentile(50), histogram.percentile(100)
+    (256, 5000)
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty histogram.
+        """
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, duration):
+        """
+        Add a duration.
+
+        :param duration: A duration, in nanoseconds.
+        """
+        self.count += 1
+        self.total += duration
+
+        if duration > self.max:
+            self.max = duration
+
+        self.buckets[min(duration.bit_length(), _BUCKETS - 1)] += 1
+
+    def percentile(self, percent):
+        """
+        Get an upper bound of a percentile.
+
+        :param percent: The percentile, between 0 and 100.
+        :returns: The upper bound of the bucket the percentile falls in, in
+            nanoseconds, or 0 if the histogram is empty.
+        """
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+
+        for index, count in enumerate(self.buckets):
+            seen += count
+
+            if seen >= rank:
+                return min(1 << index, self.max)
+
+        return 0
+
+    def snapshot(self):
+        """
+        Get the state of the histogram.
+
+        :returns: A dictionary with the ``count``, ``total_ns``, ``mean_ns``,
+            ``p50_ns``, ``p99_ns`` and ``max_ns`` metrics, and the non-empty
+            ``buckets``, by their exclusive upper bounds in nanoseconds.
+        """
+        return OrderedDict([
+            ('count', self.count),
+            ('total_ns', self.total),
+            ('mean_ns', self.total / self.count if self.count else 0.0),
+            ('p50_ns', self.percentile(50)),
+            ('p99_ns', self.percentile(99)),
+            ('max_ns', self.max),
+            ('buckets', OrderedDict(
+                (1 << index, count)
+                for index, count in enumerate(self.buckets)
+                if count
+            )),
+        ])
+
+
+class FormatterStats(object):
+    """
+    The time a formatter spends colorizing and formatting records.
+    """
+
+    def __init__(self):
+        """
+        Initialize formatter statistics.
+        """
+        self.colorize = Histogram()
+        self.format = Histogram()
+        self._lock = Lock()
+
+    def add(self, format_duration, colorize_duration=None):
+        """
+        Account for a formatted record.
+
+        :param format_duration: The time spent formatting, in nanoseconds.
+        :param colorize_duration: The time spent colorizing, in nanoseconds,
+            if the record was colorized.
+        """
+        with self._lock:
+            self.format.add(format_duration)
+
+            if colorize_duration is not None:
+                self.colorize.add(colorize_duration)
+
+    def snapshot(self):
+        """
+        Get the time spent in each phase.
+
+        :returns: A dictionary of phases/histogram snapshots.
+        """
+        with self._lock:
+            return OrderedDict([
+                ('colorize', self.colorize.snapshot()),
+                ('format', self.format.snapshot()),
+            ])
+
+
+class HandlerStats(object):
+    """
+    The records a handler handles and the time it spends writing them.
+    """
+
+    def __init__(self):
+        """
+        Initialize handler statistics.
+        """
+        self.records = {}
+        self.bytes_written = 0
+        self.write = Histogram()
+        self._lock = Lock()
+
+    def add_record(self, record):
+        """
+        Account for a handled record.
+
+        :param record: The `LogRecord` instance.
+        """
+        with self._lock:
+            self.records[record.levelname] = (
+                self.records.get(record.levelname, 0) + 1
+            )
+
+    def add_write(self, msg, duration):
+        """
+        Account for a written record.
+
+        :param msg: The formatted record.
+        :param duration: The time spent writing it, in nanoseconds.
+        """
+        size = len(msg) if msg.isascii() else len(msg.encode('utf-8'))
+
+        with self._lock:
+            self.bytes_written += size
+            self.write.add(duration)
+
+    def snapshot(self):
+        """
+        Get the state of the statistics.
+
+        :returns: A dictionary with the number of ``records`` by level name,
+            the number of ``bytes_written``, as encoded in UTF-8, and the
+            ``phases`` histogram snapshots.
+        """
+        with self._lock:
+            return OrderedDict([
+                ('records', dict(self.records)),
+                ('bytes_written', self.bytes_written),
+                ('phases', OrderedDict([('write', self.write.snapshot())])),
+            ])
+
+
+def cache_stats(colorizer):
+    """
+    Get the color pair cache statistics of a colorizer.
+
+    :param colorizer: A :class:`chromalog.colorizer.GenericColorizer`.
+    :returns: A dictionary with the cache ``hits``, ``misses`` and
+        ``hit_rate``, or :const:`None` if `colorizer` has no cache.
+    """
+    hits = getattr(colorizer, 'cache_hits', None)
+
+    if hits is None:
+        return None
+
+    misses = colorizer.cache_misses
+    lookups = hits + misses
+
+    return OrderedDict([
+        ('hits', hits),
+        ('misses', misses),
+        ('hit_rate', hits / lookups if lookups else 0.0),
+    ])
+
+
+class StatsDumper(Thread):
+    """
+    A thread that calls a function periodically, until it is stopped.
+    """
+
+    def __init__(self, interval, func):
+        """
+        Initialize a stats dumper.
+
+        :param interval: The number of seconds between two calls.
+        :param func: The function to call, without arguments.
+        """
+        super(StatsDumper, self).__init__(name='chromalog-stats')
+        self.daemon = True
+        self.interval = interval
+        self.func = func
+        self._stopped = Event()
+
+    def _call(self):
+        try:
+            self.func()
+        except Exception:
+            if logging.raiseExceptions:
+                traceback.print_exc()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self._call()
+
+    def stop(self):
+        """
+        Stop calling the function, and call it one last time.
+        """
+        self._stopped.set()
+
+        if self.is_alive() and self is not current_thread():
+            self.join()
+
+        self._call()
@@ -1,6 +1,7 @@
 """
 Stream utilities.
 """
+import sys
 
 
 def stream_has_color_support(stream):
@@ -11,3 +12,15 @@ def stream_has_color_support(stream):
     :returns: True if stream has color support.
     """
     return getattr(stream, 'isatty', lambda: False)()
+
+
+def stream_needs_ansi_conversion(stream):
+    """
+    Check if the ANSI escape sequences written to a stream must be converted.
+
+    :param stream: The stream to check.
+    :returns: True if the platform cannot interpret ANSI escape sequences
+        natively and `stream` must be wrapped by
+        :class:`colorama.AnsiToWin32`.
+    """
+    return sys.platform == 'win32'
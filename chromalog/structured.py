@@ -0,0 +1,225 @@
+"""
+Structured (logfmt and JSON lines) colorizing formatters.
+"""
+import json
+import logging
+
+from .log import ColorizingFormatter
+from .mark.objects import Mark
+
+_MISSING = object()
+_RESERVED_ATTRIBUTES = frozenset(
+    list(logging.makeLogRecord({}).__dict__) + [
+        'message',
+        'asctime',
+        'colorizer',
+        'message_color_tag',
+    ]
+)
+_KEY_CACHE_MAX_SIZE = 1024
+
+
+def _json_default(obj):
+    if isinstance(obj, Mark):
+        return obj.obj
+
+    return str(obj)
+
+
+_JSON_ENCODER = json.JSONEncoder(default=_json_default)
+_encode_string = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def logfmt_value(value):
+    """
+    Render a value as a logfmt value.
+
+    :param value: The value to render.
+    :returns: The string representation of `value`, quoted and escaped if
+        it is empty or contains spaces, quotes, equal signs or control
+        characters.
+
+    >>> logfmt_value(42)
+    '42'
+
+    >>> logfmt_value('two words')
+    '"two words"'
+
+    >>> logfmt_value(None)
+    '""'
+    """
+    if value is None:
+        text = ''
+    elif isinstance(value, str):
+        text = value
+    else:
+        text = str(value)
+
+    if text and text.isprintable() and not (
+        ' ' in text or '"' in text or '=' in text or '\\' in text
+    ):
+        return text
+
+    return _encode_string(text)
+
+
+class StructuredFormatter(ColorizingFormatter):
+    """
+    A formatter that renders records as logfmt ``key=value`` pairs when they
+    are colorized, and as JSON lines otherwise.
+
+    >>> formatter = StructuredFormatter(fields=[('msg', 'message')])
+    >>> formatter.format(logging.makeLogRecord({'msg': 'hi', 'user': 'bob'}))
+    '{"msg": "hi", "user": "bob"}'
+    """
+
+    default_fields = (
+        ('time', 'asctime'),
+        ('level', 'levelname'),
+        ('logger', 'name'),
+        ('msg', 'message'),
+    )
+
+    def __init__(
+        self,
+        fields=None,
+        datefmt=None,
+        key_color_tag='debug',
+        extra=True,
+    ):
+        """
+        Initializes a structured formatter.
+
+        :param fields: A list of ``(key, attribute)`` pairs: the record
+            attributes to render, and the keys to render them with. Defaults
+            to :attr:`default_fields`.
+        :param datefmt: The date format string.
+        :param key_color_tag: The color tag to colorize the keys with.
+        :param extra: Whether to also render the attributes that were passed
+            as `extra` to the logging call, after the `fields`. Those whose
+            names are keys of the `fields` are rendered with an ``extra.``
+            prefix, so that they don't hide the fields.
+
+        Tracebacks and stack information, if any, are rendered last, as the
+        ``exc_info`` and ``stack_info`` keys.
+        """
+        if fields is None:
+            fields = self.default_fields
+
+        self.fields = tuple(fields)
+        self.key_color_tag = key_color_tag
+        self.extra = extra
+        self._colorized_keys = {}
+        super(StructuredFormatter, self).__init__(
+            fmt=' '.join(
+                '%({0})s'.format(attribute)
+                for _, attribute in self.fields
+            ),
+            datefmt=datefmt,
+        )
+
+    def _colorized_key(self, colorizer, key):
+        # Colorized keys change when the cache of the colorizer is cleared.
+        generation = getattr(colorizer, 'cache_generation', None)
+        cache_key = (colorizer, key)
+        entry = self._colorized_keys.get(cache_key)
+
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        result = '{0}='.format(
+            colorizer.colorize(Mark(key, self.key_color_tag)),
+        )
+
+        if entry is not None or (
+            len(self._colorized_keys) < _KEY_CACHE_MAX_SIZE
+        ):
+            self._colorized_keys[cache_key] = (generation, result)
+
+        return result
+
+    def _items(self, record, message_color_tag, attributes):
+        items = []
+
+        for key, attribute in self.fields:
+            if attribute == 'message':
+                value = record.getMessage()
+
+                if message_color_tag:
+                    value = Mark(value, message_color_tag)
+            elif attribute == 'asctime':
+                value = self.formatTime(record, self.datefmt)
+            else:
+                value = attributes.get(attribute, _MISSING)
+
+                if value is _MISSING:
+                    value = getattr(record, attribute, None)
+
+            items.append((key, value))
+
+        if self.extra:
+            # Most records have no extra attributes: check that at C speed.
+            extra = record.__dict__.keys() - _RESERVED_ATTRIBUTES
+
+            if extra:
+                keys = frozenset(key for key, _ in self.fields)
+
+                for attribute, value in record.__dict__.items():
+                    if attribute in extra:
+                        if attribute in keys:
+                            attribute = 'extra.' + attribute
+
+                        items.append((attribute, value))
+
+        if record.exc_text:
+            items.append(('exc_info', record.exc_text))
+        elif record.exc_info:
+            items.append(('exc_info', self.formatException(record.exc_info)))
+
+        if record.stack_info:
+            items.append(('stack_info', self.formatStack(record.stack_info)))
+
+        return items
+
+    def format_colorized(
+        self,
+        record,
+        colorizer,
+        message_color_tag=None,
+        attributes=None,
+    ):
+        """
+        Colorize and format a record without modifying it.
+
+        :param record: A `LogRecord` instance.
+        :param colorizer: The colorizer to use. If :const:`None`, the record
+            is rendered as a JSON object.
+        :param message_color_tag: The color tag to colorize the message with.
+        :param attributes: A dictionary of attributes that override the ones
+            of `record` during formatting.
+        :returns: The formatted string.
+
+        When colorizing, keys are colorized with :attr:`key_color_tag` and
+        :class:`chromalog.mark.Mark` values with their color tags.
+        """
+        items = self._items(record, message_color_tag, attributes or {})
+
+        if not colorizer:
+            return _JSON_ENCODER.encode(dict(items))
+
+        parts = []
+
+        for key, value in items:
+            if isinstance(value, Mark):
+                value = colorizer.colorize(Mark(
+                    logfmt_value(value.obj),
+                    value.color_tag,
+                ))
+
+                parts.append(self._colorized_key(colorizer, key) + str(value))
+            else:
+                parts.append(
+                    self._colorized_key(colorizer, key) + logfmt_value(value)
+                )
+
+        return ' '.join(parts)
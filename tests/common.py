@@ -4,7 +4,15 @@
 Common functions for tests.
 """
 
-from nose_parameterized import parameterized
+from logging import (
+    DEBUG,
+    LogRecord,
+)
+
+from parameterized import parameterized
+from io import StringIO
+
+from chromalog.mark import Mark
 
 
 def repeat_for_values(values=None):
@@ -30,3 +38,20 @@ def repeat_for_integral_values(values=None):
         }
 
     return parameterized.expand(list(values.items()))
+
+
+def make_record(msg='%s + %s gives %s', args=(4, 5, Mark(9, 'bracket'))):
+    return LogRecord(
+        name='my_record',
+        level=DEBUG,
+        pathname='my_path',
+        lineno=42,
+        msg=msg,
+        args=args,
+        exc_info=None,
+    )
+
+
+class ColorStream(StringIO):
+    def isatty(self):
+        return True
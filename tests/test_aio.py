@@ -0,0 +1,454 @@
+"""
+Test the asyncio colorizing handler.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+from threading import Thread
+from unittest import TestCase
+
+from unittest.mock import patch
+
+from io import StringIO
+
+from chromalog.aio import AsyncColorizingStreamHandler
+from chromalog.buffer import (
+    BLOCK,
+    DROP_NEWEST,
+)
+from chromalog.log import ColorizingFormatter
+
+
+def make_logger(handler):
+    handler.setFormatter(ColorizingFormatter('%(message)s'))
+    logger = logging.Logger('app')
+    logger.addHandler(handler)
+
+    return logger
+
+
+class PipeReader(Thread):
+    def __init__(self, fd):
+        super(PipeReader, self).__init__()
+        self.fd = fd
+        self.chunks = []
+
+    def run(self):
+        while True:
+            chunk = os.read(self.fd, 65536)
+
+            if not chunk:
+                break
+
+            self.chunks.append(chunk)
+
+    @property
+    def data(self):
+        return b''.join(self.chunks)
+
+
+class AsyncColorizingStreamHandlerTests(TestCase):
+    def setUp(self):
+        read_fd, write_fd = os.pipe()
+        self.stream = os.fdopen(write_fd, 'w')
+        self.reader = PipeReader(read_fd)
+        self.addCleanup(os.close, read_fd)
+
+    def tearDown(self):
+        if not self.stream.closed:
+            self.stream.close()
+
+        if self.reader.is_alive():
+            self.reader.join()
+
+    def test_loop_writes_do_not_block(self):
+        handler = AsyncColorizingStreamHandler(stream=self.stream)
+        logger = make_logger(handler)
+        lines = ['line {0:06d}'.format(index) for index in range(20000)]
+
+        async def log():
+            # Much more than a pipe can hold, with no one reading yet.
+            for line in lines:
+                logger.info(line)
+
+            self.reader.start()
+            await handler.drain()
+
+        asyncio.run(log())
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(
+            ''.join(line + '\n' for line in lines).encode('utf-8'),
+            self.reader.data,
+        )
+
+    def test_pending_records_are_written_on_close(self):
+        handler = AsyncColorizingStreamHandler(stream=self.stream)
+        logger = make_logger(handler)
+
+        async def log():
+            logger.info('in loop')
+
+        asyncio.run(log())
+        logger.info('after loop')
+        self.reader.start()
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(b'in loop\nafter loop\n', self.reader.data)
+
+    def test_buffered_records_are_drained(self):
+        handler = AsyncColorizingStreamHandler(
+            stream=self.stream,
+            buffer_size=1024,
+        )
+        logger = make_logger(handler)
+        self.reader.start()
+
+        async def log():
+            logger.info('a')
+            logger.info('b')
+            await handler.drain()
+
+        asyncio.run(log())
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(b'a\nb\n', self.reader.data)
+
+    def test_bounded_loop_writer_drops_records(self):
+        handler = AsyncColorizingStreamHandler(
+            stream=self.stream,
+            max_size=10,
+            policy=DROP_NEWEST,
+        )
+        logger = make_logger(handler)
+        logger.setLevel(logging.DEBUG)
+
+        async def log():
+            for index in range(100):
+                logger.log(
+                    logging.INFO if index % 2 else logging.DEBUG,
+                    'line %s',
+                    index,
+                )
+
+            self.reader.start()
+            await handler.drain()
+
+        asyncio.run(log())
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(
+            ''.join('line {0}\n'.format(index) for index in range(10)) +
+            '90 records dropped (45 debug, 45 info)\n',
+            self.reader.data.decode('utf-8'),
+        )
+        self.assertEqual(90, handler.drop_counter.dropped)
+
+    def test_handlers_share_loop_writer(self):
+        first = AsyncColorizingStreamHandler(stream=self.stream)
+        second = AsyncColorizingStreamHandler(stream=self.stream)
+        first_logger = make_logger(first)
+        second_logger = make_logger(second)
+
+        async def log():
+            for index in range(200):
+                first_logger.info('first %s', index)
+                second_logger.info('second %s', index)
+
+            self.reader.start()
+            await asyncio.wait_for(first.drain(), 5)
+            await asyncio.wait_for(second.drain(), 5)
+
+        asyncio.run(log())
+        first.close()
+        second.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(
+            ''.join(
+                'first {0}\nsecond {0}\n'.format(index)
+                for index in range(200)
+            ).encode('utf-8'),
+            self.reader.data,
+        )
+
+    def test_loop_writer_is_closed_with_its_last_handler(self):
+        first = AsyncColorizingStreamHandler(stream=self.stream)
+        second = AsyncColorizingStreamHandler(stream=self.stream)
+        first_logger = make_logger(first)
+        second_logger = make_logger(second)
+        self.reader.start()
+
+        async def log():
+            first_logger.info('a')
+            second_logger.info('b')
+            first.close()
+            second_logger.info('c')
+            second.close()
+
+        asyncio.run(log())
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(b'a\nb\nc\n', self.reader.data)
+
+    def test_full_loop_writer_blocks(self):
+        handler = AsyncColorizingStreamHandler(
+            stream=self.stream,
+            max_size=2,
+            policy=BLOCK,
+        )
+        logger = make_logger(handler)
+        self.reader.start()
+
+        async def log():
+            for index in range(5):
+                logger.info('line %s', index)
+
+            await handler.drain()
+
+        asyncio.run(log())
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(
+            ''.join('line {0}\n'.format(index) for index in range(5)),
+            self.reader.data.decode('utf-8'),
+        )
+        self.assertEqual(0, handler.drop_counter.dropped)
+
+    def test_records_larger_than_a_chunk(self):
+        handler = AsyncColorizingStreamHandler(stream=self.stream)
+        logger = make_logger(handler)
+        line = 'x' * 100000
+        self.reader.start()
+
+        async def log():
+            logger.info(line)
+            await handler.drain()
+            # The writer stopped once idle.
+            logger.info(line)
+            await handler.drain()
+
+        asyncio.run(log())
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual((line + '\n') * 2, self.reader.data.decode('utf-8'))
+
+    def test_loop_writer_not_ready(self):
+        handler = AsyncColorizingStreamHandler(stream=self.stream)
+        logger = make_logger(handler)
+        self.reader.start()
+
+        async def log():
+            with patch('chromalog.aio.os.write', side_effect=BlockingIOError):
+                logger.info('hello')
+                await asyncio.sleep(0.01)
+
+            await handler.drain()
+
+        asyncio.run(log())
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(b'hello\n', self.reader.data)
+
+    def test_loop_writers_of_running_loops_are_kept(self):
+        handler = AsyncColorizingStreamHandler(stream=self.stream)
+        logger = make_logger(handler)
+        self.reader.start()
+
+        async def log(message):
+            logger.info(message)
+            await handler.drain()
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(log('a'))
+        asyncio.run(log('b'))
+
+        self.assertIn(loop, handler._loop_writers)
+        handler.close()
+        self.stream.close()
+        self.reader.join()
+
+        self.assertEqual(b'a\nb\n', self.reader.data)
+
+
+class AsyncColorizingStreamHandlerThreadTests(TestCase):
+    def test_thread_without_loop(self):
+        stream = StringIO()
+        handler = AsyncColorizingStreamHandler(stream=stream)
+        logger = make_logger(handler)
+        logger.info('hello')
+        handler.close()
+
+        self.assertEqual('hello\n', stream.getvalue())
+
+    def test_bounded_thread_writer_summary(self):
+        stream = StringIO()
+        handler = AsyncColorizingStreamHandler(
+            stream=stream,
+            max_size=1,
+            policy=DROP_NEWEST,
+        )
+        logger = make_logger(handler)
+        handler.drop_counter.add(logging.INFO)
+        logger.info('a')
+        handler.drop_counter.add(logging.DEBUG)
+        handler.close()
+
+        self.assertEqual(
+            '1 records dropped (1 info)\na\n1 records dropped (1 debug)\n',
+            stream.getvalue(),
+        )
+        self.assertEqual(2, handler.drop_counter.dropped)
+
+    def test_thread_for_streams_without_file_descriptor(self):
+        stream = StringIO()
+        handler = AsyncColorizingStreamHandler(stream=stream)
+        logger = make_logger(handler)
+
+        async def log():
+            logger.info('hello')
+            await handler.drain()
+
+            return stream.getvalue()
+
+        self.assertEqual('hello\n', asyncio.run(log()))
+        handler.close()
+
+    def test_thread_for_regular_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'test.log')
+
+        with open(path, 'w') as stream:
+            handler = AsyncColorizingStreamHandler(stream=stream)
+            logger = make_logger(handler)
+
+            async def log():
+                logger.info('hello')
+                await handler.drain()
+
+            asyncio.run(log())
+            handler.close()
+
+        with open(path) as stream:
+            self.assertEqual('hello\n', stream.read())
+
+
+class BrokenStream(object):
+    def write(self, data):
+        raise IOError('broken')
+
+    def flush(self):
+        pass
+
+
+class AsyncColorizingStreamHandlerErrorTests(TestCase):
+    def setUp(self):
+        read_fd, write_fd = os.pipe()
+        # No one will ever read what is written.
+        os.close(read_fd)
+        self.stream = os.fdopen(write_fd, 'w')
+        self.addCleanup(self.stream.close)
+
+    def test_loop_write_error(self):
+        first = AsyncColorizingStreamHandler(stream=self.stream)
+        second = AsyncColorizingStreamHandler(stream=self.stream)
+        first_logger = make_logger(first)
+        second_logger = make_logger(second)
+        lines = ['line {0:06d}'.format(index) for index in range(1000)]
+
+        async def log():
+            for line in lines:
+                first_logger.info(line)
+
+            second_logger.info('last')
+            await first.drain()
+            await second.drain()
+
+        with patch.object(first, 'handleError') as first_handle_error:
+            with patch.object(second, 'handleError') as second_handle_error:
+                asyncio.run(log())
+                first.close()
+                second.close()
+
+        first_handle_error.assert_called_once()
+        second_handle_error.assert_called_once()
+        self.assertEqual(
+            ''.join(line + '\n' for line in lines + ['last']).encode('utf-8'),
+            first_handle_error.call_args[0][0].msg,
+        )
+
+    def test_loop_write_error_on_close(self):
+        handler = AsyncColorizingStreamHandler(stream=self.stream)
+        logger = make_logger(handler)
+
+        async def log():
+            logger.info('hello')
+            handler.close()
+
+        with patch.object(handler, 'handleError') as handle_error:
+            asyncio.run(log())
+
+        handle_error.assert_called_once()
+        self.assertEqual(b'hello\n', handle_error.call_args[0][0].msg)
+
+    def test_thread_write_error(self):
+        handler = AsyncColorizingStreamHandler(stream=BrokenStream())
+        logger = make_logger(handler)
+
+        with patch.object(handler, 'handleError') as handle_error:
+            logger.info('hello')
+            handler.close()
+
+        handle_error.assert_called_once()
+        self.assertEqual('hello\n', handle_error.call_args[0][0].msg)
+
+    def test_bounded_write_error(self):
+        handler = AsyncColorizingStreamHandler(stream=StringIO(), max_size=1)
+        logger = make_logger(handler)
+
+        with patch.object(handler, 'handleError') as handle_error:
+            with patch.object(
+                handler,
+                '_write_stream',
+                side_effect=ValueError,
+            ):
+                logger.info('hello')
+
+        handler.close()
+        handle_error.assert_called_once()
+        self.assertEqual('hello', handle_error.call_args[0][0].msg)
+
+    def test_bounded_write_recursion_error(self):
+        handler = AsyncColorizingStreamHandler(stream=StringIO(), max_size=1)
+        logger = make_logger(handler)
+
+        with patch.object(
+            handler,
+            '_write_stream',
+            side_effect=RecursionError,
+        ):
+            with self.assertRaises(RecursionError):
+                logger.info('hello')
+
+        handler.close()
@@ -0,0 +1,233 @@
+"""
+Test bounded record buffers.
+"""
+import logging
+
+from logging import (
+    DEBUG,
+    INFO,
+    WARNING,
+)
+from queue import Full
+from threading import Thread
+from unittest import TestCase
+
+from chromalog.buffer import (
+    BLOCK,
+    DROP_BELOW_LEVEL,
+    DROP_NEWEST,
+    DROP_OLDEST,
+    BoundedQueue,
+    DropCounter,
+    RecordBuffer,
+    make_drop_summary,
+)
+from chromalog.mark import Mark
+
+
+def make_record(msg, level=INFO):
+    return logging.makeLogRecord({'msg': msg, 'levelno': level})
+
+
+class DropSummaryTests(TestCase):
+    def test_make_drop_summary(self):
+        record = make_drop_summary({INFO: 34, DEBUG: 1200})
+
+        self.assertEqual(WARNING, record.levelno)
+        self.assertEqual('WARNING', record.levelname)
+        self.assertEqual(
+            '1234 records dropped (1200 debug, 34 info)',
+            record.getMessage(),
+        )
+        self.assertEqual(Mark(1234, 'important'), record.args[0])
+
+
+class DropCounterTests(TestCase):
+    def test_drop_counter(self):
+        counter = DropCounter()
+        counter.add(DEBUG)
+        counter.add(DEBUG)
+        counter.add(INFO)
+
+        self.assertTrue(counter.pending)
+        self.assertEqual({DEBUG: 2, INFO: 1}, counter.take_pending())
+        self.assertFalse(counter.pending)
+        self.assertEqual({}, counter.take_pending())
+
+        counter.add(INFO)
+
+        self.assertEqual(4, counter.dropped)
+        self.assertEqual({DEBUG: 2, INFO: 2}, counter.dropped_by_level)
+
+
+class RecordBufferTests(TestCase):
+    def fill(self, buffer, items, level=INFO):
+        return [buffer.offer(level, item) for item in items]
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            RecordBuffer(2, policy='drop-everything')
+
+        with self.assertRaises(ValueError):
+            RecordBuffer(0)
+
+    def test_unbounded(self):
+        buffer = RecordBuffer(policy=DROP_NEWEST)
+
+        self.assertEqual([True] * 100, self.fill(buffer, range(100)))
+        self.assertEqual(list(range(100)), list(buffer))
+
+    def test_peek(self):
+        buffer = RecordBuffer()
+        buffer.append('a')
+        buffer.append('b')
+
+        self.assertEqual('a', buffer.peek())
+        self.assertEqual(2, len(buffer))
+
+    def test_block(self):
+        buffer = RecordBuffer(2, policy=BLOCK)
+
+        self.assertEqual([True, True, False], self.fill(buffer, 'abc'))
+        self.assertEqual(['a', 'b'], list(buffer))
+        self.assertEqual(0, buffer.counter.dropped)
+
+    def test_drop_newest(self):
+        buffer = RecordBuffer(2, policy=DROP_NEWEST)
+
+        self.assertEqual([True] * 4, self.fill(buffer, 'abcd'))
+        self.assertEqual(['a', 'b'], list(buffer))
+        self.assertEqual({INFO: 2}, buffer.counter.dropped_by_level)
+
+    def test_drop_oldest(self):
+        buffer = RecordBuffer(2, policy=DROP_OLDEST)
+
+        self.assertEqual([True] * 4, self.fill(buffer, 'abcd'))
+        self.assertEqual(['c', 'd'], list(buffer))
+        self.assertEqual(2, buffer.counter.dropped)
+
+    def test_drop_below_level(self):
+        buffer = RecordBuffer(3, policy=DROP_BELOW_LEVEL, level=WARNING)
+        buffer.offer(DEBUG, 'a')
+        buffer.offer(WARNING, 'b')
+        buffer.offer(INFO, 'c')
+
+        self.assertTrue(buffer.offer(DEBUG, 'd'))
+        self.assertTrue(buffer.offer(WARNING, 'e'))
+        self.assertTrue(buffer.offer(WARNING, 'f'))
+        self.assertFalse(buffer.offer(WARNING, 'g'))
+        self.assertEqual(['b', 'e', 'f'], list(buffer))
+        self.assertEqual({DEBUG: 2, INFO: 1}, buffer.counter.dropped_by_level)
+
+    def test_summary_once_half_empty(self):
+        buffer = RecordBuffer(4, policy=DROP_NEWEST, summarize=dict)
+        self.fill(buffer, 'abcde', level=DEBUG)
+        buffer.popleft()
+
+        # Still more than half full.
+        buffer.offer(INFO, 'f')
+
+        self.assertEqual(['b', 'c', 'd', 'f'], list(buffer))
+
+        buffer.popleft()
+        buffer.popleft()
+        buffer.offer(INFO, 'g')
+
+        self.assertEqual(['d', 'f', {DEBUG: 1}, 'g'], list(buffer))
+        self.assertFalse(buffer.counter.pending)
+
+    def test_summaries_are_not_counted_nor_dropped(self):
+        buffer = RecordBuffer(1, policy=DROP_OLDEST, summarize=dict)
+        self.fill(buffer, 'ab')
+        buffer.popleft()
+        buffer.offer(INFO, 'c')
+        buffer.offer(INFO, 'd')
+
+        self.assertEqual([{INFO: 1}, 'd'], list(buffer))
+
+    def test_shared_counter(self):
+        counter = DropCounter()
+        buffers = [
+            RecordBuffer(1, policy=DROP_NEWEST, counter=counter)
+            for _ in range(2)
+        ]
+
+        for buffer in buffers:
+            self.fill(buffer, 'ab')
+
+        self.assertEqual(2, counter.dropped)
+
+
+class BoundedQueueTests(TestCase):
+    def test_drop_newest(self):
+        queue = BoundedQueue(2, policy=DROP_NEWEST)
+
+        for msg in 'abc':
+            queue.put_nowait(make_record(msg))
+
+        self.assertEqual(2, queue.qsize())
+        self.assertEqual(1, queue.counter.dropped)
+        self.assertEqual(
+            ['a', 'b'],
+            [queue.get().msg, queue.get().msg],
+        )
+
+    def test_summary_before_levelless_items(self):
+        queue = BoundedQueue(1, policy=DROP_NEWEST)
+        queue.put(make_record('a'))
+        queue.put(make_record('b', DEBUG))
+        queue.put(None)
+
+        self.assertEqual('a', queue.get().msg)
+        self.assertEqual(
+            '1 records dropped (1 debug)',
+            queue.get().getMessage(),
+        )
+        self.assertIsNone(queue.get())
+        self.assertTrue(queue.empty())
+
+    def test_block(self):
+        queue = BoundedQueue(1, policy=BLOCK)
+        queue.put(make_record('a'))
+
+        with self.assertRaises(Full):
+            queue.put(make_record('b'), block=False)
+
+        with self.assertRaises(Full):
+            queue.put(make_record('b'), timeout=0.01)
+
+        thread = Thread(target=queue.put, args=(make_record('c'),))
+        thread.start()
+
+        self.assertEqual('a', queue.get().msg)
+
+        thread.join()
+
+        self.assertEqual('c', queue.get().msg)
+        self.assertEqual(0, queue.counter.dropped)
+
+    def test_join(self):
+        queue = BoundedQueue(1, policy=DROP_OLDEST)
+
+        for msg in 'abc':
+            queue.put(make_record(msg))
+
+        queue.get()
+        queue.task_done()
+        queue.join()
+
+        self.assertEqual(0, queue.unfinished_tasks)
+
+    def test_join_after_blocking(self):
+        queue = BoundedQueue(1, policy=BLOCK)
+        queue.put(make_record('a'))
+        thread = Thread(target=queue.put, args=(make_record('b'),))
+        thread.start()
+        queue.get()
+        queue.task_done()
+        thread.join()
+        queue.get()
+        queue.task_done()
+        queue.join()
+
+        self.assertEqual(0, queue.unfinished_tasks)
@@ -1,15 +1,14 @@
 """
 Test colorizers.
 """
-from builtins import str  # noqa
-
 from unittest import TestCase
-from six import PY3
 
 from chromalog.colorizer import (
+    ColorMap,
     ColorizedObject,
     Colorizer,
     ColorizableMixin,
+    MonochromaticColorizer,
 )
 from chromalog.mark import Mark
 
@@ -88,6 +87,281 @@ class ColorizerTests(TestCase):
             ),
         )
 
+    def test_colorizer_get_color_pair_is_cached(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+        })
+        self.assertEqual(('[', ']'), colorizer.get_color_pair(color_tag='a'))
+        self.assertEqual(
+            ('[', ']'),
+            colorizer.get_color_pair(color_tag=['a']),
+        )
+        self.assertEqual(1, colorizer.cache_hits)
+        self.assertEqual(1, colorizer.cache_misses)
+
+    def test_colorizer_get_color_pair_cache_with_context(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+            'b': ('<', '>'),
+        })
+        colorizer.get_color_pair(color_tag=['a'], context_color_tag='b')
+        colorizer.get_color_pair(color_tag=['a'], context_color_tag='b')
+        colorizer.get_color_pair(color_tag=['a'])
+
+        # The context pair is resolved from the compiled color map.
+        self.assertEqual(1, colorizer.cache_hits)
+        self.assertEqual(2, colorizer.cache_misses)
+
+    def test_colorizer_colorize_many(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+            'b': ('<', '>'),
+        })
+        result = colorizer.colorize_many(
+            [Mark(1, 'a'), 2, Mark(3, 'a'), Mark(4, ['a'])],
+            color_tag='b',
+        )
+
+        self.assertEqual(
+            ['[1]', '<2>', '[3]', '[4]'],
+            [str(obj) for obj in result],
+        )
+
+        # The color pair of 'a' is looked up once for the whole batch.
+        self.assertEqual(0, colorizer.cache_hits)
+        self.assertEqual(2, colorizer.cache_misses)
+
+        # Unhashable color tags go through the colorizer every time.
+        colorizer.colorize_many([1, 2], color_tag=['a'])
+
+        self.assertEqual(2, colorizer.cache_hits)
+
+    def test_colorizer_colorize_many_with_separator(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+            'b': ('<', '>'),
+        })
+
+        self.assertEqual(
+            '><[1]><, ><2><',
+            colorizer.colorize_many(
+                [Mark(1, 'a'), Mark(2, 'other')],
+                context_color_tag='b',
+                separator=', ',
+            ),
+        )
+
+    def test_batch_colorizer(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+        })
+        batch = colorizer.batch()
+
+        self.assertIs(batch, batch.batch())
+        self.assertEqual(colorizer, batch)
+        self.assertEqual(batch, colorizer.batch())
+        self.assertNotEqual(Colorizer(), batch)
+        self.assertEqual(hash(colorizer), hash(batch))
+        self.assertEqual('[1]', str(batch.colorize(Mark(1, 'a'))))
+        self.assertEqual(['[1]'], list(
+            map(str, batch.colorize_many([Mark(1, 'a')])),
+        ))
+        self.assertEqual(
+            'a [1]',
+            batch.colorize_message('a {0}', Mark(1, 'a')),
+        )
+        self.assertEqual(1, colorizer.cache_misses)
+        self.assertEqual(0, colorizer.cache_hits)
+
+    def test_colorizer_get_color_pair_cache_is_bounded(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+        })
+        colorizer.cache_size = 2
+        colorizer.get_color_pair(color_tag=['a'])
+        colorizer.get_color_pair(color_tag=['b'])
+        colorizer.get_color_pair(color_tag=['a'])
+        colorizer.get_color_pair(color_tag=['c'])
+        colorizer.get_color_pair(color_tag=['a'])
+        colorizer.get_color_pair(color_tag=['b'])
+
+        self.assertEqual(2, colorizer.cache_hits)
+        self.assertEqual(4, colorizer.cache_misses)
+
+    def test_colorizer_cache_invalidated_on_color_map_change(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+        })
+        self.assertEqual(('[', ']'), colorizer.get_color_pair(color_tag=['a']))
+        colorizer.color_map = {
+            'a': ('<', '>'),
+        }
+        self.assertEqual(('<', '>'), colorizer.get_color_pair(color_tag=['a']))
+        self.assertEqual(0, colorizer.cache_hits)
+
+    def test_colorizer_cache_invalidated_on_default_color_tag_change(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+            'b': ('<', '>'),
+        })
+        self.assertEqual(('', ''), colorizer.get_color_pair(color_tag=['c']))
+        colorizer.default_color_tag = 'b'
+        self.assertEqual(('<', '>'), colorizer.get_color_pair(color_tag=['c']))
+        self.assertEqual(0, colorizer.cache_hits)
+
+    def test_colorizer_clear_cache(self):
+        color_map = {
+            'a': ('[', ']'),
+        }
+        colorizer = Colorizer(color_map)
+        self.assertEqual(('[', ']'), colorizer.get_color_pair(color_tag=['a']))
+        color_map['a'] = ('<', '>')
+        self.assertEqual(('[', ']'), colorizer.get_color_pair(color_tag=['a']))
+        colorizer.clear_cache()
+        self.assertEqual(('<', '>'), colorizer.get_color_pair(color_tag=['a']))
+
+    def test_colorizer_clear_cache_with_default_color_map(self):
+        class MyColorizer(Colorizer):
+            default_color_map = dict(Colorizer.default_color_map)
+
+        colorizer = MyColorizer()
+        self.assertEqual(('', ''), colorizer.get_color_pair(color_tag=['a']))
+        colorizer.color_map['a'] = ('<', '>')
+        colorizer.clear_cache()
+        self.assertEqual(('<', '>'), colorizer.get_color_pair(color_tag=['a']))
+
+    def test_default_color_maps_are_dictionaries(self):
+        for cls in (Colorizer, MonochromaticColorizer):
+            self.assertIsInstance(cls.default_color_map, dict)
+            color_map = cls.default_color_map.copy()
+            color_map['a'] = ('[', ']')
+            colorizer = cls(color_map)
+            self.assertEqual(('[', ']'), colorizer.get_color_pair(['a']))
+            self.assertEqual(
+                colorizer.get_color_pair(['important']),
+                cls().get_color_pair(['important']),
+            )
+
+    def test_colorizer_cache_generation(self):
+        colorizer = Colorizer({
+            'a': ('[', ']'),
+        })
+        generation = colorizer.cache_generation
+        batch = colorizer.batch()
+        colorizer.clear_cache()
+        colorizer.color_map = {}
+
+        self.assertEqual(generation + 2, colorizer.cache_generation)
+        self.assertEqual(generation + 2, batch.cache_generation)
+
+    def test_color_map_single_tags(self):
+        color_map = ColorMap({
+            'a': ('[', ']'),
+            'b': ('<', '>'),
+            'c': None,
+        })
+        self.assertEqual(('[', ']'), color_map['a'])
+        self.assertEqual(('<', '>'), color_map.get('b'))
+        self.assertIsNone(color_map.get('c'))
+        self.assertIsNone(color_map.get(None))
+        self.assertEqual({'a', 'b'}, set(color_map))
+        self.assertEqual(2, len(color_map))
+
+    def test_color_map_resolve(self):
+        color_map = ColorMap({
+            'a': ('[', ']'),
+            'b': ('<', '>'),
+            'c': ('(', ')'),
+        })
+        self.assertEqual(('[<', '>]'), color_map.resolve(('a', 'b')))
+        self.assertEqual(('[<(', ')>]'), color_map.resolve(('a', 'b', 'c')))
+        self.assertEqual(('[(', ')]'), color_map.resolve(('a', 'd', 'c')))
+        self.assertIsNone(color_map.resolve(('d',)))
+        self.assertIsNone(color_map.resolve(()))
+
+    def test_color_map_aliases(self):
+        color_map = ColorMap(
+            {
+                'a': ('[', ']'),
+                'b': ('<', '>'),
+            },
+            aliases={
+                'ab': ['a', 'b'],
+                'ab_a': ['ab', 'a'],
+                'unknown': ['c'],
+            },
+        )
+        self.assertEqual(('[<', '>]'), color_map['ab'])
+        self.assertEqual(('[<[', ']>]'), color_map['ab_a'])
+        self.assertEqual(('<[<', '>]>'), color_map.resolve(('b', 'ab')))
+        self.assertIsNone(color_map.get('unknown'))
+        self.assertEqual(
+            {
+                'ab': ('a', 'b'),
+                'ab_a': ('ab', 'a'),
+                'unknown': ('c',),
+            },
+            color_map.aliases,
+        )
+
+    def test_color_map_circular_aliases(self):
+        with self.assertRaises(ValueError):
+            ColorMap(
+                {
+                    'a': ('[', ']'),
+                },
+                aliases={
+                    'b': ['a', 'c'],
+                    'c': ['b'],
+                },
+            )
+
+    def test_color_map_combinations(self):
+        color_map = ColorMap(
+            {
+                'a': ('[', ']'),
+                'b': ('<', '>'),
+                'c': ('(', ')'),
+            },
+            combinations=[['a', 'b', 'c']],
+        )
+        self.assertEqual(
+            ('[<(', ')>]'),
+            color_map._table[('a', 'b', 'c')],
+        )
+
+    def test_color_map_repr(self):
+        color_map = ColorMap({'a': ('[', ']')}, aliases={'b': ['a']})
+        self.assertEqual(
+            "ColorMap({'a': ('[', ']')}, aliases={'b': ('a',)})",
+            repr(color_map),
+        )
+
+    def test_colorizer_with_color_map(self):
+        colorizer = Colorizer(
+            ColorMap(
+                {
+                    'a': ('[', ']'),
+                    'b': ('<', '>'),
+                },
+                aliases={
+                    'ab': ['a', 'b'],
+                },
+            ),
+            default_color_tag='b',
+        )
+        self.assertEqual(('[', ']'), colorizer.get_color_pair(color_tag='a'))
+        self.assertEqual(('[<', '>]'), colorizer.get_color_pair(['ab']))
+        self.assertEqual(('<', '>'), colorizer.get_color_pair(['c']))
+        self.assertEqual(
+            ('', ''),
+            colorizer.get_color_pair(['c'], use_default=False),
+        )
+        self.assertEqual(
+            ('><[<', '>]><'),
+            colorizer.get_color_pair(['ab'], context_color_tag='b'),
+        )
+
     @repeat_for_values()
     def test_colorizer_converts_unknown_types(self, _, value):
         colorizer = Colorizer(color_map={
@@ -291,6 +565,30 @@ class ColorizerTests(TestCase):
             repr(ColorizedObject(value, color_pair=('<', '>'))),
         )
 
+    def test_colorized_object_renders_once(self):
+        calls = []
+
+        class Object(object):
+            def __str__(self):
+                calls.append('str')
+                return 'str'
+
+            def __repr__(self):
+                calls.append('repr')
+                return 'repr'
+
+        obj = Object()
+        colorized_object = ColorizedObject(obj, color_pair=('<', '>'))
+
+        self.assertEqual('<str>', str(colorized_object))
+        self.assertEqual('<str>', '%s' % colorized_object)
+        self.assertEqual('<repr>', repr(colorized_object))
+        self.assertEqual('<repr>', '%r' % colorized_object)
+        self.assertEqual(['str', 'repr'], calls)
+
+    def test_colorized_object_has_no_dict(self):
+        self.assertFalse(hasattr(ColorizedObject(42), '__dict__'))
+
     @repeat_for_values({
         "integer": int,
         "float": float,
@@ -312,14 +610,3 @@ class ColorizerTests(TestCase):
             type_(),
             type_(ColorizedObject(type_(), color_pair=('<', '>'))),
         )
-
-    def test_explicit_unicode_in_python3(self):
-        if PY3:
-            self.assertEqual(
-                u'test',
-                ColorizedObject(u'test').__unicode__(),
-            )
-            self.assertEqual(
-                u'<test>',
-                ColorizedObject(u'test', color_pair=('<', '>')).__unicode__(),
-            )
@@ -0,0 +1,163 @@
+"""
+Test colorizing handlers.
+"""
+import logging
+
+from unittest import TestCase
+from logging import DEBUG
+from queue import Queue
+
+from unittest.mock import MagicMock
+from io import StringIO
+
+from chromalog.buffer import (
+    DROP_NEWEST,
+    BoundedQueue,
+)
+from chromalog.colorizer import GenericColorizer
+from chromalog.handlers import (
+    ColorizingQueueHandler,
+    ColorizingQueueListener,
+)
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+from chromalog.mark import Mark
+
+from .common import (
+    ColorStream,
+    make_record,
+)
+
+
+class QueueHandlerTests(TestCase):
+    def test_queue_handler_enqueues_unmodified_records(self):
+        queue = Queue()
+        handler = ColorizingQueueHandler(queue)
+        record = make_record()
+        handler.handle(record)
+
+        self.assertIs(record, queue.get_nowait())
+        self.assertEqual((4, 5, Mark(9, 'bracket')), record.args)
+        self.assertIsNone(handler.listener)
+
+    def test_queue_handler_with_queue_rejects_listener_arguments(self):
+        with self.assertRaises(TypeError):
+            ColorizingQueueHandler(Queue(), stream=StringIO())
+
+    def test_queue_handler_formats_in_listener(self):
+        stream = ColorStream()
+        handler = ColorizingQueueHandler(
+            stream=stream,
+            colorizer=GenericColorizer(color_map={
+                'bracket': ('[', ']'),
+            }),
+        )
+        handler.setFormatter(ColorizingFormatter(fmt='%(name)s:%(message)s'))
+
+        for _ in range(100):
+            handler.handle(make_record())
+
+        handler.close()
+
+        self.assertEqual(
+            'my_record:4 + 5 gives [9]\n' * 100,
+            stream.getvalue(),
+        )
+        self.assertIsNone(handler.listener._thread)
+
+        # Closing twice is harmless.
+        handler.close()
+
+    def test_queue_handler_with_logger(self):
+        stream = StringIO()
+        handler = ColorizingQueueHandler(stream=stream)
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        logger.info('hello %s', 'world')
+        handler.close()
+
+        self.assertEqual('hello world\n', stream.getvalue())
+
+    def test_queue_handler_with_bounded_queue(self):
+        queue = BoundedQueue(2, policy=DROP_NEWEST)
+        handler = ColorizingQueueHandler(queue)
+
+        for _ in range(5):
+            handler.handle(make_record())
+
+        self.assertEqual(3, handler.drop_counter.dropped)
+        self.assertEqual({DEBUG: 3}, handler.drop_counter.dropped_by_level)
+
+        stream = ColorStream()
+        listener = ColorizingQueueListener(
+            queue,
+            stream=stream,
+            colorizer=GenericColorizer(color_map={
+                'bracket': ('[', ']'),
+                'important': ('*', '*'),
+                'warning': ('<w>', '</w>'),
+            }),
+        )
+        listener.handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        listener.start()
+        listener.stop()
+
+        self.assertEqual(
+            '4 + 5 gives [9]\n' * 2 +
+            '<w></w><w>*3*</w><w> records dropped (</w><w>*3*</w>'
+            '<w> debug)</w>\n',
+            stream.getvalue(),
+        )
+
+    def test_queue_handler_creates_a_bounded_queue(self):
+        handler = ColorizingQueueHandler(max_size=2, stream=StringIO())
+
+        self.assertIsInstance(handler.queue, BoundedQueue)
+        self.assertEqual(2, handler.queue.buffer.max_size)
+        self.assertEqual(0, handler.drop_counter.dropped)
+        handler.close()
+
+    def test_queue_handler_with_queue_rejects_max_size(self):
+        with self.assertRaises(TypeError):
+            ColorizingQueueHandler(Queue(), max_size=2)
+
+    def test_queue_handler_without_bounded_queue(self):
+        self.assertIsNone(ColorizingQueueHandler(Queue()).drop_counter)
+
+
+class QueueListenerTests(TestCase):
+    def test_queue_listener_creates_a_colorizing_stream_handler(self):
+        stream = StringIO()
+        highlighter = GenericColorizer(color_map={'a': ('[', ']')})
+        listener = ColorizingQueueListener(
+            Queue(),
+            stream=stream,
+            highlighter=highlighter,
+        )
+
+        self.assertIsInstance(listener.handler, ColorizingStreamHandler)
+        self.assertIs(stream, listener.handler.stream)
+        self.assertIs(highlighter, listener.handler.highlighter)
+        self.assertEqual((listener.handler,), listener.handlers)
+
+    def test_queue_listener_with_handlers(self):
+        queue = Queue()
+        handler = MagicMock()
+        listener = ColorizingQueueListener(queue, handler)
+        listener.start()
+        record = make_record()
+        queue.put_nowait(record)
+        listener.stop()
+
+        self.assertIsNone(listener.handler)
+        handler.handle.assert_called_once_with(record)
+        handler.flush.assert_called_once_with()
+
+    def test_queue_listener_with_handlers_rejects_handler_arguments(self):
+        with self.assertRaises(TypeError):
+            ColorizingQueueListener(Queue(), MagicMock(), stream=StringIO())
+
+    def test_queue_listener_stop_when_not_started(self):
+        ColorizingQueueListener(Queue()).stop()
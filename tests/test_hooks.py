@@ -0,0 +1,256 @@
+"""
+Test hooks.
+"""
+import logging
+
+from contextlib import contextmanager
+from unittest import TestCase
+
+from io import StringIO
+
+from chromalog import hooks
+from chromalog.aio import AsyncColorizingStreamHandler
+from chromalog.colorizer import (
+    BatchColorizer,
+    GenericColorizer,
+)
+from chromalog.hooks import (
+    COLOR_PAIR,
+    FORMATTER_OVERLAY,
+    HANDLER_FORMAT,
+    STREAM_WRITE,
+    register,
+    registered,
+    registered_hooks,
+    unregister,
+)
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+from chromalog.mark import Mark
+from chromalog.spans import FanOutHandler
+
+from .common import ColorStream
+
+
+class Recorder(object):
+    def __init__(self, name='hook'):
+        self.name = name
+        self.events = []
+
+    @contextmanager
+    def __call__(self, *args, **kwargs):
+        self.events.append((self.name, 'enter', args))
+
+        try:
+            yield
+        except Exception as ex:
+            self.events.append((self.name, 'error', ex))
+            raise
+
+        self.events.append((self.name, 'exit'))
+
+
+def make_handler(stream=None):
+    handler = ColorizingStreamHandler(
+        stream=stream or ColorStream(),
+        colorizer=GenericColorizer(color_map={'bracket': ('[', ']')}),
+    )
+    handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+
+    return handler
+
+
+class HooksTests(TestCase):
+    def test_original_methods_are_restored(self):
+        original = GenericColorizer.__dict__['get_color_pair']
+        recorder = Recorder()
+
+        with registered(COLOR_PAIR, recorder):
+            self.assertIsNot(
+                original,
+                GenericColorizer.__dict__['get_color_pair'],
+            )
+            self.assertEqual((recorder,), registered_hooks(COLOR_PAIR))
+
+        self.assertIs(original, GenericColorizer.__dict__['get_color_pair'])
+        self.assertEqual((), registered_hooks(COLOR_PAIR))
+
+    def test_handler_format_hook(self):
+        handler = make_handler()
+        record = logging.makeLogRecord({'msg': 'a'})
+        recorder = Recorder()
+
+        with registered(HANDLER_FORMAT, recorder):
+            self.assertEqual('a', handler.format(record))
+
+        self.assertEqual(
+            [('hook', 'enter', (handler, record)), ('hook', 'exit')],
+            recorder.events,
+        )
+
+    def test_formatter_overlay_hook(self):
+        formatter = ColorizingFormatter(fmt='%(message)s')
+        colorizer = GenericColorizer(color_map={'bracket': ('[', ']')})
+        record = logging.makeLogRecord({
+            'msg': '%s',
+            'args': (Mark('a', 'bracket'),),
+        })
+        recorder = Recorder()
+
+        with registered(FORMATTER_OVERLAY, recorder):
+            self.assertEqual(
+                '[a]',
+                formatter.format_colorized(record, colorizer=colorizer),
+            )
+
+        self.assertEqual(
+            [
+                ('hook', 'enter', (formatter, record, colorizer, None, None)),
+                ('hook', 'exit'),
+            ],
+            recorder.events,
+        )
+
+    def test_color_pair_hook(self):
+        colorizer = GenericColorizer(color_map={'bracket': ('[', ']')})
+        batch = colorizer.batch()
+        recorder = Recorder()
+
+        with registered(COLOR_PAIR, recorder):
+            colorizer.get_color_pair('bracket')
+            batch.get_color_pair('bracket', context_color_tag='other')
+            batch.get_color_pair('bracket', context_color_tag='other')
+
+        # The batch colorizer looks its color pairs up once, with the
+        # colorizer.
+        self.assertEqual(
+            [
+                ('hook', 'enter', (colorizer, 'bracket')),
+                ('hook', 'exit'),
+                ('hook', 'enter', (colorizer,)),
+                ('hook', 'exit'),
+            ],
+            recorder.events,
+        )
+        self.assertIsInstance(batch, BatchColorizer)
+
+    def test_fan_out_handler_hooks(self):
+        streams = [StringIO(), StringIO()]
+        handler = FanOutHandler([(stream, None) for stream in streams])
+        record = logging.makeLogRecord({'msg': 'a'})
+        recorder = Recorder()
+
+        with registered(HANDLER_FORMAT, recorder):
+            with registered(STREAM_WRITE, recorder):
+                handler.handle(record)
+
+        self.assertEqual(
+            [
+                ('hook', 'enter', (handler, record)),
+                ('hook', 'exit'),
+                ('hook', 'enter', (handler, 'a\n', streams[0])),
+                ('hook', 'exit'),
+                ('hook', 'enter', (handler, 'a\n', streams[1])),
+                ('hook', 'exit'),
+            ],
+            recorder.events,
+        )
+
+    def test_stream_write_hook(self):
+        handler = make_handler()
+        recorder = Recorder()
+
+        with registered(STREAM_WRITE, recorder):
+            handler.handle(logging.makeLogRecord({'msg': 'a'}))
+
+        self.assertEqual(
+            [('hook', 'enter', (handler, 'a\n')), ('hook', 'exit')],
+            recorder.events,
+        )
+
+    def test_stream_write_hook_without_color(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(stream=stream)
+        recorder = Recorder()
+        handler.handle(logging.makeLogRecord({'msg': 'a'}))
+
+        with registered(STREAM_WRITE, recorder):
+            handler.handle(logging.makeLogRecord({'msg': 'b'}))
+
+        handler.handle(logging.makeLogRecord({'msg': 'c'}))
+
+        self.assertEqual(
+            [('hook', 'enter', (handler, 'b\n')), ('hook', 'exit')],
+            recorder.events,
+        )
+        self.assertEqual('a\nb\nc\n', stream.getvalue())
+
+    def test_stream_write_hook_of_async_handler(self):
+        stream = StringIO()
+        handler = AsyncColorizingStreamHandler(stream=stream)
+        recorder = Recorder()
+
+        with registered(STREAM_WRITE, recorder):
+            handler.handle(logging.makeLogRecord({'msg': 'a'}))
+
+        handler.close()
+
+        self.assertEqual(
+            [('hook', 'enter', (handler, 'a\n')), ('hook', 'exit')],
+            recorder.events,
+        )
+        self.assertEqual('a\n', stream.getvalue())
+
+    def test_hooks_are_nested_in_order(self):
+        handler = make_handler()
+        first = Recorder('first')
+        second = Recorder('second')
+        second.events = first.events
+        record = logging.makeLogRecord({'msg': 'a'})
+
+        with registered(HANDLER_FORMAT, first):
+            with registered(HANDLER_FORMAT, second):
+                handler.format(record)
+
+            handler.format(record)
+
+        self.assertEqual(
+            [
+                ('first', 'enter', (handler, record)),
+                ('second', 'enter', (handler, record)),
+                ('second', 'exit'),
+                ('first', 'exit'),
+                ('first', 'enter', (handler, record)),
+                ('first', 'exit'),
+            ],
+            first.events,
+        )
+
+    def test_hooks_see_errors(self):
+        colorizer = GenericColorizer(color_map={'bracket': ('[', ']')})
+        recorder = Recorder()
+
+        with registered(COLOR_PAIR, recorder):
+            with self.assertRaises(TypeError):
+                colorizer.get_color_pair()
+
+        self.assertEqual('error', recorder.events[-1][1])
+
+    def test_unknown_hook_point(self):
+        with self.assertRaises(ValueError):
+            register('handler.emit', Recorder())
+
+        with self.assertRaises(ValueError):
+            registered_hooks('handler.emit')
+
+    def test_unregister_unknown_hook(self):
+        with self.assertRaises(ValueError):
+            unregister(HANDLER_FORMAT, Recorder())
+
+    def test_hook_points(self):
+        self.assertEqual(
+            (COLOR_PAIR, FORMATTER_OVERLAY, HANDLER_FORMAT, STREAM_WRITE),
+            hooks.HOOK_POINTS,
+        )
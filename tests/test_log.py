@@ -4,16 +4,21 @@ Test colorized logging structures.
 import sys
 import logging
 
+from threading import (
+    Event,
+    Thread,
+)
+
 from unittest import TestCase
 from logging import (
     LogRecord,
     DEBUG,
 )
-from mock import (
+from unittest.mock import (
     MagicMock,
     patch,
 )
-from six import StringIO
+from io import StringIO
 
 from chromalog import basicConfig
 from chromalog.colorizer import GenericColorizer
@@ -21,6 +26,9 @@ from chromalog.mark import Mark
 from chromalog.log import (
     ColorizingFormatter,
     ColorizingStreamHandler,
+    LevelColorTag,
+    RecordView,
+    compile_color_tag,
 )
 
 
@@ -114,6 +122,148 @@ class LogTests(TestCase):
         colorizer.colorize.assert_any_call(5, context_color_tag=None)
         colorizer.colorize.assert_any_call(9, context_color_tag=None)
 
+    def test_colorizing_formatter_does_not_modify_record(self):
+        formatter = ColorizingFormatter(fmt='%(levelname)s:%(message)s')
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%s + %s gives %s',
+            args=(4, 5, 4 + 5,),
+            exc_info=None,
+        )
+        save_dict = record.__dict__.copy()
+        colorizer = GenericColorizer(color_map={
+            'bracket': ('[', ']'),
+        })
+
+        self.assertEqual(
+            '[DEBUG]:[4 + 5 gives 9]',
+            formatter.format_colorized(
+                record,
+                colorizer=colorizer,
+                message_color_tag='bracket',
+                attributes={'levelname': Mark('DEBUG', 'bracket')},
+            ),
+        )
+        self.assertEqual(save_dict, record.__dict__)
+
+    def test_colorizing_formatter_colorizes_referenced_fields_only(self):
+        formatter = ColorizingFormatter(
+            fmt='%(levelname)s:%(lineno)d:%(user)s:%(missing)s:%(message)s',
+        )
+        self.assertEqual(
+            ('levelname', 'user', 'missing'),
+            formatter.colorized_attributes,
+        )
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='hello',
+            args=(),
+            exc_info=None,
+        )
+        record.user = 'john'
+        record.missing = 'here'
+        del record.missing
+        colorizer = self.create_colorizer(format='[%s]')
+
+        # Python 3.8+ turns the KeyError into a ValueError.
+        with self.assertRaises((KeyError, ValueError)):
+            formatter.format_colorized(record, colorizer=colorizer)
+
+        record.missing = 'here'
+        self.assertEqual(
+            '[DEBUG]:42:[john]:[here]:hello',
+            formatter.format_colorized(record, colorizer=colorizer),
+        )
+        self.assertEqual(5, colorizer.colorize.call_count)
+
+    def test_colorizing_formatter_with_brace_style(self):
+        formatter = ColorizingFormatter(
+            fmt='{levelname}:{lineno:d}:{message}',
+            style='{',
+        )
+        self.assertEqual(('levelname',), formatter.colorized_attributes)
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='hello',
+            args=(),
+            exc_info=None,
+        )
+        self.assertEqual(
+            '[DEBUG]:42:hello',
+            formatter.format_colorized(
+                record,
+                colorizer=self.create_colorizer(format='[%s]'),
+            ),
+        )
+
+    def test_colorizing_formatter_with_exception(self):
+        formatter = ColorizingFormatter(fmt='%(message)s')
+
+        try:
+            raise RuntimeError('boom')
+        except RuntimeError:
+            exc_info = sys.exc_info()
+
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='failure',
+            args=(),
+            exc_info=exc_info,
+        )
+        colorizer = GenericColorizer(color_map={'a': ('[', ']')})
+        result = formatter.format_colorized(record, colorizer=colorizer)
+
+        self.assertTrue(result.startswith('failure\nTraceback'))
+        self.assertTrue(result.endswith('RuntimeError: boom'))
+        self.assertIsNone(record.exc_text)
+
+    def test_record_view(self):
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%s',
+            args=(4,),
+            exc_info=None,
+        )
+        view = RecordView(record)
+        view.args = (5,)
+        self.assertEqual('5', view.getMessage())
+        self.assertEqual('my_record', view.name)
+        self.assertEqual((5,), view.__dict__['args'])
+        self.assertEqual('my_record', view.__dict__['name'])
+        del view.args
+        self.assertEqual('4', view.getMessage())
+        self.assertEqual((4,), record.args)
+
+    def test_record_view_of_record_view(self):
+        record = logging.makeLogRecord({'msg': '%s', 'args': (4,)})
+        view = RecordView(RecordView(record, {'args': (5,)}), {'name': 'b'})
+
+        self.assertEqual('5', view.getMessage())
+        self.assertEqual('b', view.name)
+
+    def test_record_view_message_errors(self):
+        record = logging.makeLogRecord({'msg': '%s %s', 'args': (4,)})
+
+        with self.assertRaises(TypeError) as context:
+            RecordView(record).getMessage()
+
+        self.assertIsNone(context.exception.__context__)
+
     @patch('sys.stderr', spec=sys.stderr)
     def test_csh_uses_stderr_as_default(self, stream):
         stream.isatty = lambda: False
@@ -126,11 +276,28 @@ class LogTests(TestCase):
         with patch(
             'chromalog.log.stream_has_color_support',
             return_value=True,
+        ), patch(
+            'chromalog.log.stream_needs_ansi_conversion',
+            return_value=True,
         ):
             handler = ColorizingStreamHandler(stream=stream)
 
         self.assertFalse(handler.stream is stream)
 
+    def test_csh_dont_uses_streamwrapper_if_no_conversion_needed(self):
+        stream = StringIO()
+
+        with patch(
+            'chromalog.log.stream_has_color_support',
+            return_value=True,
+        ), patch(
+            'chromalog.log.stream_needs_ansi_conversion',
+            return_value=False,
+        ):
+            handler = ColorizingStreamHandler(stream=stream)
+
+        self.assertTrue(handler.stream is stream)
+
     def test_csh_dont_uses_streamwrapper_if_no_color(self):
         stream = StringIO()
         handler = ColorizingStreamHandler(stream=stream)
@@ -209,6 +376,105 @@ class LogTests(TestCase):
         # Make sure that the colorizer attribute was removed after processing.
         self.assertFalse(hasattr(record, 'colorizer'))
 
+    def test_csh_format_does_not_modify_record(self):
+        colorizer = GenericColorizer(color_map={
+            'bracket': ('[', ']'),
+            'important': ('<', '>'),
+            'debug': ('(', ')'),
+        })
+        color_stream = MagicMock()
+        color_stream.isatty = lambda: True
+        handler = ColorizingStreamHandler(
+            stream=color_stream,
+            colorizer=colorizer,
+        )
+        handler.setFormatter(
+            ColorizingFormatter(fmt='%(levelname)s:%(name)s:%(message)s'),
+        )
+        plain_handler = logging.StreamHandler(stream=StringIO())
+        plain_handler.setFormatter(
+            logging.Formatter(fmt='%(levelname)s:%(name)s:%(message)s'),
+        )
+
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%s + %s gives %s',
+            args=(4, 5, Mark(4 + 5, color_tag='bracket'),),
+            exc_info=None,
+        )
+
+        self.assertEqual(
+            '(DEBUG):<my_record>:(4 + 5 gives )([9])()',
+            handler.format(record),
+        )
+        self.assertEqual('my_record', record.name)
+        self.assertEqual('DEBUG', record.levelname)
+        self.assertEqual(
+            'DEBUG:my_record:4 + 5 gives 9',
+            plain_handler.format(record),
+        )
+
+    def test_csh_format_with_non_colorizing_formatter(self):
+        color_stream = MagicMock()
+        color_stream.isatty = lambda: True
+        handler = ColorizingStreamHandler(stream=color_stream)
+        handler.setFormatter(logging.Formatter(fmt='%(name)s:%(message)s'))
+
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%s',
+            args=(Mark(4, color_tag='bracket'),),
+            exc_info=None,
+        )
+
+        self.assertEqual('my_record:4', handler.format(record))
+
+    def test_csh_format_with_overriden_formatter_format(self):
+        class PrefixingFormatter(ColorizingFormatter):
+            def format(self, record):
+                return 'PREFIX ' + super(PrefixingFormatter, self).format(
+                    record,
+                )
+
+        color_stream = MagicMock()
+        color_stream.isatty = lambda: True
+        handler = ColorizingStreamHandler(
+            stream=color_stream,
+            colorizer=GenericColorizer(color_map={
+                'bracket': ('[', ']'),
+                'debug': ('<', '>'),
+            }),
+        )
+        handler.setFormatter(ColorizingFormatter(fmt='%(name)s:%(message)s'))
+        record = logging.makeLogRecord({
+            'name': 'my_record',
+            'levelno': DEBUG,
+            'levelname': 'DEBUG',
+            'msg': '%s',
+            'args': (Mark(4, color_tag='bracket'),),
+        })
+        colorized = handler.format(record)
+        handler.setFormatter(PrefixingFormatter(fmt='%(name)s:%(message)s'))
+
+        self.assertIn('[4]', colorized)
+        self.assertEqual('PREFIX ' + colorized, handler.format(record))
+        self.assertEqual(
+            'PREFIX ' + colorized + '\n',
+            handler.format_batch([record]),
+        )
+        self.assertEqual((Mark(4, color_tag='bracket'),), record.args)
+        self.assertFalse(hasattr(record, 'colorizer'))
+
+        handler.color_disabled = True
+
+        self.assertEqual('PREFIX my_record:4', handler.format(record))
+
     def test_csh_format_no_color_support(self):
         colorizer = GenericColorizer(color_map={
             'bracket': ('[', ']'),
@@ -297,6 +563,33 @@ class LogTests(TestCase):
         # Make sure that the colorizer attribute was removed after processing.
         self.assertFalse(hasattr(record, 'colorizer'))
 
+    def test_csh_format_without_colorizer_skips_attributes_map(self):
+        color_tag = MagicMock(return_value='bracket')
+        formatter = ColorizingFormatter(fmt='%(levelname)s:%(message)s')
+        color_stream = MagicMock()
+        color_stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(
+            stream=color_stream,
+            attributes_map={
+                'levelname': color_tag,
+                'message': color_tag,
+            },
+        )
+        handler.setFormatter(formatter)
+
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%s + %s gives %s',
+            args=(4, 5, Mark(4 + 5, color_tag='bracket'),),
+            exc_info=None,
+        )
+
+        self.assertEqual('DEBUG:4 + 5 gives 9', handler.format(record))
+        self.assertFalse(color_tag.called)
+
     def test_csh_format_disabled_color_support(self):
         colorizer = GenericColorizer(color_map={
             'bracket': ('[', ']'),
@@ -333,6 +626,738 @@ class LogTests(TestCase):
             ColorizingStreamHandler._RECORD_ATTRIBUTE_NAME,
         ))
 
+    def test_csh_format_with_templates(self):
+        colorizer = GenericColorizer(color_map={
+            'my_record': ('[', ']'),
+            'debug': ('<', '>'),
+            'level-10': ('(', ')'),
+        })
+        color_stream = MagicMock()
+        color_stream.isatty = lambda: True
+        handler = ColorizingStreamHandler(
+            stream=color_stream,
+            colorizer=colorizer,
+            attributes_map={
+                'name': '{name}',
+                'levelname': 'level-{levelno}',
+                'message': 'debug',
+            },
+        )
+        handler.setFormatter(
+            ColorizingFormatter(fmt='%(levelname)s:%(name)s:%(message)s'),
+        )
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='hello',
+            args=(),
+            exc_info=None,
+        )
+
+        self.assertEqual('(DEBUG):[my_record]:<hello>', handler.format(record))
+
+        handler.attributes_map = {'name': 'debug'}
+        self.assertEqual({'name': 'debug'}, handler.attributes_map)
+        self.assertEqual('DEBUG:<my_record>:hello', handler.format(record))
+
+    def test_compile_color_tag(self):
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='hello',
+            args=(),
+            exc_info=None,
+        )
+        func = MagicMock(return_value='a')
+
+        self.assertIs(func, compile_color_tag(func))
+        self.assertEqual('a', compile_color_tag('a'))
+        self.assertEqual(
+            'my_record-42',
+            compile_color_tag('{name}-{lineno}')(record),
+        )
+        self.assertEqual("'m", compile_color_tag('{name[0]!r:.2}')(record))
+        self.assertIsInstance(
+            compile_color_tag('{levelname}-{levelno}'),
+            LevelColorTag,
+        )
+
+    def test_level_color_tag_is_memoized(self):
+        func = MagicMock(side_effect=lambda record: record.levelname.lower())
+        color_tag = LevelColorTag(func)
+
+        for level in (logging.DEBUG, logging.INFO, logging.DEBUG):
+            record = LogRecord(
+                name='my_record',
+                level=level,
+                pathname='my_path',
+                lineno=42,
+                msg='hello',
+                args=(),
+                exc_info=None,
+            )
+            self.assertEqual(
+                logging.getLevelName(level).lower(),
+                color_tag(record),
+            )
+
+        self.assertEqual(2, func.call_count)
+
+    def test_csh_buffering(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(stream=stream, buffer_size=13)
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+
+        logger.info('hello')
+        logger.info('world')
+        self.assertFalse(stream.write.called)
+
+        logger.info('!')
+        stream.write.assert_called_once_with('hello\nworld\n!\n')
+        self.assertEqual(3, handler.buffered_records)
+        self.assertEqual(1, handler.buffer_writes)
+        self.assertEqual(2, handler.writes_saved)
+
+    def test_csh_buffering_flushes_on_level(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(stream=stream, buffer_size=1024)
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+
+        logger.warning('hello')
+        self.assertFalse(stream.write.called)
+        logger.error('world')
+        stream.write.assert_called_once_with('hello\nworld\n')
+
+    def test_csh_buffering_flushes_on_close(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(stream=stream, buffer_size=1024)
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+
+        logger.info('hello')
+        handler.close()
+        stream.write.assert_called_once_with('hello\n')
+
+        # Nothing left to write.
+        handler.flush()
+        stream.write.assert_called_once_with('hello\n')
+
+    def test_csh_buffering_flushes_on_interval(self):
+        written = Event()
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        stream.write.side_effect = lambda data: written.set()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            buffer_size=1024,
+            flush_interval=0.01,
+        )
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+
+        logger.info('hello')
+        logger.info('world')
+        self.assertTrue(written.wait(5))
+        stream.write.assert_called_once_with('hello\nworld\n')
+
+    def test_csh_buffering_handles_errors(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(stream=stream, buffer_size=1)
+        handler.handleError = MagicMock()
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%d',
+            args=('not a number',),
+            exc_info=None,
+        )
+        handler.emit(record)
+        handler.handleError.assert_called_once_with(record)
+
+    def test_csh_write_handles_errors(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        stream.write.side_effect = OSError
+        handler = ColorizingStreamHandler(stream=stream)
+        handler.handleError = MagicMock()
+        record = logging.makeLogRecord({'msg': 'a'})
+        handler.emit(record)
+
+        handler.handleError.assert_called_once_with(record)
+
+        stream.write.side_effect = RecursionError
+
+        with self.assertRaises(RecursionError):
+            handler.emit(record)
+
+    def test_csh_handle_formats_without_lock(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(stream=stream)
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        format = handler.format
+        lock_available = []
+
+        def acquire_lock():
+            if handler.lock.acquire(blocking=False):
+                lock_available.append(True)
+                handler.lock.release()
+
+        def format_in_thread(record):
+            thread = Thread(target=acquire_lock)
+            thread.start()
+            thread.join()
+
+            return format(record)
+
+        handler.format = format_in_thread
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        logger.info('hello')
+
+        self.assertEqual([True], lock_available)
+        stream.write.assert_called_once_with('hello\n')
+
+    def test_csh_handle_filters(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        handler = ColorizingStreamHandler(stream=stream)
+        handler.addFilter(lambda record: record.msg != 'hidden')
+        record = logging.makeLogRecord({'msg': 'hidden'})
+
+        self.assertFalse(handler.handle(record))
+        self.assertFalse(stream.write.called)
+        self.assertTrue(handler.handle(logging.makeLogRecord({'msg': 'a'})))
+        stream.write.assert_called_once_with('a\n')
+
+    def test_csh_handle_filter_replaces_record(self):
+        # With and without something to colorize with.
+        for highlighter in (
+            None,
+            GenericColorizer(color_map={'a': ('<', '>')}),
+        ):
+            stream = StringIO()
+            handler = ColorizingStreamHandler(
+                stream=stream,
+                highlighter=highlighter,
+            )
+            replacement = logging.makeLogRecord({'msg': 'b'})
+            # Like filters that return a record, since Python 3.12.
+            handler.filter = MagicMock(return_value=replacement)
+
+            self.assertIs(
+                replacement,
+                handler.handle(logging.makeLogRecord({'msg': 'a'})),
+            )
+            self.assertEqual('b\n', stream.getvalue())
+
+    def test_csh_handle_handles_format_errors(self):
+        for highlighter in (
+            None,
+            GenericColorizer(color_map={'a': ('<', '>')}),
+        ):
+            stream = MagicMock()
+            stream.isatty = lambda: False
+            handler = ColorizingStreamHandler(
+                stream=stream,
+                highlighter=highlighter,
+            )
+            handler.handleError = MagicMock()
+            record = logging.makeLogRecord({'msg': '%d', 'args': ('a',)})
+
+            self.assertTrue(handler.handle(record))
+            handler.handleError.assert_called_once_with(record)
+            self.assertFalse(stream.write.called)
+
+    def test_csh_handle_without_color(self):
+        for formatter in (
+            None,
+            logging.Formatter('%(levelname)s:%(message)s'),
+            ColorizingFormatter('%(levelname)s:%(message)s'),
+        ):
+            stream = MagicMock()
+            stream.isatty = lambda: False
+            handler = ColorizingStreamHandler(stream=stream)
+            handler.setFormatter(formatter)
+            baseline_stream = MagicMock()
+            baseline = logging.StreamHandler(stream=baseline_stream)
+            baseline.setFormatter(formatter)
+            record = logging.makeLogRecord({
+                'levelname': 'INFO',
+                'msg': '%s',
+                'args': (Mark(4, color_tag='bracket'),),
+            })
+
+            self.assertTrue(handler.handle(record))
+            baseline.handle(record)
+            self.assertEqual(
+                baseline_stream.write.mock_calls,
+                stream.write.mock_calls,
+            )
+            self.assertEqual(
+                baseline_stream.flush.mock_calls,
+                stream.flush.mock_calls,
+            )
+
+    def test_csh_handle_without_color_handles_write_errors(self):
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        stream.write.side_effect = OSError
+        handler = ColorizingStreamHandler(stream=stream)
+        handler.handleError = MagicMock()
+        record = logging.makeLogRecord({'msg': 'a'})
+
+        self.assertTrue(handler.handle(record))
+        handler.handleError.assert_called_once_with(record)
+
+        stream.write.side_effect = RecursionError
+
+        with self.assertRaises(RecursionError):
+            handler.handle(record)
+
+    def test_csh_handle_calls_overriden_emit(self):
+        emitted = []
+
+        class EmittingHandler(ColorizingStreamHandler):
+            def emit(self, record):
+                # The lock is held, by the thread that handles the record.
+                thread = Thread(
+                    target=lambda: emitted.append(
+                        self.lock.acquire(blocking=False),
+                    ),
+                )
+                thread.start()
+                thread.join()
+                super(EmittingHandler, self).emit(record)
+
+        stream = StringIO()
+        handler = EmittingHandler(stream=stream)
+        handler.addFilter(lambda record: record.msg != 'hidden')
+
+        self.assertFalse(handler.handle(logging.makeLogRecord({
+            'msg': 'hidden',
+        })))
+        self.assertTrue(handler.handle(logging.makeLogRecord({'msg': 'a'})))
+        self.assertEqual([False], emitted)
+        self.assertEqual('a\n', stream.getvalue())
+
+    def test_csh_collapse_repeats(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            collapse_repeats=True,
+        )
+        handler.setFormatter(ColorizingFormatter(fmt='%(name)s:%(message)s'))
+        handler.format = MagicMock(wraps=handler.format)
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+
+        for _ in range(1000):
+            logger.warning('retrying in %s seconds', 1)
+
+        logger.warning('retrying in %s seconds', 2)
+        logger.warning('retrying in %s seconds', 2)
+        handler.close()
+
+        self.assertEqual(
+            'test:retrying in 1 seconds\n'
+            'test:last message repeated 999 times\n'
+            'test:retrying in 2 seconds\n'
+            'test:last message repeated 1 times\n',
+            stream.getvalue(),
+        )
+        self.assertEqual(1000, handler.repeated_records)
+        self.assertEqual(4, handler.format.call_count)
+
+    def test_csh_collapse_repeats_compares_records(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            collapse_repeats=True,
+        )
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        other_logger = logging.Logger('other')
+        other_logger.addHandler(handler)
+
+        logger.info('a %s', Mark(1, 'important'))
+        logger.info('a %s', Mark(1, 'important'))
+        logger.warning('a %s', Mark(1, 'important'))
+        other_logger.warning('a %s', Mark(1, 'important'))
+        other_logger.warning('a %s', Mark(1, 'debug'))
+        other_logger.warning('a %s', [1])
+        other_logger.warning('a %s', [1])
+
+        try:
+            raise ValueError
+        except ValueError:
+            logger.exception('a')
+            logger.exception('a')
+
+        self.assertEqual(
+            'a 1\nlast message repeated 1 times\n' +
+            'a 1\n' * 3 +
+            'a [1]\nlast message repeated 1 times\n',
+            stream.getvalue().split('a\nTraceback')[0],
+        )
+        self.assertEqual(2, stream.getvalue().count('Traceback'))
+
+    def test_csh_collapse_repeats_with_incomparable_args(self):
+        class Incomparable(object):
+            def __eq__(self, other):
+                raise ValueError('ambiguous comparison')
+
+            def __str__(self):
+                return 'incomparable'
+
+        stream = StringIO()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            collapse_repeats=True,
+        )
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        logger.info('a %s', Incomparable())
+        logger.info('a %s', Incomparable())
+
+        self.assertEqual('a incomparable\n' * 2, stream.getvalue())
+        self.assertEqual(0, handler.repeated_records)
+
+    def test_csh_collapse_repeats_handles_errors(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            collapse_repeats=True,
+        )
+        handler.format = MagicMock(side_effect=['a', ValueError])
+        handler.handleError = MagicMock()
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        logger.info('a')
+        logger.info('a')
+        handler.close()
+
+        self.assertEqual('a\n', stream.getvalue())
+        handler.handleError.assert_called_once()
+        self.assertEqual(
+            'last message repeated 1 times',
+            handler.handleError.call_args[0][0].getMessage(),
+        )
+
+    def test_csh_emit_collapse_repeats(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            collapse_repeats=True,
+        )
+        record = logging.makeLogRecord({'msg': 'a'})
+        handler.emit(record)
+        handler.emit(record)
+        handler.close()
+
+        self.assertEqual(
+            'a\nlast message repeated 1 times\n',
+            stream.getvalue(),
+        )
+
+    def test_csh_collapse_repeats_window(self):
+        written = Event()
+        stream = MagicMock()
+        stream.isatty = lambda: False
+        stream.write.side_effect = (
+            lambda data: 'repeated' in data and written.set()
+        )
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            collapse_repeats=True,
+            collapse_window=0.01,
+        )
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+
+        logger.info('hello')
+        logger.info('hello')
+        logger.info('hello')
+        self.assertTrue(written.wait(5))
+        self.assertEqual(
+            [
+                (('hello\n',),),
+                (('last message repeated 2 times\n',),),
+            ],
+            stream.write.call_args_list,
+        )
+
+        # The run goes on.
+        logger.info('hello')
+        handler.close()
+        self.assertEqual(
+            (('last message repeated 1 times\n',),),
+            stream.write.call_args,
+        )
+
+    def test_csh_collapse_repeats_colorized(self):
+        stream = MagicMock()
+        stream.isatty = lambda: True
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            colorizer=GenericColorizer(color_map={
+                'warning': ('<w>', '</w>'),
+                'important': ('*', '*'),
+            }),
+            collapse_repeats=True,
+        )
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        logger.warning('a')
+        logger.warning('a')
+        handler.close()
+
+        stream.write.assert_called_with(
+            '<w>last message repeated </w><w>*1*</w><w> times</w>\n',
+        )
+
+    def test_csh_stats_disabled(self):
+        handler = ColorizingStreamHandler(stream=StringIO())
+
+        self.assertIsNone(handler.stats())
+        self.assertIsNone(handler.formatter.stats())
+
+    def test_csh_stats(self):
+        stream = MagicMock()
+        stream.isatty = lambda: True
+        colorizer = GenericColorizer(color_map={'bracket': ('[', ']')})
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            colorizer=colorizer,
+            highlighter=GenericColorizer(color_map={'a': ('<', '>')}),
+            collect_stats=True,
+        )
+        logger = logging.Logger('test')
+        logger.addHandler(handler)
+        logger.info('%s', Mark('a', 'bracket'))
+        logger.info(u'\xe9')
+        logger.error('b')
+        stats = handler.stats()
+
+        self.assertEqual({'INFO': 2, 'ERROR': 1}, stats['records'])
+        self.assertEqual(9, stats['bytes_written'])
+        self.assertEqual(
+            ['colorize', 'format', 'write'],
+            list(stats['phases']),
+        )
+
+        for phase in stats['phases'].values():
+            self.assertEqual(3, phase['count'])
+
+        self.assertEqual(
+            ['colorizer', 'highlighter'],
+            list(stats['color_pair_cache']),
+        )
+        self.assertEqual(
+            colorizer.cache_hits + colorizer.cache_misses,
+            stats['color_pair_cache']['colorizer']['hits'] +
+            stats['color_pair_cache']['colorizer']['misses'],
+        )
+
+    def test_csh_stats_with_standard_formatter(self):
+        handler = ColorizingStreamHandler(
+            stream=StringIO(),
+            collect_stats=True,
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.handle(logging.makeLogRecord({'msg': 'a'}))
+
+        self.assertEqual(['write'], list(handler.stats()['phases']))
+
+    def test_csh_emit_stats(self):
+        handler = ColorizingStreamHandler(
+            stream=StringIO(),
+            collect_stats=True,
+        )
+        handler.emit(logging.makeLogRecord({
+            'msg': 'a',
+            'levelno': logging.INFO,
+            'levelname': 'INFO',
+        }))
+        stats = handler.stats()
+
+        self.assertEqual({'INFO': 1}, stats['records'])
+        self.assertEqual(2, stats['bytes_written'])
+        self.assertEqual(1, stats['phases']['write']['count'])
+
+    def test_csh_stats_callback(self):
+        snapshots = []
+        handler = ColorizingStreamHandler(
+            stream=StringIO(),
+            stats_callback=snapshots.append,
+        )
+        handler.handle(logging.makeLogRecord({
+            'msg': 'a',
+            'levelname': 'INFO',
+        }))
+        handler.close()
+
+        self.assertEqual(1, len(snapshots))
+        self.assertEqual({'INFO': 1}, snapshots[0]['records'])
+
+    def test_csh_stats_callback_interval(self):
+        called = Event()
+        handler = ColorizingStreamHandler(
+            stream=StringIO(),
+            stats_callback=lambda stats: called.set(),
+            stats_interval=0.01,
+        )
+
+        self.assertTrue(called.wait(5))
+        handler.close()
+
+    def test_colorizing_formatter_stats(self):
+        formatter = ColorizingFormatter(fmt='%(message)s', collect_stats=True)
+        record = logging.makeLogRecord({'msg': 'a %s', 'args': (1,)})
+        formatter.format(record)
+        formatter.format_colorized(
+            record,
+            colorizer=GenericColorizer(color_map={'a': ('<', '>')}),
+        )
+        stats = formatter.stats()
+
+        self.assertEqual(1, stats['colorize']['count'])
+        self.assertEqual(2, stats['format']['count'])
+
+    def test_colorizing_formatter_stats_disabled(self):
+        formatter = ColorizingFormatter(fmt='%(message)s')
+        formatter.close()
+
+        self.assertIsNone(formatter.stats())
+
+    def test_colorizing_formatter_stats_callback(self):
+        snapshots = []
+        formatter = ColorizingFormatter(
+            fmt='%(message)s',
+            stats_callback=snapshots.append,
+        )
+        formatter.format(logging.makeLogRecord({'msg': 'a'}))
+        formatter.close()
+        formatter.close()
+
+        self.assertEqual(1, len(snapshots))
+        self.assertEqual(1, snapshots[0]['format']['count'])
+
+    def test_csh_format_batch(self):
+        stream = MagicMock()
+        stream.isatty = lambda: True
+        colorizer = GenericColorizer(color_map={
+            'bracket': ('[', ']'),
+            'debug': ('<', '>'),
+        })
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            colorizer=colorizer,
+        )
+        handler.setFormatter(
+            ColorizingFormatter(fmt='%(levelname)s:%(message)s'),
+        )
+        records = [
+            LogRecord(
+                name='my_record',
+                level=DEBUG,
+                pathname='my_path',
+                lineno=42,
+                msg='%s + %s gives %s',
+                args=(4, 5, Mark(index, 'bracket')),
+                exc_info=None,
+            )
+            for index in range(3)
+        ]
+
+        self.assertEqual(
+            ''.join(
+                handler.format(record) + '\n' for record in records
+            ),
+            handler.format_batch(records),
+        )
+        self.assertEqual(
+            '<DEBUG>:<4 + 5 gives ><[0]><>\n',
+            handler.format_batch(records[:1]),
+        )
+        self.assertEqual('', handler.format_batch([]))
+
+    def test_csh_format_batch_without_color(self):
+        handler = ColorizingStreamHandler(stream=StringIO())
+        handler.setFormatter(ColorizingFormatter(fmt='%(name)s:%(message)s'))
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='%s',
+            args=(Mark(1, 'bracket'),),
+            exc_info=None,
+        )
+
+        self.assertEqual(
+            'my_record:1\nmy_record:1\n',
+            handler.format_batch([record, record]),
+        )
+
+    def test_csh_format_batch_with_standard_formatter(self):
+        handler = ColorizingStreamHandler(stream=StringIO())
+        handler.setFormatter(logging.Formatter(fmt='%(name)s:%(message)s'))
+        record = LogRecord(
+            name='my_record',
+            level=DEBUG,
+            pathname='my_path',
+            lineno=42,
+            msg='hello',
+            args=(),
+            exc_info=None,
+        )
+
+        self.assertEqual('my_record:hello\n', handler.format_batch([record]))
+
+    def test_csh_format_batch_with_bad_record(self):
+        handler = ColorizingStreamHandler(stream=StringIO())
+        handler.setFormatter(ColorizingFormatter(fmt='%(message)s'))
+        handler.handleError = MagicMock()
+        good = logging.makeLogRecord({'msg': 'good'})
+        bad = logging.makeLogRecord({'msg': 'bad %d', 'args': ('x',)})
+
+        self.assertEqual(
+            'good\ngood\n',
+            handler.format_batch([good, bad, good]),
+        )
+        handler.handleError.assert_called_once_with(bad)
+
+    def test_csh_format_batch_with_recursion_error(self):
+        handler = ColorizingStreamHandler(stream=StringIO())
+        formatter = logging.Formatter()
+        formatter.format = MagicMock(side_effect=RecursionError)
+        handler.setFormatter(formatter)
+        handler.handleError = MagicMock()
+
+        with self.assertRaises(RecursionError):
+            handler.format_batch([logging.makeLogRecord({'msg': 'a'})])
+
+        self.assertFalse(handler.handleError.called)
+
     def test_basic_config_add_a_stream_handler(self):
         logger = logging.Logger('test')
 
@@ -353,5 +1378,8 @@ class LogTests(TestCase):
         logger = logging.Logger('test')
 
         with patch('logging.getLogger', new=lambda: logger):
-            basicConfig(format='my format')
-            self.assertEqual('my format', logger.handlers[0].formatter._fmt)
+            basicConfig(format='my format: %(message)s')
+            self.assertEqual(
+                'my format: %(message)s',
+                logger.handlers[0].formatter._fmt,
+            )
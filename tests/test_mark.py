@@ -3,12 +3,12 @@ Test object marking.
 """
 
 from unittest import TestCase
-from six import (
-    PY2,
-    PY3,
-)
 
 from chromalog.mark import Mark
+from chromalog.mark.objects import (
+    ColorTag,
+    make_color_tag,
+)
 
 from .common import (
     repeat_for_values,
@@ -19,11 +19,6 @@ from .common import (
 class MarkTests(TestCase):
     @repeat_for_values()
     def test_string_rendering_of_marked(self, _, value):
-        # Python2 non-unicode string want to use the 'ascii' encoding for this
-        # conversion, which cannot work.
-        if PY2 and isinstance(value, unicode):
-            return
-
         self.assertEqual('{0}'.format(value), '{0}'.format(Mark(value, 'a')))
 
     @repeat_for_values()
@@ -34,15 +29,6 @@ class MarkTests(TestCase):
     def test_int_rendering_of_marked(self, _, value):
         self.assertEqual('%d' % value, '%d' % Mark(value, 'a'))
 
-    @repeat_for_integral_values()
-    def test_hexadecimal_int_rendering_of_marked(self, _, value):
-        # Apparently in Python 3, %x expects a real integer. If you know how to
-        # make it work with a Marked integer, please let me know !
-        if PY3:
-            return
-
-        self.assertEqual('%x' % value, '%x' % Mark(value, 'a'))
-
     @repeat_for_integral_values()
     def test_float_rendering_of_marked(self, _, value):
         self.assertEqual('%f' % value, '%f' % Mark(value, 'a'))
@@ -76,6 +62,57 @@ class MarkTests(TestCase):
         self.assertEqual(['a', 'b', 'c', 'd'], obj.color_tag)
         self.assertEqual(value, obj.obj)
 
+    def test_marked_objects_nesting_does_not_modify_color_tags(self):
+        color_tag = ['a', 'b']
+        inner = Mark(42, ['c'])
+        obj = Mark(inner, color_tag)
+        self.assertEqual(['a', 'b', 'c'], obj.color_tag)
+        self.assertEqual(['a', 'b'], color_tag)
+        self.assertEqual(['c'], inner.color_tag)
+
+    def test_marked_objects_color_tags_are_interned(self):
+        self.assertIs(
+            Mark(1, ['a', 'b']).color_tag,
+            Mark(2, ('a', 'b')).color_tag,
+        )
+        self.assertIs(Mark(1, 'a').color_tag, Mark(2, ['a']).color_tag)
+        self.assertIs(
+            Mark(Mark(1, 'b'), 'a').color_tag,
+            Mark(2, ['a', 'b']).color_tag,
+        )
+
+    def test_marked_objects_have_no_dict(self):
+        self.assertFalse(hasattr(Mark(42, 'a'), '__dict__'))
+
+    def test_marked_objects_with_no_color_tag(self):
+        self.assertEqual([], Mark(42, None).color_tag)
+        self.assertFalse(Mark(42, None).color_tag)
+
+    def test_color_tag_comparison(self):
+        self.assertEqual(['a'], ColorTag(['a']))
+        self.assertEqual(('a',), ColorTag(['a']))
+        self.assertNotEqual(['b'], ColorTag(['a']))
+        self.assertFalse(ColorTag(['a']) != ['a'])
+        self.assertEqual(hash(('a',)), hash(ColorTag(['a'])))
+        self.assertEqual("['a']", repr(ColorTag(['a'])))
+
+    def test_color_tag_concatenation(self):
+        color_tag = Mark(42, 'a').color_tag
+        self.assertEqual(['a', 'b'], color_tag + ['b'])
+        self.assertIsInstance(color_tag + ['b'], list)
+        self.assertEqual(['b', 'a'], ['b'] + color_tag)
+        self.assertIsInstance(['b'] + color_tag, list)
+        self.assertEqual(('a', 'b'), color_tag + ('b',))
+        self.assertEqual(('b', 'a'), ('b',) + color_tag)
+
+        with self.assertRaises(TypeError):
+            color_tag + 'b'
+
+    def test_make_color_tag_with_non_string_tags(self):
+        self.assertEqual([1, 2], make_color_tag([1, 2]))
+        color_tag = make_color_tag('a')
+        self.assertIs(color_tag, make_color_tag(color_tag))
+
     @repeat_for_values({
         'simple_name': 'alpha',
         'underscore_name': 'alpha_beta',
@@ -97,10 +134,3 @@ class MarkTests(TestCase):
         self.assertEqual([false_color_tag], helper(42, False).color_tag)
         self.assertEqual([true_color_tag], helper(True).color_tag)
         self.assertEqual([false_color_tag], helper(False).color_tag)
-
-    def test_explicit_unicode_in_python3(self):
-        if PY3:
-            self.assertEqual(
-                u'test',
-                Mark(u'test', 'foo').__unicode__(),
-            )
@@ -0,0 +1,267 @@
+"""
+Test multi-process log aggregation.
+"""
+import logging
+import multiprocessing
+import sys
+
+from multiprocessing.connection import (
+    AuthenticationError,
+    Client,
+)
+from unittest import TestCase
+
+from unittest.mock import (
+    MagicMock,
+    patch,
+)
+from io import StringIO
+
+from chromalog.colorizer import GenericColorizer
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+from chromalog.mark import Mark
+from chromalog.multiprocess import (
+    ColorizingProcessHandler,
+    ColorizingProcessListener,
+    RenderedArgument,
+    decode_argument,
+    decode_record,
+    encode_argument,
+    encode_record,
+)
+
+from .common import (
+    ColorStream,
+    make_record,
+)
+
+
+def make_listener(stream):
+    listener = ColorizingProcessListener(
+        stream=stream,
+        colorizer=GenericColorizer(color_map={
+            'bracket': ('[', ']'),
+        }),
+    )
+    listener.handler.setFormatter(
+        ColorizingFormatter(fmt='%(name)s:%(message)s'),
+    )
+
+    return listener
+
+
+def log_from_worker(address, count):
+    logger = logging.Logger('worker')
+    handler = ColorizingProcessHandler(address)
+    logger.addHandler(handler)
+
+    for index in range(count):
+        logger.info('%s is %s', index, Mark('done', 'bracket'))
+
+    handler.close()
+
+
+class EncodingTests(TestCase):
+    def test_encode_argument(self):
+        self.assertEqual(((), 'a'), encode_argument('a'))
+        self.assertEqual(((), None), encode_argument(None))
+        self.assertEqual((('b',), 1.5), encode_argument(Mark(1.5, 'b')))
+
+    def test_encode_argument_renders_other_values(self):
+        self.assertEqual(
+            (('b',), '{}', '{}'),
+            encode_argument(Mark({}, 'b')),
+        )
+
+    def test_decode_argument(self):
+        self.assertEqual('a', decode_argument(((), 'a')))
+        self.assertEqual(Mark('a', 'b'), decode_argument((('b',), 'a')))
+
+    def test_decode_rendered_argument(self):
+        arg = decode_argument(encode_argument(Mark(object, 'b')))
+
+        self.assertEqual(['b'], arg.color_tag)
+        self.assertIsInstance(arg.obj, RenderedArgument)
+        self.assertEqual(str(object), str(arg.obj))
+        self.assertEqual(repr(object), repr(arg.obj))
+        self.assertEqual(str(object), '{0}'.format(arg.obj))
+
+    def test_record_round_trip(self):
+        record = make_record()
+        record.custom = object()
+        copy = decode_record(encode_record(record))
+
+        self.assertEqual(record.getMessage(), copy.getMessage())
+        self.assertEqual((4, 5, Mark(9, 'bracket')), copy.args)
+        self.assertEqual('my_record', copy.name)
+        self.assertEqual(str(record.custom), copy.custom)
+
+        # The original record is untouched.
+        self.assertEqual((4, 5, Mark(9, 'bracket')), record.args)
+
+    def test_record_round_trip_with_mapping_args(self):
+        record = make_record(
+            msg='%(a)s',
+            args=({'a': Mark('x', 'bracket')},),
+        )
+        copy = decode_record(encode_record(record))
+
+        self.assertEqual({'a': Mark('x', 'bracket')}, copy.args)
+
+    def test_record_round_trip_without_args(self):
+        copy = decode_record(encode_record(make_record(msg='hi', args=())))
+
+        self.assertEqual((), copy.args)
+        self.assertEqual('hi', copy.getMessage())
+
+    def test_record_round_trip_renders_traceback(self):
+        record = make_record()
+
+        try:
+            raise RuntimeError('boom')
+        except RuntimeError:
+            record.exc_info = sys.exc_info()
+
+        copy = decode_record(encode_record(record))
+
+        self.assertIsNone(copy.exc_info)
+        self.assertIn('RuntimeError: boom', copy.exc_text)
+
+
+class ProcessListenerTests(TestCase):
+    def test_process_listener_creates_a_colorizing_stream_handler(self):
+        stream = StringIO()
+        listener = ColorizingProcessListener(stream=stream)
+
+        self.assertIsInstance(listener.handler, ColorizingStreamHandler)
+        self.assertIs(stream, listener.handler.stream)
+        self.assertEqual((listener.handler,), listener.handlers)
+
+    def test_process_listener_with_handlers_rejects_handler_arguments(self):
+        with self.assertRaises(TypeError):
+            ColorizingProcessListener(MagicMock(), stream=StringIO())
+
+    def test_process_listener_stop_when_not_started(self):
+        ColorizingProcessListener().stop()
+
+    def test_process_listener_respects_handler_level(self):
+        handler = MagicMock(level=logging.INFO)
+        listener = ColorizingProcessListener(
+            handler,
+            respect_handler_level=True,
+        )
+        listener.handle(make_record())
+
+        self.assertEqual([], handler.handle.mock_calls)
+
+    def test_process_handler_in_the_same_process(self):
+        stream = ColorStream()
+        listener = make_listener(stream)
+        listener.start()
+        handler = ColorizingProcessHandler(listener.address)
+
+        for _ in range(100):
+            handler.handle(make_record())
+
+        handler.close()
+        listener.stop()
+
+        self.assertEqual(
+            'my_record:4 + 5 gives [9]\n' * 100,
+            stream.getvalue(),
+        )
+        self.assertIsNone(listener.address)
+
+        # Stopping twice is harmless.
+        listener.stop()
+
+    def test_process_listener_ignores_failed_connections(self):
+        stream = ColorStream()
+        listener = make_listener(stream)
+        listener.start()
+
+        with self.assertRaises(AuthenticationError):
+            Client(listener.address, authkey=b'wrong key')
+
+        handler = ColorizingProcessHandler(listener.address)
+        handler.handle(make_record())
+        handler.close()
+        listener.stop()
+
+        self.assertEqual('my_record:4 + 5 gives [9]\n', stream.getvalue())
+
+    def test_process_listener_stops_accepting_on_errors(self):
+        listener = ColorizingProcessListener(MagicMock())
+
+        def accept():
+            # The listener is closed while stopping.
+            listener._stopping = True
+
+            raise OSError
+
+        listener._listener = MagicMock()
+        listener._listener.accept.side_effect = accept
+        listener._accept()
+
+        self.assertEqual([], listener._connections)
+
+    def test_process_listener_wakes_stopped_accept_thread(self):
+        listener = ColorizingProcessListener(MagicMock())
+
+        with patch(
+            'chromalog.multiprocess.Client',
+            side_effect=ConnectionRefusedError,
+        ):
+            listener._wake_accept_thread()
+
+    def test_process_handler_reports_connection_errors(self):
+        handler = ColorizingProcessHandler(address=('127.0.0.1', 1))
+        handler.handleError = MagicMock()
+        record = make_record()
+        handler.handle(record)
+
+        handler.handleError.assert_called_once_with(record)
+
+    def test_process_handler_reconnects_in_child_processes(self):
+        handler = ColorizingProcessHandler(address=('127.0.0.1', 1))
+        inherited = MagicMock()
+        handler._connection = inherited
+        handler._pid = -1
+
+        with patch('chromalog.multiprocess.Client') as client:
+            self.assertIs(client.return_value, handler._get_connection())
+
+        inherited.close.assert_called_once_with()
+
+    def test_process_handler_in_worker_processes(self):
+        stream = ColorStream()
+        listener = make_listener(stream)
+        listener.start()
+        workers = [
+            multiprocessing.Process(
+                target=log_from_worker,
+                args=(listener.address, 50),
+            )
+            for _ in range(3)
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        listener.stop()
+        lines = stream.getvalue().splitlines()
+
+        self.assertEqual(
+            sorted(
+                'worker:{0} is [done]'.format(index)
+                for index in range(50)
+                for _ in range(3)
+            ),
+            sorted(lines),
+        )
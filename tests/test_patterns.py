@@ -0,0 +1,246 @@
+"""
+Test pattern highlighting.
+"""
+import logging
+import operator
+
+from unittest import TestCase
+
+from io import StringIO
+
+from chromalog.colorizer import GenericColorizer
+from chromalog.log import (
+    ColorizingFormatter,
+    ColorizingStreamHandler,
+)
+from chromalog.mark import Mark
+from chromalog.patterns import (
+    PatternHighlighter,
+    _HighlightedArgument,
+    keyword_pattern,
+)
+
+from .common import ColorStream
+
+COLORIZER = GenericColorizer(color_map={
+    'string': ('<s>', '</s>'),
+    'uuid': ('<u>', '</u>'),
+    'ip': ('<i>', '</i>'),
+    'duration': ('<d>', '</d>'),
+    'number': ('<n>', '</n>'),
+    'keyword': ('<k>', '</k>'),
+    'info': ('{', '}'),
+})
+
+
+class KeywordPatternTests(TestCase):
+    def test_keyword_pattern(self):
+        self.assertEqual('', keyword_pattern([]))
+        self.assertEqual('abc', keyword_pattern(['abc']))
+        self.assertEqual('a(?:b|c)', keyword_pattern(['ab', 'ac']))
+        self.assertEqual('a(?:b)?', keyword_pattern(['a', 'ab']))
+        self.assertEqual('a\\.b', keyword_pattern(['a.b']))
+
+
+class PatternHighlighterTests(TestCase):
+    def test_highlight_default_patterns(self):
+        highlighter = PatternHighlighter()
+
+        self.assertEqual(
+            '<n>42</n> <n>-3.5</n> <n>0x1F</n> <n>1e-05</n> v1.2.3 abc12 '
+            '<d>150ms</d> <d>1h30m</d> <s>"a 1"</s> it\'s <s>\'b\'</s> '
+            '<i>10.0.0.1</i> <i>10.0.0.1:80</i> <i>::1</i> <i>fe80::1</i> '
+            '<u>6f1c3e2a-8d4b-4c2e-9f0a-1b2c3d4e5f60</u>',
+            highlighter.highlight(
+                '42 -3.5 0x1F 1e-05 v1.2.3 abc12 150ms 1h30m "a 1" it\'s '
+                '\'b\' 10.0.0.1 10.0.0.1:80 ::1 fe80::1 '
+                '6f1c3e2a-8d4b-4c2e-9f0a-1b2c3d4e5f60',
+                COLORIZER,
+            ),
+        )
+
+    def test_highlight_keywords(self):
+        highlighter = PatternHighlighter(
+            patterns=[],
+            keywords=['fail', 'failed', 'timeout'],
+        )
+
+        self.assertEqual(
+            '<k>failed</k> on <k>timeout</k>, not failure',
+            highlighter.highlight('failed on timeout, not failure', COLORIZER),
+        )
+
+    def test_highlight_many_keywords(self):
+        highlighter = PatternHighlighter(
+            patterns=[],
+            keywords=['word{0}'.format(index) for index in range(5000)],
+        )
+
+        self.assertEqual(
+            'a <k>word4999</k> and word5000',
+            highlighter.highlight('a word4999 and word5000', COLORIZER),
+        )
+
+    def test_highlight_with_context(self):
+        highlighter = PatternHighlighter()
+
+        self.assertEqual(
+            'a }{<n>1</n>}{ b',
+            highlighter.highlight('a 1 b', COLORIZER, 'info'),
+        )
+
+    def test_highlight_with_list_context_color_tag(self):
+        highlighter = PatternHighlighter()
+
+        self.assertEqual(
+            'a }{<n>1</n>}{ b',
+            highlighter.highlight('a 1 b', COLORIZER, ['info']),
+        )
+        self.assertEqual({}, highlighter._replacers)
+
+    def test_highlight_patterns_without_first_chars(self):
+        highlighter = PatternHighlighter(patterns=[('number', r'\d+')])
+        record = logging.makeLogRecord({'msg': '1 %s', 'args': ('2',)})
+        msg, args = highlighter.highlight_record(record, COLORIZER)
+
+        self.assertEqual('<n>1</n> <n>2</n>', msg % args)
+
+    def test_highlight_after_color_map_change(self):
+        highlighter = PatternHighlighter()
+        colorizer = GenericColorizer(color_map={'number': ('<', '>')})
+
+        self.assertEqual('<1>', highlighter.highlight('1', colorizer))
+        self.assertEqual(
+            '<1>',
+            highlighter.highlight('1', colorizer.batch()),
+        )
+
+        colorizer.color_map = {'number': ('[', ']')}
+
+        self.assertEqual('[1]', highlighter.highlight('1', colorizer))
+        self.assertEqual(1, len(highlighter._replacers))
+
+    def test_highlight_without_colors(self):
+        highlighter = PatternHighlighter()
+        colorizer = GenericColorizer(color_map={'other': ('<', '>')})
+
+        self.assertEqual('a 1 b', highlighter.highlight('a 1 b', colorizer))
+        self.assertIsNone(highlighter._get_replacer(colorizer, None))
+
+    def test_highlight_record(self):
+        highlighter = PatternHighlighter()
+        record = logging.makeLogRecord({
+            'msg': '%5d%% of %s from %s, %r: 7',
+            'args': (42, 'host 10.0.0.1', Mark('1.2.3.4', 'other'), '2'),
+        })
+        msg, args = highlighter.highlight_record(record, COLORIZER)
+
+        self.assertEqual(
+            '   42% of host <i>10.0.0.1</i> from 1.2.3.4, \'2\': <n>7</n>',
+            msg % args,
+        )
+        self.assertEqual('%5d%% of %s from %s, %r: 7', record.msg)
+
+    def test_highlight_record_without_args(self):
+        highlighter = PatternHighlighter()
+        record = logging.makeLogRecord({'msg': 'a 1'})
+
+        self.assertEqual(
+            ('a <n>1</n>', ()),
+            highlighter.highlight_record(record, COLORIZER),
+        )
+
+    def test_highlight_record_without_colors(self):
+        highlighter = PatternHighlighter()
+        colorizer = GenericColorizer(color_map={'other': ('<', '>')})
+        record = logging.makeLogRecord({'msg': '1 %s', 'args': ('2',)})
+
+        self.assertEqual(
+            ('1 %s', ('2',)),
+            highlighter.highlight_record(record, colorizer),
+        )
+
+    def test_highlight_record_with_other_args(self):
+        highlighter = PatternHighlighter()
+        args = (None, [1], True)
+        record = logging.makeLogRecord({'msg': '%s %s %s', 'args': args})
+        msg, highlighted_args = highlighter.highlight_record(
+            record,
+            COLORIZER,
+        )
+
+        self.assertEqual(args, highlighted_args)
+        self.assertEqual('None [1] True', msg % highlighted_args)
+
+    def test_highlight_record_with_dict_args(self):
+        highlighter = PatternHighlighter()
+        record = logging.makeLogRecord({
+            'msg': '%(a)s and %(b).1f',
+            'args': {'a': 5, 'b': 2},
+        })
+        msg, args = highlighter.highlight_record(record, COLORIZER)
+
+        self.assertEqual('<n>5</n> and 2.0', msg % args)
+
+    def test_highlight_record_escapes_color_sequences(self):
+        highlighter = PatternHighlighter()
+        colorizer = GenericColorizer(color_map={'number': ('%', '%')})
+        record = logging.makeLogRecord({'msg': '1 %s', 'args': ('a',)})
+        msg, args = highlighter.highlight_record(record, colorizer)
+
+        self.assertEqual('%1% a', msg % args)
+
+    def test_highlight_record_without_string_message(self):
+        highlighter = PatternHighlighter()
+        record = logging.makeLogRecord({'msg': 42})
+
+        self.assertEqual(
+            (42, ()),
+            highlighter.highlight_record(record, COLORIZER),
+        )
+
+
+class HighlightedArgumentTests(TestCase):
+    def test_highlighted_argument(self):
+        arg = _HighlightedArgument(42, '<n>42</n>')
+
+        self.assertEqual('<n>42</n>', str(arg))
+        self.assertEqual('42', repr(arg))
+        self.assertEqual('042', format(arg, '03d'))
+        self.assertEqual(42, int(arg))
+        self.assertEqual(42.0, float(arg))
+        self.assertEqual(42, operator.index(arg))
+        self.assertEqual('2a', '%x' % arg)
+
+
+class PatternHighlighterHandlerTests(TestCase):
+    def test_colorizing_stream_handler_with_patterns(self):
+        stream = ColorStream()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            colorizer=COLORIZER,
+            attributes_map={'name': 'important'},
+            patterns=PatternHighlighter(keywords=['failed']),
+        )
+        handler.setFormatter(ColorizingFormatter('%(message)s'))
+        logger = logging.Logger('app')
+        logger.addHandler(handler)
+        logger.info('request %s failed after %s', 'from 10.0.0.1', '5s')
+
+        self.assertEqual(
+            'request from <i>10.0.0.1</i> <k>failed</k> after <d>5s</d>\n',
+            stream.getvalue(),
+        )
+
+    def test_colorizing_stream_handler_without_color_support(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            patterns=PatternHighlighter(),
+        )
+        handler.setFormatter(ColorizingFormatter('%(message)s'))
+        logger = logging.Logger('app')
+        logger.addHandler(handler)
+        logger.info('request %s', 42)
+
+        self.assertEqual('request 42\n', stream.getvalue())
@@ -0,0 +1,427 @@
+"""
+Test the log recolorizer.
+"""
+import io
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+
+from unittest import TestCase
+
+from unittest.mock import patch
+
+from chromalog.__main__ import main
+from chromalog.colorizer import GenericColorizer
+from chromalog import recolor
+from chromalog.recolor import (
+    Recolorizer,
+    file_chunks,
+    recolor_file,
+    recolor_stream,
+    stream_chunks,
+)
+
+COLORIZER = GenericColorizer(color_map={
+    'debug': ('<d>', '</d>'),
+    'warning': ('<w>', '</w>'),
+    'error': ('<e>', '</e>'),
+    'important': ('[', ']'),
+    'number': ('{', '}'),
+    'path': ('(', ')'),
+})
+LINES = b''.join(
+    b'%s:app.%d:request %d done\n' % (level, index, index)
+    for index, level in enumerate([b'DEBUG', b'WARNING', b'INFO'] * 100)
+)
+
+
+def expected_line(level, index):
+    tag = {b'DEBUG': b'd', b'WARNING': b'w', b'INFO': None}[level]
+
+    if tag is None:
+        return b'INFO:app.%d:request %d done\n' % (index, index)
+
+    return b'<%s>%s</%s>:[app.%d]:request %d done\n' % (
+        tag,
+        level,
+        tag,
+        index,
+        index,
+    )
+
+
+EXPECTED = b''.join(
+    expected_line(level, index)
+    for index, level in enumerate([b'DEBUG', b'WARNING', b'INFO'] * 100)
+)
+
+
+class RecolorizerTests(TestCase):
+    def test_recolorizer_levels_and_names(self):
+        recolorizer = Recolorizer(COLORIZER)
+
+        self.assertEqual(
+            b'<e>ERROR</e>:[app.db]:failed\n'
+            b'<w>WARN</w>:[x]:y\n'
+            b'INFO:app:ignored\n'
+            b'an <e>ERROR</e> and a ERRORS\n',
+            recolorizer.recolor(
+                b'ERROR:app.db:failed\n'
+                b'WARN:x:y\n'
+                b'INFO:app:ignored\n'
+                b'an ERROR and a ERRORS\n',
+            ),
+        )
+
+    def test_recolorizer_matches_whole_level_names(self):
+        recolorizer = Recolorizer(COLORIZER)
+
+        self.assertEqual(
+            b'INFO:app:NOTANERROR happened in ERROR_CODE or DEBUGGER\n'
+            b'xERROR:app:y\n',
+            recolorizer.recolor(
+                b'INFO:app:NOTANERROR happened in ERROR_CODE or DEBUGGER\n'
+                b'xERROR:app:y\n',
+            ),
+        )
+
+    def test_recolorizer_name_pattern_with_groups(self):
+        recolorizer = Recolorizer(COLORIZER, name_pattern=r'(\w+)(\.\w+)?')
+
+        self.assertEqual(
+            b'<e>ERROR</e>:[app.db]:failed <e>ERROR</e>\n',
+            recolorizer.recolor(b'ERROR:app.db:failed ERROR\n'),
+        )
+
+    def test_recolorizer_without_names(self):
+        recolorizer = Recolorizer(COLORIZER, name_pattern=None)
+
+        self.assertEqual(
+            b'<e>ERROR</e>:app:failed\n',
+            recolorizer.recolor(b'ERROR:app:failed\n'),
+        )
+
+    def test_recolorizer_names_after_levels_without_stop_sequence(self):
+        recolorizer = Recolorizer(GenericColorizer(color_map={
+            'error': ('<e>', ''),
+            'important': ('[', ']'),
+        }))
+
+        self.assertEqual(
+            b'<e>ERROR:[app]:failed\n',
+            recolorizer.recolor(b'ERROR:app:failed\n'),
+        )
+
+    def test_recolorizer_patterns(self):
+        recolorizer = Recolorizer(
+            COLORIZER,
+            patterns=[
+                ('path', r'/[\w/.]+'),
+                ('number', br'\d+'),
+                ('unknown', r'request'),
+            ],
+        )
+
+        self.assertEqual(
+            b'<e>ERROR</e>:[app]:request {42} failed on (/a/b.c)\n',
+            recolorizer.recolor(b'ERROR:app:request 42 failed on /a/b.c\n'),
+        )
+
+    def test_recolorizer_escapes_templates(self):
+        recolorizer = Recolorizer(GenericColorizer(color_map={
+            'error': ('\\1', '\\g<0>'),
+        }))
+
+        self.assertEqual(b'\\1ERROR\\g<0>', recolorizer.recolor(b'ERROR'))
+
+    def test_recolorizer_without_colors(self):
+        recolorizer = Recolorizer(GenericColorizer(color_map={
+            'other': ('<', '>'),
+        }))
+
+        self.assertEqual([], recolorizer.substitutions)
+        self.assertEqual(b'ERROR:app:x', recolorizer.recolor(b'ERROR:app:x'))
+
+    def test_file_chunks(self):
+        self.assertEqual([], list(file_chunks(b'')))
+        self.assertEqual(
+            [(0, 3), (3, 5)],
+            list(file_chunks(b'ab\ncd', chunk_size=1)),
+        )
+        self.assertEqual(
+            [(0, 6)],
+            list(file_chunks(b'ab\ncd\n', chunk_size=6)),
+        )
+
+    def test_stream_chunks(self):
+        self.assertEqual(
+            [b'ab\n', b'cd\n', b'e'],
+            list(stream_chunks(io.BytesIO(b'ab\ncd\ne'), chunk_size=2)),
+        )
+
+
+class WorkerTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.log')
+
+        with open(self.path, 'wb') as log_file:
+            log_file.write(LINES)
+
+        recolor._init_worker(Recolorizer(COLORIZER))
+
+    def tearDown(self):
+        recolor._init_worker(None)
+
+        for data in recolor._MAPS.values():
+            data.close()
+
+        recolor._MAPS.clear()
+        shutil.rmtree(self.directory)
+
+    def test_recolor_chunk(self):
+        self.assertEqual(EXPECTED, recolor._recolor_chunk(LINES))
+
+    def test_recolor_file_chunk(self):
+        middle = len(b''.join(LINES.splitlines(True)[:100]))
+        expected_middle = len(b''.join(EXPECTED.splitlines(True)[:100]))
+
+        self.assertEqual(
+            EXPECTED[:expected_middle],
+            recolor._recolor_file_chunk((self.path, 0, middle)),
+        )
+        self.assertEqual(
+            EXPECTED[expected_middle:],
+            recolor._recolor_file_chunk((self.path, middle, len(LINES))),
+        )
+        self.assertEqual([self.path], list(recolor._MAPS))
+
+
+class RecolorFileTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.log')
+
+        with open(self.path, 'wb') as log_file:
+            log_file.write(LINES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_recolor_file(self):
+        output = io.BytesIO()
+        recolor_file(Recolorizer(COLORIZER), self.path, output, jobs=1)
+
+        self.assertEqual(EXPECTED, output.getvalue())
+
+    def test_recolor_file_in_parallel_keeps_order(self):
+        output = io.BytesIO()
+        recolor_file(
+            Recolorizer(COLORIZER),
+            self.path,
+            output,
+            jobs=3,
+            chunk_size=100,
+        )
+
+        self.assertEqual(EXPECTED, output.getvalue())
+
+    def test_recolor_file_without_cpu_count(self):
+        output = io.BytesIO()
+
+        with patch('os.cpu_count', return_value=None):
+            recolor_file(Recolorizer(COLORIZER), self.path, output)
+
+        self.assertEqual(EXPECTED, output.getvalue())
+
+    def test_recolor_empty_file(self):
+        open(self.path, 'wb').close()
+        output = io.BytesIO()
+        recolor_file(Recolorizer(COLORIZER), self.path, output)
+
+        self.assertEqual(b'', output.getvalue())
+
+    def test_recolor_stream(self):
+        output = io.BytesIO()
+        recolor_stream(
+            Recolorizer(COLORIZER),
+            io.BytesIO(LINES),
+            output,
+            jobs=1,
+            chunk_size=100,
+        )
+
+        self.assertEqual(EXPECTED, output.getvalue())
+
+    def test_recolor_stream_without_cpu_count(self):
+        output = io.BytesIO()
+
+        with patch('os.cpu_count', return_value=None):
+            recolor_stream(
+                Recolorizer(COLORIZER),
+                io.BytesIO(LINES),
+                output,
+                chunk_size=100,
+            )
+
+        self.assertEqual(EXPECTED, output.getvalue())
+
+    def test_recolor_stream_in_parallel_keeps_order(self):
+        output = io.BytesIO()
+        recolor_stream(
+            Recolorizer(COLORIZER),
+            io.BytesIO(LINES),
+            output,
+            jobs=2,
+            chunk_size=100,
+        )
+
+        self.assertEqual(EXPECTED, output.getvalue())
+
+
+class PoolTests(TestCase):
+    def test_recolor_in_pool_bounds_chunks_in_flight(self):
+        lines = LINES.splitlines(True)[:60]
+        read = []
+        in_flight = []
+
+        def chunks():
+            for line in lines:
+                read.append(line)
+                yield line
+
+        class SlowOutput(io.BytesIO):
+            def write(self, data):
+                # Give the pool the time to read ahead.
+                time.sleep(0.01)
+                in_flight.append(len(read) - len(in_flight))
+
+                return super(SlowOutput, self).write(data)
+
+        output = SlowOutput()
+        recolor._recolor_in_pool(
+            Recolorizer(COLORIZER),
+            recolor._recolor_chunk,
+            chunks(),
+            output,
+            2,
+        )
+
+        self.assertEqual(
+            b''.join(EXPECTED.splitlines(True)[:60]),
+            output.getvalue(),
+        )
+
+        # Two chunks per process, plus the one waiting for a slot.
+        self.assertLessEqual(max(in_flight), 5)
+
+    def test_recolor_in_pool_output_error(self):
+        class BrokenOutput(object):
+            def write(self, data):
+                raise BrokenPipeError
+
+        with self.assertRaises(BrokenPipeError):
+            recolor._recolor_in_pool(
+                Recolorizer(COLORIZER),
+                recolor._recolor_chunk,
+                iter(LINES.splitlines(True)),
+                BrokenOutput(),
+                2,
+            )
+
+
+class MainTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.log')
+
+        with open(self.path, 'wb') as log_file:
+            log_file.write(b'ERROR:app:request 42 failed\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_main(self, argv, stdin=b''):
+        stdout = io.TextIOWrapper(io.BytesIO())
+        stdin = io.TextIOWrapper(io.BytesIO(stdin))
+
+        with patch.object(sys, 'stdout', stdout):
+            with patch.object(sys, 'stdin', stdin):
+                self.assertEqual(0, main(argv))
+
+        return stdout.buffer.getvalue()
+
+    def test_main_recolor_file(self):
+        self.assertEqual(
+            b'\x1b[31mERROR\x1b[0m:\x1b[1mapp\x1b[0m:request '
+            b'\x1b[1m42\x1b[0m failed\n',
+            self.run_main([
+                'recolor',
+                '-p',
+                r'important=\d+',
+                '-j',
+                '1',
+                self.path,
+            ]),
+        )
+
+    def test_main_recolor_stdin(self):
+        self.assertEqual(
+            b'\x1b[31mERROR\x1b[0m:app:failed\n',
+            self.run_main(
+                ['recolor', '--no-names', '-j', '1', '-'],
+                stdin=b'ERROR:app:failed\n',
+            ),
+        )
+
+    def test_main_module(self):
+        argv = ['chromalog', 'recolor', self.path]
+        stdout = io.TextIOWrapper(io.BytesIO())
+
+        with patch.dict(sys.modules):
+            # Run the module as a script, not as the imported module.
+            del sys.modules['chromalog.__main__']
+
+            with patch.object(sys, 'argv', argv):
+                with patch.object(sys, 'stdout', stdout):
+                    with self.assertRaises(SystemExit) as context:
+                        runpy.run_module('chromalog', run_name='__main__')
+
+        self.assertEqual(0, context.exception.code)
+        self.assertIn(b'request', stdout.buffer.getvalue())
+
+    def test_main_recolor_invalid_pattern(self):
+        with patch.object(sys, 'stderr', io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(['recolor', '-p', 'no-tag'])
+
+    def test_main_recolor_invalid_numbers(self):
+        for option, value in [
+            ('-j', '0'),
+            ('-j', '-2'),
+            ('-j', 'many'),
+            ('--chunk-size', '0'),
+            ('--chunk-size', '-1'),
+        ]:
+            stderr = io.StringIO()
+
+            with patch.object(sys, 'stderr', stderr):
+                with self.assertRaises(SystemExit) as context:
+                    main(['recolor', option, value, self.path])
+
+            self.assertEqual(2, context.exception.code)
+            self.assertIn('Expected a positive integer', stderr.getvalue())
+
+    def test_main_recolor_broken_pipe(self):
+        stderr = io.StringIO()
+
+        with patch('chromalog.recolor.recolor_file') as recolor_file:
+            recolor_file.side_effect = BrokenPipeError
+
+            with patch.object(sys, 'stderr', stderr):
+                self.assertEqual(0, main(['recolor', self.path]))
+
+        self.assertTrue(stderr.closed)
@@ -0,0 +1,67 @@
+"""
+Test SGR escape sequences utilities.
+"""
+
+from unittest import TestCase
+
+from chromalog.colorizer import Colorizer
+from chromalog.sgr import (
+    optimize_color_pair,
+    optimize_sequences,
+)
+
+from .common import repeat_for_values
+
+
+class SGRTests(TestCase):
+    @repeat_for_values({
+        'plain_text': ('hello', 'hello'),
+        'single_sequence': ('\x1b[1mhello', '\x1b[1mhello'),
+        'merged_sequences': ('\x1b[1m\x1b[31mhello', '\x1b[1;31mhello'),
+        'repeated_resets': ('\x1b[0m\x1b[0m', '\x1b[0m'),
+        'empty_reset': ('\x1b[1m\x1b[m', '\x1b[0m'),
+        'leading_zeros': ('\x1b[01;031m', '\x1b[1;31m'),
+        'attributes_before_reset': ('\x1b[1;31m\x1b[0;2m', '\x1b[0;2m'),
+        'repeated_attributes': ('\x1b[1m\x1b[2m\x1b[1m', '\x1b[2;1m'),
+        'overridden_foreground': ('\x1b[31m\x1b[92m', '\x1b[92m'),
+        'overridden_background': ('\x1b[41m\x1b[1;49m', '\x1b[1;49m'),
+        'indexed_colors': (
+            '\x1b[38;5;12m\x1b[48;5;1m\x1b[38;2;1;2;3m',
+            '\x1b[48;5;1;38;2;1;2;3m',
+        ),
+        'truncated_extended_color': ('\x1b[38m\x1b[1m', '\x1b[38;1m'),
+        'separate_runs': (
+            '\x1b[0m\x1b[0m<\x1b[1m\x1b[1m>',
+            '\x1b[0m<\x1b[1m>',
+        ),
+    })
+    def test_optimize_sequences_with(self, _, value):
+        text, expected = value
+        self.assertEqual(expected, optimize_sequences(text))
+
+    def test_optimize_color_pair(self):
+        self.assertEqual(
+            ('\x1b[0;1m', '\x1b[0;2m'),
+            optimize_color_pair((
+                '\x1b[0m\x1b[0m\x1b[1m',
+                '\x1b[0m\x1b[0m\x1b[2m',
+            )),
+        )
+
+    def test_colorizer_optimizes_color_pairs(self):
+        colorizer = Colorizer()
+        self.assertEqual(
+            ('\x1b[0;2;36;1m', '\x1b[0;2;36m'),
+            colorizer.get_color_pair('important', context_color_tag='debug'),
+        )
+
+    def test_colorizer_without_color_pairs_optimization(self):
+        colorizer = Colorizer()
+        colorizer.optimize_color_pairs = False
+        self.assertEqual(
+            (
+                '\x1b[0m\x1b[2m\x1b[36m\x1b[1m',
+                '\x1b[0m\x1b[0m\x1b[2m\x1b[36m',
+            ),
+            colorizer.get_color_pair('important', context_color_tag='debug'),
+        )
@@ -0,0 +1,214 @@
+"""
+Test span formatting and rendering.
+"""
+import logging
+
+from unittest import TestCase
+
+from unittest.mock import (
+    MagicMock,
+    patch,
+)
+from io import StringIO
+
+from chromalog.colorizer import (
+    GenericColorizer,
+    MonochromaticColorizer,
+)
+from chromalog.log import ColorizingFormatter
+from chromalog.mark import Mark
+from chromalog.patterns import PatternHighlighter
+from chromalog.spans import (
+    FanOutHandler,
+    SpanColorizer,
+    SpanRenderer,
+)
+
+from .common import ColorStream
+
+COLORIZER = GenericColorizer(color_map={
+    'debug': ('<d>', '</d>'),
+    'important': ('<i>', '</i>'),
+    'number': ('<n>', '</n>'),
+})
+
+
+def make_logger(handler):
+    logger = logging.Logger('app')
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+
+    return logger
+
+
+class SpanColorizerTests(TestCase):
+    def test_split_nested_color_tags(self):
+        colorizer = SpanColorizer()
+        text = 'a {0} b'.format(colorizer.colorize(Mark(
+            'c {0} d'.format(colorizer.colorize(Mark('e', 'important'))),
+            'debug',
+        )))
+
+        self.assertEqual(
+            [
+                ('a ', None),
+                ('c ', ['debug']),
+                ('e', ['debug', 'important']),
+                (' d', ['debug']),
+                (' b', None),
+            ],
+            colorizer.split(text),
+        )
+
+    def test_split_plain_text(self):
+        colorizer = SpanColorizer()
+
+        self.assertEqual([('a', None)], colorizer.split('a'))
+        self.assertEqual([], colorizer.split(''))
+
+    def test_color_pairs_are_reused(self):
+        colorizer = SpanColorizer()
+
+        self.assertIs(
+            colorizer.get_color_pair('a'),
+            colorizer.get_color_pair(['a'], context_color_tag='b'),
+        )
+        self.assertEqual([('a',)], colorizer.color_tags)
+
+
+class SpanRendererTests(TestCase):
+    def test_render_with_colorizer(self):
+        spans = [
+            ('a', None),
+            ('b', ['debug']),
+            ('c', ['debug', 'important']),
+            ('d', ['unknown']),
+        ]
+
+        self.assertEqual(
+            'a<d>b</d><d><i>c</i></d>d',
+            SpanRenderer(COLORIZER).render(spans),
+        )
+
+    def test_render_with_monochromatic_colorizer(self):
+        spans = [('a', ['debug']), ('b', ['important'])]
+
+        self.assertEqual(
+            'a**b**',
+            SpanRenderer(MonochromaticColorizer()).render(spans),
+        )
+
+    def test_render_after_color_map_change(self):
+        colorizer = GenericColorizer(color_map={'debug': ('<', '>')})
+        renderer = SpanRenderer(colorizer)
+        spans = [('a', ['debug'])]
+
+        self.assertEqual('<a>', renderer.render(spans))
+
+        colorizer.color_map = {'debug': ('[', ']')}
+
+        self.assertEqual('[a]', renderer.render(spans))
+
+    def test_render_stripped(self):
+        self.assertEqual(
+            'ab',
+            SpanRenderer().render([('a', ['debug']), ('b', None)]),
+        )
+
+
+class FanOutHandlerTests(TestCase):
+    def test_fan_out_handler(self):
+        color_stream = ColorStream()
+        highlighted_stream = StringIO()
+        plain_stream = StringIO()
+        handler = FanOutHandler(
+            [
+                (color_stream, SpanRenderer(COLORIZER)),
+                (highlighted_stream, SpanRenderer(MonochromaticColorizer())),
+                (plain_stream, None),
+            ],
+            patterns=PatternHighlighter(),
+        )
+        handler.setFormatter(ColorizingFormatter(
+            '%(levelname)s:%(name)s:%(message)s',
+        ))
+        logger = make_logger(handler)
+        logger.debug('%s has %s', Mark('disk', 'important'), 'no space')
+        logger.debug('%s left', 3)
+
+        self.assertEqual(
+            '<d>DEBUG</d>:<i>app</i>:<d><i>disk</i></d><d> has no space</d>\n'
+            '<d>DEBUG</d>:<i>app</i>:<d><n>3</n></d><d> left</d>\n',
+            color_stream.getvalue(),
+        )
+        self.assertEqual(
+            'DEBUG:**app**:**disk** has no space\nDEBUG:**app**:3 left\n',
+            highlighted_stream.getvalue(),
+        )
+        self.assertEqual(
+            'DEBUG:app:disk has no space\nDEBUG:app:3 left\n',
+            plain_stream.getvalue(),
+        )
+
+    def test_fan_out_handler_formats_once(self):
+        streams = [ColorStream(), ColorStream()]
+        renderer = SpanRenderer(COLORIZER)
+        handler = FanOutHandler([(stream, renderer) for stream in streams])
+        handler.format_spans = MagicMock(return_value=[('a', ['debug'])])
+        renderer.render = MagicMock(wraps=renderer.render)
+        make_logger(handler).info('a')
+
+        handler.format_spans.assert_called_once()
+        renderer.render.assert_called_once()
+        self.assertEqual(['<d>a</d>\n'] * 2, [s.getvalue() for s in streams])
+
+    def test_fan_out_handler_default_renderers(self):
+        color_stream = ColorStream()
+        plain_stream = StringIO()
+        handler = FanOutHandler([(color_stream, None), (plain_stream, None)])
+        make_logger(handler).warning('a')
+
+        self.assertEqual('\x1b[33ma\x1b[0m\n', color_stream.getvalue())
+        self.assertEqual('a\n', plain_stream.getvalue())
+
+    def test_fan_out_handler_with_standard_formatter(self):
+        stream = StringIO()
+        handler = FanOutHandler([(stream, SpanRenderer(COLORIZER))])
+        handler.setFormatter(logging.Formatter('%(name)s:%(message)s'))
+        make_logger(handler).info('a %s', Mark('b', 'debug'))
+
+        self.assertEqual('app:a b\n', stream.getvalue())
+        self.assertEqual(
+            'app:a b',
+            handler.format(logging.makeLogRecord({
+                'name': 'app',
+                'msg': 'a b',
+            })),
+        )
+
+    def test_fan_out_handler_converts_ansi_sequences(self):
+        stream = StringIO()
+
+        with patch(
+            'chromalog.spans.stream_needs_ansi_conversion',
+            return_value=True,
+        ):
+            handler = FanOutHandler([(stream, SpanRenderer(COLORIZER))])
+
+        self.assertIsNot(stream, handler.outputs[0][0])
+
+    def test_fan_out_handler_write_error(self):
+        stream = MagicMock()
+        stream.write.side_effect = IOError
+        handler = FanOutHandler([(stream, SpanRenderer())])
+        handler.handleError = MagicMock()
+        record = logging.makeLogRecord({'msg': 'a'})
+        handler.handle(record)
+
+        handler.handleError.assert_called_once_with(record)
+
+    def test_fan_out_handler_flush(self):
+        stream = MagicMock()
+        FanOutHandler([(stream, SpanRenderer())]).flush()
+
+        stream.flush.assert_called_once_with()
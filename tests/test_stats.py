@@ -0,0 +1,141 @@
+"""
+Test handler and formatter statistics.
+"""
+import logging
+
+from threading import Event
+from unittest import TestCase
+
+from unittest.mock import (
+    MagicMock,
+    patch,
+)
+
+from chromalog.colorizer import GenericColorizer
+from chromalog.stats import (
+    FormatterStats,
+    HandlerStats,
+    Histogram,
+    StatsDumper,
+    cache_stats,
+)
+
+
+class HistogramTests(TestCase):
+    def test_empty_histogram(self):
+        self.assertEqual(
+            {
+                'count': 0,
+                'total_ns': 0,
+                'mean_ns': 0.0,
+                'p50_ns': 0,
+                'p99_ns': 0,
+                'max_ns': 0,
+                'buckets': {},
+            },
+            Histogram().snapshot(),
+        )
+
+    def test_histogram(self):
+        histogram = Histogram()
+
+        for duration in [0, 1, 3, 4] + [1000] * 96:
+            histogram.add(duration)
+
+        snapshot = histogram.snapshot()
+
+        self.assertEqual(100, snapshot['count'])
+        self.assertEqual(96008, snapshot['total_ns'])
+        self.assertEqual(960.08, snapshot['mean_ns'])
+        self.assertEqual(1000, snapshot['p50_ns'])
+        self.assertEqual(1000, snapshot['max_ns'])
+        self.assertEqual(4, histogram.percentile(3))
+        self.assertEqual(1, histogram.percentile(1))
+        self.assertEqual(
+            {1: 1, 2: 1, 4: 1, 8: 1, 1024: 96},
+            snapshot['buckets'],
+        )
+
+    def test_huge_durations(self):
+        histogram = Histogram()
+        histogram.add(1 << 70)
+
+        self.assertEqual(1 << 63, histogram.percentile(50))
+
+
+class FormatterStatsTests(TestCase):
+    def test_formatter_stats(self):
+        stats = FormatterStats()
+        stats.add(10, 20)
+        stats.add(30)
+        snapshot = stats.snapshot()
+
+        self.assertEqual(['colorize', 'format'], list(snapshot))
+        self.assertEqual(1, snapshot['colorize']['count'])
+        self.assertEqual(20, snapshot['colorize']['total_ns'])
+        self.assertEqual(2, snapshot['format']['count'])
+        self.assertEqual(40, snapshot['format']['total_ns'])
+
+
+class HandlerStatsTests(TestCase):
+    def test_handler_stats(self):
+        stats = HandlerStats()
+        stats.add_record(logging.makeLogRecord({'levelname': 'INFO'}))
+        stats.add_record(logging.makeLogRecord({'levelname': 'INFO'}))
+        stats.add_record(logging.makeLogRecord({'levelname': 'ERROR'}))
+        stats.add_write('abc\n', 100)
+        stats.add_write(u'\xe9\n', 200)
+        snapshot = stats.snapshot()
+
+        self.assertEqual({'INFO': 2, 'ERROR': 1}, snapshot['records'])
+        self.assertEqual(7, snapshot['bytes_written'])
+        self.assertEqual(['write'], list(snapshot['phases']))
+        self.assertEqual(300, snapshot['phases']['write']['total_ns'])
+
+
+class CacheStatsTests(TestCase):
+    def test_cache_stats(self):
+        colorizer = GenericColorizer(color_map={'a': ('<', '>')})
+
+        self.assertEqual(
+            {'hits': 0, 'misses': 0, 'hit_rate': 0.0},
+            cache_stats(colorizer),
+        )
+
+        colorizer.get_color_pair('a')
+        colorizer.get_color_pair('a')
+        colorizer.get_color_pair('a')
+        colorizer.get_color_pair('b')
+
+        self.assertEqual(
+            {'hits': 2, 'misses': 2, 'hit_rate': 0.5},
+            cache_stats(colorizer),
+        )
+
+    def test_cache_stats_without_cache(self):
+        self.assertIsNone(cache_stats(None))
+
+
+class StatsDumperTests(TestCase):
+    def test_stats_dumper(self):
+        called = Event()
+        func = MagicMock(side_effect=lambda: called.set())
+        dumper = StatsDumper(0.01, func)
+        dumper.start()
+
+        self.assertTrue(called.wait(5))
+
+        dumper.stop()
+        count = func.call_count
+        dumper.stop()
+
+        self.assertFalse(dumper.is_alive())
+        self.assertEqual(count + 1, func.call_count)
+
+    def test_stats_dumper_reports_errors(self):
+        dumper = StatsDumper(60, MagicMock(side_effect=ValueError))
+
+        with patch('traceback.print_exc') as print_exc:
+            dumper.stop()
+
+        print_exc.assert_called_once_with()
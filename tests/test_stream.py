@@ -4,9 +4,15 @@ Stream tests.
 
 from unittest import TestCase
 
-from mock import MagicMock
+from unittest.mock import (
+    MagicMock,
+    patch,
+)
 
-from chromalog.stream import stream_has_color_support
+from chromalog.stream import (
+    stream_has_color_support,
+    stream_needs_ansi_conversion,
+)
 
 
 class StreamTests(TestCase):
@@ -29,3 +35,11 @@ class StreamTests(TestCase):
         self.assertFalse(
             stream_has_color_support(simple_stream),
         )
+
+    def test_stream_needs_ansi_conversion_on_windows(self):
+        with patch('sys.platform', 'win32'):
+            self.assertTrue(stream_needs_ansi_conversion(MagicMock()))
+
+    def test_stream_does_not_need_ansi_conversion_elsewhere(self):
+        with patch('sys.platform', 'linux'):
+            self.assertFalse(stream_needs_ansi_conversion(MagicMock()))
@@ -0,0 +1,240 @@
+"""
+Test structured formatters.
+"""
+import json
+import logging
+import sys
+
+from unittest import TestCase
+from logging import DEBUG
+
+from io import StringIO
+
+from chromalog.colorizer import GenericColorizer
+from chromalog.log import ColorizingStreamHandler
+from chromalog.mark import Mark
+from chromalog.structured import (
+    StructuredFormatter,
+    logfmt_value,
+)
+
+from .common import (
+    ColorStream,
+    make_record,
+)
+
+
+class LogfmtValueTests(TestCase):
+    def test_logfmt_value_plain(self):
+        self.assertEqual('abc', logfmt_value('abc'))
+        self.assertEqual('4.5', logfmt_value(4.5))
+
+    def test_logfmt_value_quoted(self):
+        self.assertEqual('""', logfmt_value(''))
+        self.assertEqual('"a=b"', logfmt_value('a=b'))
+        self.assertEqual('"say \\"hi\\""', logfmt_value('say "hi"'))
+        self.assertEqual('"a\\\\b"', logfmt_value('a\\b'))
+        self.assertEqual('"a\\nb"', logfmt_value('a\nb'))
+        self.assertEqual(
+            u'"\u00e9t\u00e9 \u00e0"',
+            logfmt_value(u'\u00e9t\u00e9 \u00e0'),
+        )
+
+
+class StructuredFormatterTests(TestCase):
+    def test_structured_formatter_renders_json_without_colorizer(self):
+        formatter = StructuredFormatter(fields=[
+            ('level', 'levelname'),
+            ('msg', 'message'),
+        ])
+        record = make_record()
+        record.user = Mark('bob', 'bracket')
+        record.data = object()
+
+        self.assertEqual(
+            {
+                'level': 'DEBUG',
+                'msg': '4 + 5 gives 9',
+                'user': 'bob',
+                'data': str(record.data),
+            },
+            json.loads(formatter.format(record)),
+        )
+
+    def test_structured_formatter_default_fields(self):
+        formatter = StructuredFormatter(datefmt='%Y')
+        record = make_record()
+        result = json.loads(formatter.format(record))
+
+        self.assertEqual(
+            ['time', 'level', 'logger', 'msg'],
+            list(result),
+        )
+        self.assertEqual(formatter.formatTime(record, '%Y'), result['time'])
+        self.assertEqual('my_record', result['logger'])
+
+    def test_structured_formatter_without_extra(self):
+        formatter = StructuredFormatter(
+            fields=[('msg', 'message')],
+            extra=False,
+        )
+        record = make_record()
+        record.user = 'bob'
+
+        self.assertEqual(
+            '{"msg": "4 + 5 gives 9"}',
+            formatter.format(record),
+        )
+
+    def test_structured_formatter_renders_logfmt_with_colorizer(self):
+        colorizer = GenericColorizer(color_map={
+            'bracket': ('[', ']'),
+            'key': ('<', '>'),
+            'level': ('{', '}'),
+        })
+        formatter = StructuredFormatter(
+            fields=[
+                ('level', 'levelname'),
+                ('msg', 'message'),
+            ],
+            key_color_tag='key',
+        )
+        record = make_record()
+        record.user = Mark('bob smith', 'bracket')
+        record.count = 3
+
+        self.assertEqual(
+            '<level>={DEBUG} <msg>={"4 + 5 gives 9"} '
+            '<user>=["bob smith"] <count>=3',
+            formatter.format_colorized(
+                record,
+                colorizer=colorizer,
+                message_color_tag='level',
+                attributes={'levelname': Mark('DEBUG', 'level')},
+            ),
+        )
+
+        # The record is left untouched.
+        self.assertFalse(hasattr(record, 'message'))
+
+    def test_structured_formatter_caches_colorized_keys(self):
+        colorizer = GenericColorizer(color_map={'key': ('<', '>')})
+        formatter = StructuredFormatter(
+            fields=[('msg', 'message')],
+            key_color_tag='key',
+        )
+        formatter.format_colorized(make_record(), colorizer=colorizer)
+        formatter.format_colorized(make_record(), colorizer=colorizer)
+
+        self.assertEqual(
+            {(colorizer, 'msg'): (colorizer.cache_generation, '<msg>=')},
+            formatter._colorized_keys,
+        )
+
+    def test_structured_formatter_colorized_keys_follow_color_map(self):
+        color_map = {'key': ('<', '>')}
+        colorizer = GenericColorizer(color_map=color_map)
+        formatter = StructuredFormatter(
+            fields=[('msg', 'message')],
+            key_color_tag='key',
+        )
+        record = make_record()
+        self.assertEqual(
+            '<msg>="4 + 5 gives 9"',
+            formatter.format_colorized(record, colorizer=colorizer),
+        )
+
+        color_map['key'] = ('[', ']')
+        colorizer.clear_cache()
+        self.assertEqual(
+            '[msg]="4 + 5 gives 9"',
+            formatter.format_colorized(record, colorizer=colorizer),
+        )
+
+        colorizer.color_map = {'key': ('{', '}')}
+        self.assertEqual(
+            '{msg}="4 + 5 gives 9"',
+            formatter.format_colorized(record, colorizer=colorizer),
+        )
+
+    def test_structured_formatter_prefixes_clashing_extra(self):
+        formatter = StructuredFormatter(fields=[
+            ('level', 'levelname'),
+            ('msg', 'message'),
+        ])
+        record = make_record()
+        record.level = 'high'
+        record.user = 'bob'
+
+        self.assertEqual(
+            '{"level": "DEBUG", "msg": "4 + 5 gives 9", '
+            '"extra.level": "high", "user": "bob"}',
+            formatter.format(record),
+        )
+        self.assertEqual(
+            'level=DEBUG msg="4 + 5 gives 9" extra.level=high user=bob',
+            formatter.format_colorized(
+                record,
+                colorizer=GenericColorizer(color_map={'key': ('', '')}),
+            ),
+        )
+
+    def test_structured_formatter_renders_exceptions(self):
+        formatter = StructuredFormatter(fields=[('msg', 'message')])
+        record = make_record()
+
+        try:
+            raise RuntimeError('boom')
+        except RuntimeError:
+            record.exc_info = sys.exc_info()
+
+        result = json.loads(formatter.format(record))
+
+        self.assertIn('RuntimeError: boom', result['exc_info'])
+        self.assertIsNone(record.exc_text)
+
+        record.exc_text = 'traceback'
+        record.stack_info = 'stack'
+        result = json.loads(formatter.format(record))
+
+        self.assertEqual('traceback', result['exc_info'])
+        self.assertEqual('stack', result['stack_info'])
+
+    def test_structured_formatter_in_colorizing_stream_handler(self):
+        stream = ColorStream()
+        handler = ColorizingStreamHandler(
+            stream=stream,
+            colorizer=GenericColorizer(color_map={
+                'important': ('[', ']'),
+                'bracket': ('(', ')'),
+            }),
+            attributes_map={'name': 'important'},
+        )
+        handler.setFormatter(StructuredFormatter(fields=[
+            ('logger', 'name'),
+            ('msg', 'message'),
+        ]))
+        logger = logging.Logger('app')
+        logger.addHandler(handler)
+        logger.info('hello', extra={'user': Mark('bob', 'bracket')})
+
+        self.assertEqual(
+            'logger=[app] msg=hello user=(bob)\n',
+            stream.getvalue(),
+        )
+
+    def test_structured_formatter_in_colorizing_stream_handler_no_tty(self):
+        stream = StringIO()
+        handler = ColorizingStreamHandler(stream=stream)
+        handler.setFormatter(StructuredFormatter(fields=[
+            ('logger', 'name'),
+            ('msg', 'message'),
+        ]))
+        logger = logging.Logger('app')
+        logger.addHandler(handler)
+        logger.info('hello', extra={'user': Mark('bob', 'bracket')})
+
+        self.assertEqual(
+            '{"logger": "app", "msg": "hello", "user": "bob"}\n',
+            stream.getvalue(),
+        )